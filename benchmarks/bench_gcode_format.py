@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# coding: utf-8
+
+r"""Per-line cost of the Gcode line formatter
+
+Compares the original dict interpolation implementation of _gcode_format
+with the precompiled GcodeFormatter, in compatibility and fixed precision modes.
+
+Usage: python benchmarks/bench_gcode_format.py [number_of_lines]
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+# the pycnc of the checkout, not an installed one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pycnc.gcodes as gcodes
+
+
+def legacy_gcode_format(prefix, x=None, y=None, z=None, i=None, j=None, r=None, q=None, feedrate=None):
+    r"""The _gcode_format implementation of pycnc 1.0, kept as the reference"""
+    if prefix[0] not in ['G', 'M']:
+        raise ValueError('What instruction is that?')
+    gcode = list()
+    gcode.append(prefix)
+    gcode.append(' ')
+    if x is not None:
+        gcode.append('X%(x)s ' % {'x': x})
+    if y is not None:
+        gcode.append('Y%(y)s ' % {'y': y})
+    if z is not None:
+        gcode.append('Z%(z)s ' % {'z': z})
+    if i is not None:
+        gcode.append('I%(i)s ' % {'i': i})
+    if j is not None:
+        gcode.append('J%(j)s ' % {'j': j})
+    if r is not None:
+        gcode.append('R%(r)s ' % {'r': r})
+    if q is not None:
+        gcode.append('Q%(q)s ' % {'q': q})
+    if feedrate is not None:
+        gcode.append('F%(f)s ' % {'f': feedrate})
+    gcode.append('\n')
+    return ''.join(gcode)
+
+
+# typical lines of a path() / square_pocket() / full_hole() program
+LINES = [('G1', dict(x=12.345678, y=-3.25, feedrate=640.0)),
+         ('G1', dict(z=-0.30000000000000004, feedrate=200.0)),
+         ('G1', dict(y=7.5, feedrate=640.0)),
+         ('G2', dict(x=1.0, y=2.0, z=-0.5, i=3.0, j=0.0, feedrate=640.0)),
+         ('G0', dict(x=0, y=0, z=10.0))]
+
+
+def bench(format_function, number):
+    r"""Returns the cost of one line in ns"""
+    def run():
+        for prefix, words in LINES:
+            format_function(prefix, **words)
+    seconds = min(timeit.repeat(run, number=number // len(LINES), repeat=5))
+    return seconds / number * 1e9
+
+
+def main(number=200000):
+    compat = gcodes.GcodeFormatter()
+    fixed = gcodes.GcodeFormatter(precision=3)
+    for prefix, words in LINES:
+        assert compat.format(prefix, **words) == legacy_gcode_format(prefix, **words)
+
+    reference = bench(legacy_gcode_format, number)
+    print('%-40s %8.1f ns/line' % ('legacy _gcode_format', reference))
+    for name, function in [('GcodeFormatter() (compatibility)', compat.format),
+                           ('GcodeFormatter(precision=3)', fixed.format)]:
+        cost = bench(function, number)
+        print('%-40s %8.1f ns/line  x%.2f' % (name, cost, reference / cost))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,229 @@
+#!/usr/bin/python
+# coding: utf-8
+
+r"""Throughput and memory peak of the Gcode formatter, of the shape functions and of jobs at realistic scale
+
+Every case is timed with timeit (best of the repeats), and run once more under tracemalloc (Python 3)
+for the peak of the memory it allocates. The times are also divided by the time of a fixed pure Python
+loop, so that a baseline saved on one machine can be compared on another one.
+
+The results can be saved as a JSON baseline and compared to it: a case is a regression if its relative time
+grows by more than the tolerance, or its memory peak by more than the memory tolerance, or if it no longer
+emits the same number of lines.
+
+Usage: python benchmarks/bench_shapes.py [--save FILE] [--compare FILE] [--only NAME ...] [--repeat N]
+                                         [--tolerance FRACTION] [--memory-tolerance FRACTION]
+
+python benchmarks/bench_shapes.py --compare benchmarks/baseline.json exits with the status 1 on a regression.
+
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import timeit
+from collections import OrderedDict
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+# the pycnc of the checkout, not an installed one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pycnc
+import pycnc.core as core
+import pycnc.gcodes as gcodes
+import pycnc.job as job
+
+
+# 200 x 200 mm pocket, 10 mm deep at 0.1 mm per layer
+POCKET = (0.0, 0.0, 200.0, 200.0, 6.0, 640.0, 200.0, 0.0, -10.0, -0.1, 5.0)
+
+
+def _profile(count=50000):
+    r"""A closed outline of count points, slightly noisy like a digitized profile"""
+    rnd = random.Random(0)
+    return [(100.0 * math.cos(k * 2.0 * math.pi / count) + 0.01 * rnd.random(),
+             60.0 * math.sin(k * 2.0 * math.pi / count)) for k in range(count)] + [(100.0, 0.0)]
+
+
+def _gcode_format_lines(number=100000):
+    r"""Lines of the kinds a square_pocket, a path and a full_hole emit"""
+    lines = [('G1', dict(x=12.345678, y=-3.25, feedrate=640.0)),
+             ('G1', dict(z=-0.30000000000000004, feedrate=200.0)),
+             ('G1', dict(y=7.5, feedrate=640.0)),
+             ('G2', dict(x=1.0, y=2.0, z=-0.5, i=3.0, j=0.0, feedrate=640.0)),
+             ('G0', dict(x=0, y=0, z=10.0))]
+
+    def run():
+        return ''.join(gcodes._gcode_format(prefix, **words) for _ in range(number // len(lines))
+                       for prefix, words in lines)
+    return run
+
+
+def _drill_job(x_count, y_count, optimize):
+    xs, ys = core.grid_points(0.0, 0.0, x_count, y_count, 5.0, 5.0)
+    rnd = random.Random(0)
+    order = list(range(len(xs)))
+    rnd.shuffle(order)  # the holes as they come from a drawing, for the ordering to do its work
+
+    def run():
+        plate = job.Job(optimize=optimize)
+        for index in order:
+            plate.add('drill', xs[index], ys[index], -4.0, 5.0, 200.0)
+        return plate.to_gcode()
+    return run
+
+
+def _shape(name, *args, **kwargs):
+    function = getattr(core, name)
+    return lambda: function(*args, **kwargs)
+
+
+def cases():
+    r"""The benchmark cases: name, and a function that generates Gcode"""
+    xs, ys = core.grid_points(0.0, 0.0, 100, 50, 5.0, 5.0)
+    return OrderedDict([
+        ('_gcode_format x 100k', _gcode_format_lines()),
+        ('square_pocket 200x200 step_z 0.1', _shape('square_pocket', *POCKET)),
+        ('square_pocket trochoidal 200x200 step_z 1', _shape('square_pocket', *POCKET[:9] + (-1.0, 5.0),
+                                                             strategy='trochoidal')),
+        ('path 50k points x 2 layers', _shape('path', _profile(), 600.0, 200.0, 0.0, -1.0, -0.5, 5.0)),
+        ('path 50k points fitted', _shape('path', _profile(), 600.0, 200.0, 0.0, -1.0, -0.5, 5.0, tolerance=0.01)),
+        ('drill_many 5k holes', _shape('drill_many', xs, ys, -4.0, 5.0, 200.0)),
+        ('drill_many g83 5k holes', _shape('drill_many', xs, ys, -4.0, 5.0, 200.0, depth_increment=1.0,
+                                           cycle='g83')),
+        ('drill x 5k', lambda: ''.join(core.drill(x, y, -4.0, 5.0, 200.0) for x, y in zip(xs, ys))),
+        ('drill_g73 x 5k', lambda: ''.join(core.drill_g73(x, y, -4.0, 1.0, 5.0, 200.0) for x, y in zip(xs, ys))),
+        ('rectangle 100x60x100 step_z 0.1', _shape('rectangle', 100.0, 60.0, 0.0, 0.0, 3.0, 640.0, 200.0, 0.0,
+                                                   -100.0, -0.1, 5.0)),
+        ('rectangle_rounded_corners 100x60x100', _shape('rectangle_rounded_corners', 0.0, 0.0, 100.0, 60.0, 5.0,
+                                                        3.0, 640.0, 200.0, 0.0, -100.0, -0.1, 5.0)),
+        ('oval 100x60 step_z 0.1', _shape('oval', 0.0, 0.0, 100.0, 60.0, 3.0, 640.0, 200.0, 0.0, -20.0, -0.1, 5.0)),
+        ('thin 200x200 step_z 0.1', _shape('thin', 200.0, 200.0, 0.0, 0.0, 6.0, 640.0, 200.0, 0.0, -10.0, -0.1,
+                                           5.0)),
+        ('thin_from_center 200x200 step_z 0.1', _shape('thin_from_center', 200.0, 200.0, 0.0, 0.0, 6.0, 640.0,
+                                                       200.0, 0.0, -10.0, -0.1, 5.0)),
+        ('hole d100x100 step_z 0.1', _shape('hole', 0.0, 0.0, 100.0, 6.0, 640.0, 0.0, -100.0, -0.1, 5.0)),
+        ('full_hole d100 step_z 0.1', _shape('full_hole', 0.0, 0.0, 100.0, 6.0, 640.0, 200.0, 0.0, -20.0, -0.1,
+                                             5.0)),
+        ('cylinder d100x100 step_z 0.1', _shape('cylinder', 0.0, 0.0, 100.0, 6.0, 640.0, 0.0, -100.0, -0.1, 5.0)),
+        ('two_concentric_holes step_z 0.1', _shape('two_concentric_holes', 0.0, 0.0, 100.0, 50.0, 6.0, 640.0,
+                                                   200.0, 0.0, -10.0, -20.0, -0.1, 5.0)),
+        ('job 500 drills optimized', _drill_job(25, 20, True)),
+        ('job 5k drills', _drill_job(100, 50, False)),
+    ])
+
+
+def calibrate(repeat=5):
+    r"""Time of a fixed pure Python loop in seconds, the unit of the relative times"""
+    def run():
+        total = 0.0
+        for k in range(200000):
+            total += k * 0.5
+        return '%r' % total
+    return min(timeit.repeat(run, number=1, repeat=repeat))
+
+
+def measure(function, repeat=5):
+    r"""Returns the best time of function in seconds, the number of lines it returns and its memory peak in bytes
+
+    The memory peak is None without tracemalloc.
+    """
+    gcode = function()
+    seconds = min(timeit.repeat(function, number=1, repeat=repeat))
+    peak = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return seconds, gcode.count('\n'), peak
+
+
+def run(names=None, repeat=5):
+    r"""Measures the cases, returns the results as a dict of JSON types"""
+    unit = calibrate()
+    results = OrderedDict()
+    for name, function in cases().items():
+        if names and not any(part in name for part in names):
+            continue
+        seconds, lines, peak = measure(function, repeat)
+        results[name] = OrderedDict([('time', seconds), ('relative_time', seconds / unit), ('lines', lines),
+                                     ('peak', peak)])
+        print('%-44s %8.3f s %10.1f ns/line %9i lines %10s peak' % (
+            name, seconds, seconds / max(lines, 1) * 1e9, lines,
+            '-' if peak is None else '%.1f MB' % (peak / 1e6)))
+    return OrderedDict([('pycnc', pycnc.get_version()), ('python', platform.python_version()),
+                        ('implementation', platform.python_implementation()), ('calibration', unit),
+                        ('cases', results)])
+
+
+def compare(results, baseline, tolerance=0.25, memory_tolerance=0.1):
+    r"""Returns the regressions of results against a baseline, as a list of messages
+
+    Examples
+    --------
+    >>> baseline = {'cases': {'a': {'relative_time': 10.0, 'lines': 5, 'peak': 1000}}}
+    >>> compare({'cases': {'a': {'relative_time': 12.0, 'lines': 5, 'peak': 1050}}}, baseline)
+    []
+    >>> compare({'cases': {'a': {'relative_time': 13.0, 'lines': 6, 'peak': None}}}, baseline)
+    ['a: 30% slower', 'a: 6 lines instead of 5']
+
+    """
+    regressions = list()
+    for name, result in results['cases'].items():
+        reference = baseline['cases'].get(name)
+        if reference is None:
+            continue
+        change = result['relative_time'] / reference['relative_time'] - 1.0
+        if change > tolerance:
+            regressions.append('%s: %.0f%% slower' % (name, 100.0 * change))
+        if result['peak'] is not None and reference['peak'] is not None:
+            change = result['peak'] / reference['peak'] - 1.0
+            if change > memory_tolerance:
+                regressions.append('%s: %.0f%% more memory' % (name, 100.0 * change))
+        if result['lines'] != reference['lines']:
+            regressions.append('%s: %i lines instead of %i' % (name, result['lines'], reference['lines']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the Gcode generation')
+    parser.add_argument('--save', help='write the results as a JSON baseline to this file')
+    parser.add_argument('--compare', help='compare the results to this JSON baseline')
+    parser.add_argument('--only', nargs='*', help='run the cases whose name contains one of these')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed increase of the relative times')
+    parser.add_argument('--memory-tolerance', type=float, default=0.1, help='allowed increase of the memory peaks')
+    args = parser.parse_args(argv)
+
+    results = run(args.only, args.repeat)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+        for message in regressions:
+            print('REGRESSION ' + message)
+        if regressions:
+            return 1
+        print('no regression against %s (pycnc %s)' % (args.compare, baseline.get('pycnc')))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
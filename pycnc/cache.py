@@ -0,0 +1,286 @@
+# coding: utf-8
+
+r"""Cache of generated features
+
+Summary
+-------
+Memoization of the toolpaths of the shape functions of pycnc.core, keyed on their
+canonicalized parameters: a bounded LRU tier in memory and an optional tier on disk
+(one pickle file per feature, named after the hash of its parameters, of the pycnc version and of FORMAT_VERSION).
+
+The files of the disk tier are read with pickle, that can run code: the directory must be trusted.
+
+Features that only differ by their position reuse the cached toolpath, offset,
+instead of being generated again.
+
+"""
+
+from __future__ import division
+
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+
+import pycnc
+import pycnc.core as core
+import pycnc.exceptions as exceptions
+
+
+# layout of the cached entries, part of the keys so that the disk tier of an earlier layout is not read
+FORMAT_VERSION = 1
+
+# pycnc version, part of the keys so that the disk tier does not serve the toolpaths of an earlier version
+_version = None
+
+
+# parameters that only translate a shape, and whether the shape starts with a rapid move to the origin
+# (which must not be translated)
+TRANSLATIONS = {'oval': ('x_center', 'y_center', False),
+                'rectangle': ('x_mini', 'y_mini', True),
+                'rectangle_rounded_corners': ('x_center', 'y_center', True),
+                'thin_from_center': ('x_center', 'y_center', True),
+                'thin': ('x_mini', 'y_mini', True),
+                'hole': ('x_center', 'y_center', False),
+                'full_hole': ('x_center', 'y_center', False),
+                'square_pocket': ('x_center', 'y_center', True),
+                'cylinder': ('x_center', 'y_center', False),
+                'two_concentric_holes': ('x_center', 'y_center', False),
+                'drill': ('x', 'y', False),
+                'drill_g73': ('x', 'y', False),
+                'drill_g83': ('x', 'y', False)}
+
+
+def _canonical(value):
+    r"""Numbers as floats and sequences (paths, coordinate arrays) as tuples, so that equal parameters have one key"""
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return tuple(_canonical(item) for item in value)
+    except TypeError:
+        return value
+
+
+def call_arguments(shape, args, kwargs):
+    r"""Returns the parameters of a call to a shape function as a dict {parameter name: value}, defaults included
+
+    Raises
+    ------
+    WrongParameterError
+        If shape is not a shape function of pycnc.core or if the parameters do not match its signature
+
+    Examples
+    --------
+    >>> call_arguments('drill', (1.0, 2.0, -4.0), {'safety_height': 10.0, 'feedrate': 200})['feedrate']
+    200
+
+    """
+    name = getattr(shape, '__name__', shape)
+    if name not in core.SHAPES:
+        raise exceptions.WrongParameterError('%s is not a shape' % name)
+    function = getattr(core, name)
+    try:
+        if hasattr(inspect, 'signature'):
+            bound = inspect.signature(function).bind(*args, **kwargs)
+            bound.apply_defaults()
+            return dict(bound.arguments)
+        return inspect.getcallargs(function, *args, **kwargs)
+    except TypeError as error:
+        raise exceptions.WrongParameterError('%s: %s' % (name, error))
+
+
+def feature_key(shape, args, kwargs, translate=True):
+    r"""Returns the key of a call to a shape function and its (x, y) position
+
+    Positional and keyword parameters, default values, and ints or floats give the same key.
+    If translate is True (and the shape can be translated) the position is not part of the key.
+    The pycnc version and FORMAT_VERSION are part of the key.
+
+    Returns
+    -------
+    key : str
+        SHA-1 of the canonicalized parameters and of the versions
+    position : tuple
+        (x, y) translation parameters, or None
+
+    Examples
+    --------
+    >>> key, position = feature_key('drill', (1, 2.0, -4.0, 10.0, 200.0), {})
+    >>> position
+    (1.0, 2.0)
+    >>> key == feature_key('drill', (5.0, 7.0, -4.0), {'safety_height': 10.0, 'feedrate': 200})[0]
+    True
+
+    """
+    global _version
+    if _version is None:
+        _version = pycnc.get_version()
+    name = getattr(shape, '__name__', shape)
+    arguments = call_arguments(name, args, kwargs)
+    position = None
+    if translate and name in TRANSLATIONS:
+        x_parameter, y_parameter, _ = TRANSLATIONS[name]
+        position = (float(arguments.pop(x_parameter)), float(arguments.pop(y_parameter)))
+    canonical = (name, tuple(sorted((parameter, _canonical(value)) for parameter, value in arguments.items())),
+                 _version, FORMAT_VERSION)
+    return hashlib.sha1(repr(canonical).encode('utf-8')).hexdigest(), position
+
+
+def _size(tp):
+    r"""Bytes used by the arrays of a toolpath"""
+    return sum(column.itemsize * len(column) for column in [tp.kind] + [getattr(tp, name) for name in tp.columns])
+
+
+class FeatureCache(object):
+    r"""LRU cache of feature toolpaths, in memory and optionally on disk
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        Maximum number of toolpaths kept in memory, defaults to 256
+    max_bytes : int, optional
+        Maximum size of the toolpaths kept in memory, defaults to 64 MB
+    directory : str, optional
+        Directory of the disk tier (created if needed), defaults to None i.e. no disk tier.
+        Its files are unpickled, which can run code: it must only be writable by trusted users.
+    translate : bool, optional
+        Reuse the toolpath of a feature for the same feature at another position, defaults to True.
+        The translated coordinates may differ from the generated ones in the last bit.
+
+    Attributes
+    ----------
+    hits, misses : int
+        Number of calls served from the cache (memory or disk) / generated
+    translated_hits : int
+        Hits that reused the toolpath of the feature at another position
+    disk_hits : int
+        Hits served from the disk tier
+    evictions : int
+        Toolpaths dropped from memory to respect max_entries and max_bytes
+
+    Examples
+    --------
+    >>> cache = FeatureCache()
+    >>> tp = cache.toolpath('full_hole', 0.0, 0.0, 20.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0)
+    >>> tp = cache.toolpath('full_hole', 30.0, 0.0, 20.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0)
+    >>> tp[1]
+    Move(kind=0, x=28.5, y=0.0, z=None, i=None, j=None, r=None, q=None, feedrate=None)
+    >>> cache.hits, cache.misses, cache.translated_hits
+    (1, 1, 1)
+
+    """
+    def __init__(self, max_entries=256, max_bytes=64 << 20, directory=None, translate=True):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.translate = translate
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._entries = OrderedDict()  # key: (toolpath, position, size), least recently used first
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.translated_hits = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def statistics(self):
+        r"""Returns the counters of the cache as a dict"""
+        calls = self.hits + self.misses
+        return {'entries': len(self._entries), 'bytes': self.size, 'hits': self.hits, 'misses': self.misses,
+                'translated_hits': self.translated_hits, 'disk_hits': self.disk_hits, 'evictions': self.evictions,
+                'hit_rate': self.hits / calls if calls else 0.0}
+
+    def clear(self):
+        r"""Empty the memory tier (the disk tier is kept)"""
+        self._entries.clear()
+        self.size = 0
+
+    def lookup(self, shape, args, kwargs):
+        r"""Returns a copy of the cached toolpath of a feature, or None (and count a miss)"""
+        key, position = feature_key(shape, args, kwargs, translate=self.translate)
+        entry = self._remove(key)
+        if entry is None:
+            entry = self._load(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._insert(key, entry)
+        self.hits += 1
+        tp, cached_position, _ = entry
+        tp = tp.copy()
+        if position != cached_position:
+            self.translated_hits += 1
+            name = getattr(shape, '__name__', shape)
+            tp.translate(position[0] - cached_position[0], position[1] - cached_position[1],
+                         start=1 if TRANSLATIONS[name][2] else 0)
+        return tp
+
+    def store(self, shape, args, kwargs, tp):
+        r"""Cache the toolpath of a feature (the toolpath is copied)"""
+        key, position = feature_key(shape, args, kwargs, translate=self.translate)
+        entry = (tp.copy(), position, _size(tp))
+        self._remove(key)
+        self._insert(key, entry)
+        self._dump(key, entry)
+
+    def toolpath(self, shape, *args, **kwargs):
+        r"""Returns the toolpath of a feature, from the cache or generated by core.make_toolpath
+
+        The parameters are those of core.make_toolpath
+        """
+        tp = self.lookup(shape, args, kwargs)
+        if tp is None:
+            tp = core.make_toolpath(shape, *args, **kwargs)
+            self.store(shape, args, kwargs, tp)
+        return tp
+
+    def gcode(self, shape, *args, **kwargs):
+        r"""Returns the Gcode of a feature, see toolpath"""
+        return self.toolpath(shape, *args, **kwargs).to_gcode()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+        return entry
+
+    def _insert(self, key, entry):
+        self._entries[key] = entry
+        self.size += entry[2]
+        while self._entries and (len(self._entries) > self.max_entries or self.size > self.max_bytes):
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                return pickle.load(f)
+        except Exception:  # missing, partial, or pickled by another version of the classes: a miss
+            return None
+
+    def _dump(self, key, entry):
+        if self.directory is None:
+            return
+        # write then rename, so that concurrent processes never read a partial file
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as f:
+            pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+        if hasattr(os, 'replace'):
+            os.replace(temporary, self._path(key))
+        else:
+            os.rename(temporary, self._path(key))
@@ -5,19 +5,27 @@ r"""Gcode generation for simple shapes"""
 from __future__ import division
 
 import math
+from array import array
 
-import pycnc.gcodes as gcodes
+import pycnc.fitting as fitting
+import pycnc.geometry as geometry
+import pycnc.toolpath as toolpath
 import pycnc.exceptions as exceptions
 
 
 GCODE_EXTENSION = '.ngc'
 
+# how the tool goes down to the depths of the contours and pockets
+ENTRIES = ('plunge', 'ramp', 'helix')
+# maximum descent angle in degrees of the ramp and helix entries
+ENTRY_ANGLE = 3.0
+
 
 # GCODE GENERATION
 
 
 def oval(x_center, y_center, x_width, y_height, tool_diameter, feed_rate, z_feed_rate, from_z, to_z, step_z,  safety_z,
-         angle=0.0):
+         angle=0.0, entry='plunge', entry_radius=None, descent='layers'):
          
     r"""Generate Gcode to cut an oval
 
@@ -26,54 +34,169 @@ def oval(x_center, y_center, x_width, y_height, tool_diameter, feed_rate, z_feed
     ...
     angle : float
         clockwise rotation angle
+    entry : str, optional
+        How the tool goes down to each depth: 'plunge' (the default, straight down at z_feed_rate),
+        'ramp' (zigzag along the first segment) or 'helix' (helical turns), at feed_rate
+        and at most ENTRY_ANGLE degrees down
+    entry_radius : float, optional
+        Radius of the helix entry, defaults to a quarter of the tool diameter
+    descent : str, optional
+        'layers' (the default): the contour is cut flat at each depth, the tool going down between them.
+        'continuous': on the inner ring, the tool goes down along the contour (ramped on the lines, helical on
+        the arcs) by step_z at each turn, then a last flat turn at to_z; there is no entry then
     ...
     """
-    point_center = Point(x_center, y_center)
-    gcode = list()
-    gcode.append(gcodes.g0_gcode(x=x_center, y=y_center, z=safety_z))
-
-    for h in _generate_heights(from_z, to_z, step_z):
-        for d in _generate_excentric(0.00, y_height/2.0, tool_diameter):
-            point_n = (Point(0.0, d) + point_center).rotate(point_center, angle)
-            point_ne = (Point((x_width - y_height) / 2.0, d) + point_center).rotate(point_center, angle)
-            point_e_arc_center = (Point((x_width-y_height)/2.0, 0.0) + point_center).rotate(point_center, angle)
-            point_se = (Point((x_width - y_height) / 2.0, -d) + point_center).rotate(point_center, angle)
-            point_sw = (Point(-(x_width-y_height)/2.0, -d) + point_center).rotate(point_center, angle)
-            point_w_arc_center = (Point(-(x_width - y_height)/2.0, 0.0) + point_center).rotate(point_center, angle)
-            point_nw = (Point(-(x_width - y_height)/2.0, d) + point_center).rotate(point_center, angle)
-            
-            gcode.append(gcodes.g1_gcode(z=h, feedrate=z_feed_rate))
-            gcode.append(gcodes.g1_gcode(x=point_n.x, y=point_n.y, feedrate=feed_rate))
-            gcode.append(gcodes.g1_gcode(x=point_ne.x, y=point_ne.y, feedrate=feed_rate))
-            gcode.append(gcodes.g2_gcode(x_end_point=point_se.x, y_end_point=point_se.y, spiral_end_altitude=h,
-                                         x_center_offset=(point_e_arc_center - point_ne).x,
-                                         y_center_offset=(point_e_arc_center - point_ne).y, feedrate=feed_rate))
-            gcode.append(gcodes.g1_gcode(x=point_sw.x, y=point_sw.y, feedrate=feed_rate))
-            gcode.append(gcodes.g2_gcode(x_end_point=point_nw.x, y_end_point=point_nw.y, spiral_end_altitude=h,
-                                         x_center_offset=(point_w_arc_center - point_sw).x,
-                                         y_center_offset=(point_w_arc_center - point_sw).y, feedrate=feed_rate))
-            gcode.append(gcodes.g1_gcode(x=point_n.x, y=point_n.y, feedrate=feed_rate))
-
-    gcode.append(gcodes.g1_gcode(z=safety_z, feedrate=feed_rate))
-    return ''.join(gcode)
-
-
-def path(path_to_follow, feed_rate, z_feed_rate, from_z, to_z, step_z, safety_z):
-    r"""Generate Gcode to follow a path (an array of 2D (X,Y) arrays)"""
-    
-    gcode = list()
-    gcode.append(gcodes.g0_gcode(x=0, y=0, z=safety_z))
-    gcode.append(gcodes.g0_gcode(x=path_to_follow[0][0], y=path_to_follow[0][1]))
-    for h in _generate_heights(from_z, to_z, step_z):
-        gcode.append(gcodes.g1_gcode(z=h, feedrate=z_feed_rate))
-        for point in path_to_follow:
-            gcode.append(gcodes.g1_gcode(x=point[0], y=point[1], feedrate=feed_rate))
-    gcode.append(gcodes.g1_gcode(z=safety_z, feedrate=feed_rate))
-    return ''.join(gcode)
+    return ''.join(iter_oval(x_center, y_center, x_width, y_height, tool_diameter, feed_rate, z_feed_rate, from_z, to_z,
+                             step_z, safety_z, angle=angle, entry=entry, entry_radius=entry_radius, descent=descent))
+
+
+def iter_oval(x_center, y_center, x_width, y_height, tool_diameter, feed_rate, z_feed_rate, from_z, to_z, step_z,
+              safety_z, angle=0.0, entry='plunge', entry_radius=None, descent='layers'):
+    r"""Streaming variant of :func:`oval`, yields the Gcode line by line"""
+    return toolpath.iter_gcode(_oval_moves(x_center, y_center, x_width, y_height, tool_diameter, feed_rate, z_feed_rate,
+                                           from_z, to_z, step_z, safety_z, angle=angle, entry=entry,
+                                           entry_radius=entry_radius, descent=descent))
+
+
+def _oval_moves(x_center, y_center, x_width, y_height, tool_diameter, feed_rate, z_feed_rate, from_z, to_z, step_z,
+                safety_z, angle=0.0, entry='plunge', entry_radius=None, descent='layers'):
+    r"""Generator of the moves of :func:`oval`"""
+    yield toolpath.g0_move(x=x_center, y=y_center, z=safety_z)
+
+    # the points of every ring are rotated in one batch, once for all the heights
+    rotation = geometry.Rotation(x_center, y_center, angle)
+    half_straight = (x_width - y_height) / 2.0
+    rings = list()
+    for d in _generate_excentric(0.00, y_height/2.0, tool_diameter):
+        # n, ne, e arc center, se, sw, w arc center, nw
+        xs, ys = rotation.apply_many([x + x_center for x in (0.0, half_straight, half_straight, half_straight,
+                                                             -half_straight, -half_straight, -half_straight)],
+                                     [y + y_center for y in (d, d, 0.0, -d, -d, 0.0, d)])
+        # the moves of the ring are built once, their arcs get the altitude of each layer
+        rings.append((xs, ys, toolpath.g1_move(x=xs[0], y=ys[0], feedrate=feed_rate),
+                      _oval_ring_moves(xs, ys, None, feed_rate)))
+
+    if entry not in ENTRIES:
+        raise exceptions.WrongParameterError('Unknown entry %s' % entry)
+    continuous = _continuous(descent, entry)
+    entry_points = None
+    if entry != 'plunge':
+        # down where the outer ring ends, towards the inner ring (or along the outer ring if there is one ring)
+        outer_xs, outer_ys = rings[-1][:2]
+        entry_points = [(outer_xs[0], outer_ys[0]), (rings[0][0][0], rings[0][1][0]), (outer_xs[1], outer_ys[1]),
+                        (outer_xs[3], outer_ys[3])]
+        entry_radius = entry_radius if entry_radius is not None else tool_diameter / 4.0
+
+    heights = layer_heights(from_z, to_z, step_z)
+    previous_h = None
+    for h in heights:
+        if entry_points is not None and previous_h is not None:
+            for move in _entry_moves(entry, entry_points[0][0], entry_points[0][1], entry_points[1:], previous_h, h,
+                                     entry_radius, feed_rate, z_feed_rate):
+                yield move
+        for index, (xs, ys, start, ring) in enumerate(rings):
+            if continuous and index == 0:
+                # the inner ring goes down from the previous depth, and is cut flat once more at the bottom
+                if previous_h is None:
+                    yield toolpath.g1_move(z=h, feedrate=z_feed_rate)
+                yield start
+                if previous_h is not None:
+                    for move in _descending_moves(xs[0], ys[0], ring, previous_h, h):
+                        yield move
+                if h != heights[-1]:
+                    continue
+            elif not continuous and (entry_points is None or previous_h is None):
+                yield toolpath.g1_move(z=h, feedrate=z_feed_rate)
+            yield start
+            for move in _at_height(ring, h):
+                yield move
+        previous_h = h
+
+    yield toolpath.g1_move(z=safety_z, feedrate=feed_rate)
+
+
+def _oval_ring_moves(xs, ys, h, feed_rate):
+    r"""Moves of a ring of :func:`oval` at the altitude h, from its north point (xs[0], ys[0])"""
+    return [toolpath.g1_move(x=xs[1], y=ys[1], feedrate=feed_rate),
+            toolpath.g2_move(x_end_point=xs[3], y_end_point=ys[3], spiral_end_altitude=h,
+                             x_center_offset=xs[2] - xs[1], y_center_offset=ys[2] - ys[1], feedrate=feed_rate),
+            toolpath.g1_move(x=xs[4], y=ys[4], feedrate=feed_rate),
+            toolpath.g2_move(x_end_point=xs[6], y_end_point=ys[6], spiral_end_altitude=h,
+                             x_center_offset=xs[5] - xs[4], y_center_offset=ys[5] - ys[4], feedrate=feed_rate),
+            toolpath.g1_move(x=xs[0], y=ys[0], feedrate=feed_rate)]
+
+
+def path(path_to_follow, feed_rate, z_feed_rate, from_z, to_z, step_z, safety_z, entry='plunge', entry_radius=None,
+         descent='layers', tolerance=None):
+    r"""Generate Gcode to follow a path (an array of 2D (X,Y) arrays)
+
+    Parameters
+    ----------
+    ...
+    entry : str, optional
+        How the tool goes down to each depth: 'plunge' (the default, straight down at z_feed_rate),
+        'ramp' (zigzag along the first segment) or 'helix' (helical turns), at feed_rate
+        and at most ENTRY_ANGLE degrees down
+    entry_radius : float, optional
+        Radius of the helix entry, required by entry='helix'.
+        The helix is centered on the first segment and cuts up to entry_radius on both sides of the path
+    descent : str, optional
+        'layers' (the default): the contour is cut flat at each depth, the tool going down between them.
+        'continuous' (closed paths only): the tool goes down along the contour (ramped on the lines, helical on
+        the arcs) by step_z at each turn, then a last flat turn at to_z; there is no entry then
+    tolerance : float, optional
+        If given, the path is followed within tolerance mm with fewer moves: arcs (G2 / G3) where the points lie
+        on circles, and the other points simplified (see :func:`pycnc.fitting.fit_arcs`). Defaults to None,
+        i.e. one G1 per point
+
+    """
+    return ''.join(iter_path(path_to_follow, feed_rate, z_feed_rate, from_z, to_z, step_z, safety_z, entry=entry,
+                             entry_radius=entry_radius, descent=descent, tolerance=tolerance))
+
+
+def iter_path(path_to_follow, feed_rate, z_feed_rate, from_z, to_z, step_z, safety_z, entry='plunge',
+              entry_radius=None, descent='layers', tolerance=None):
+    r"""Streaming variant of :func:`path`, yields the Gcode line by line"""
+    return toolpath.iter_gcode(_path_moves(path_to_follow, feed_rate, z_feed_rate, from_z, to_z, step_z, safety_z,
+                                           entry=entry, entry_radius=entry_radius, descent=descent,
+                                           tolerance=tolerance))
+
+
+def _path_moves(path_to_follow, feed_rate, z_feed_rate, from_z, to_z, step_z, safety_z, entry='plunge',
+                entry_radius=None, descent='layers', tolerance=None):
+    r"""Generator of the moves of :func:`path`"""
+    yield toolpath.g0_move(x=0, y=0, z=safety_z)
+    yield toolpath.g0_move(x=path_to_follow[0][0], y=path_to_follow[0][1])
+    # the moves after the first point, the same at every depth
+    if tolerance is None:
+        contour = [toolpath.g1_move(x=point[0], y=point[1], feedrate=feed_rate) for point in path_to_follow[1:]]
+    else:
+        contour = fitting.fit_arcs(path_to_follow, tolerance, feedrate=feed_rate)
+    if _continuous(descent, entry):
+        x_first, y_first = path_to_follow[0]
+        x_last, y_last = path_to_follow[-1]
+        if math.hypot(x_last - x_first, y_last - y_first) > 1e-9:
+            raise exceptions.WrongParameterError('The continuous descent needs a closed path')
+        for move in _continuous_moves(x_first, y_first, contour, from_z, to_z, step_z, z_feed_rate):
+            yield move
+        yield toolpath.g1_move(z=safety_z, feedrate=feed_rate)
+        return
+    start = toolpath.g1_move(x=path_to_follow[0][0], y=path_to_follow[0][1], feedrate=feed_rate)
+    previous_h = None
+    for h in layer_heights(from_z, to_z, step_z):
+        # the tool is at the end of the path, except for the first layer
+        x, y = path_to_follow[0] if previous_h is None else path_to_follow[-1]
+        for move in _entry_moves(entry, x, y, path_to_follow, previous_h, h, entry_radius, feed_rate, z_feed_rate):
+            yield move
+        yield start
+        for move in contour:
+            yield move
+        previous_h = h
+    yield toolpath.g1_move(z=safety_z, feedrate=feed_rate)
 
 
 def rectangle(x_dimension, y_dimension, x_mini, y_mini, tool_diameter, feed_rate, z_feed_rate, from_z, to_z, step_z,
-              safety_z):
+              safety_z, entry='plunge', entry_radius=None, descent='layers'):
     r"""Generate Gcode to cut a rectangle
 
     Parameters
@@ -84,27 +207,67 @@ def rectangle(x_dimension, y_dimension, x_mini, y_mini, tool_diameter, feed_rate
         The dimension of the rectangle along the y axis
     feed_rate : float
         Feed rate in mm/min
+    entry : str, optional
+        How the tool goes down to each depth: 'plunge' (the default, straight down at z_feed_rate),
+        'ramp' (zigzag along the first segment) or 'helix' (helical turns), at feed_rate
+        and at most ENTRY_ANGLE degrees down
+    entry_radius : float, optional
+        Radius of the helix entry, outside the rectangle, defaults to a quarter of the tool diameter
+    descent : str, optional
+        'layers' (the default): the contour is cut flat at each depth, the tool going down between them.
+        'continuous': the tool goes down along the contour (ramped on the lines, helical on the arcs)
+        by step_z at each turn, then a last flat turn at to_z; there is no entry then
 
     Note
     ----
     The milling head travels CCW around the rectangle
     
     """
-    
-    gcode = list()
-    gcode.append(gcodes.g0_gcode(x=0, y=0, z=safety_z))
-    gcode.append(gcodes.g0_gcode(x=x_mini - tool_diameter / 2, y=y_mini - tool_diameter / 2))
-
-    for h in _generate_heights(from_z, to_z, step_z):
-        gcode.append(gcodes.g1_gcode(z=h, feedrate=z_feed_rate))
-        gcode.append(gcodes.g1_gcode(x=x_mini + x_dimension + tool_diameter / 2, feedrate=feed_rate))
-        gcode.append(gcodes.g1_gcode(y=y_mini + y_dimension + tool_diameter / 2, feedrate=feed_rate))
-        gcode.append(gcodes.g1_gcode(x=x_mini-tool_diameter / 2, feedrate=feed_rate))
-        gcode.append(gcodes.g1_gcode(y=y_mini-tool_diameter / 2, feedrate=feed_rate))
-
-    gcode.append(gcodes.g1_gcode(z=safety_z, feedrate=feed_rate))
-    
-    return ''.join(gcode)
+    return ''.join(iter_rectangle(x_dimension, y_dimension, x_mini, y_mini, tool_diameter, feed_rate, z_feed_rate,
+                                  from_z, to_z, step_z, safety_z, entry=entry, entry_radius=entry_radius,
+                                  descent=descent))
+
+
+def iter_rectangle(x_dimension, y_dimension, x_mini, y_mini, tool_diameter, feed_rate, z_feed_rate, from_z, to_z,
+                   step_z, safety_z, entry='plunge', entry_radius=None, descent='layers'):
+    r"""Streaming variant of :func:`rectangle`, yields the Gcode line by line"""
+    return toolpath.iter_gcode(_rectangle_moves(x_dimension, y_dimension, x_mini, y_mini, tool_diameter, feed_rate,
+                                                z_feed_rate, from_z, to_z, step_z, safety_z, entry=entry,
+                                                entry_radius=entry_radius, descent=descent))
+
+
+def _rectangle_moves(x_dimension, y_dimension, x_mini, y_mini, tool_diameter, feed_rate, z_feed_rate, from_z, to_z,
+                     step_z, safety_z, entry='plunge', entry_radius=None, descent='layers'):
+    r"""Generator of the moves of :func:`rectangle`"""
+    yield toolpath.g0_move(x=0, y=0, z=safety_z)
+    yield toolpath.g0_move(x=x_mini - tool_diameter / 2, y=y_mini - tool_diameter / 2)
+    if _continuous(descent, entry):
+        x_low, y_low = x_mini - tool_diameter / 2, y_mini - tool_diameter / 2
+        x_high, y_high = x_mini + x_dimension + tool_diameter / 2, y_mini + y_dimension + tool_diameter / 2
+        contour = [toolpath.g1_move(x=x, y=y, feedrate=feed_rate)
+                   for x, y in ((x_high, y_low), (x_high, y_high), (x_low, y_high), (x_low, y_low))]
+        for move in _continuous_moves(x_low, y_low, contour, from_z, to_z, step_z, z_feed_rate):
+            yield move
+        yield toolpath.g1_move(z=safety_z, feedrate=feed_rate)
+        return
+    entry_radius = entry_radius if entry_radius is not None else tool_diameter / 4.0
+    contour = [toolpath.g1_move(x=x_mini + x_dimension + tool_diameter / 2, feedrate=feed_rate),
+               toolpath.g1_move(y=y_mini + y_dimension + tool_diameter / 2, feedrate=feed_rate),
+               toolpath.g1_move(x=x_mini-tool_diameter / 2, feedrate=feed_rate),
+               toolpath.g1_move(y=y_mini-tool_diameter / 2, feedrate=feed_rate)]
+
+    previous_h = None
+    for h in layer_heights(from_z, to_z, step_z):
+        # along the lower edge, the helix on its right i.e. outside the rectangle
+        for move in _entry_moves(entry, x_mini - tool_diameter / 2, y_mini - tool_diameter / 2,
+                                 [(x_mini + x_dimension + tool_diameter / 2, y_mini - tool_diameter / 2)], previous_h,
+                                 h, entry_radius, feed_rate, z_feed_rate, side=-1):
+            yield move
+        for move in contour:
+            yield move
+        previous_h = h
+
+    yield toolpath.g1_move(z=safety_z, feedrate=feed_rate)
 
 
 def rectangle_rounded_corners(x_center, y_center, x_dimension, y_dimension, corner_radius, tool_diameter, feed_rate,
@@ -125,99 +288,160 @@ def rectangle_rounded_corners(x_center, y_center, x_dimension, y_dimension, corn
     The milling head travels CCW around the rectangle
     
     """
-    
-    gcode = list()
-    gcode.append(gcodes.g0_gcode(x=0, y=0, z=safety_z))
+    return ''.join(iter_rectangle_rounded_corners(x_center, y_center, x_dimension, y_dimension, corner_radius,
+                                                  tool_diameter, feed_rate, z_feed_rate, from_z, to_z, step_z,
+                                                  safety_z))
+
+
+def iter_rectangle_rounded_corners(x_center, y_center, x_dimension, y_dimension, corner_radius, tool_diameter,
+                                   feed_rate, z_feed_rate, from_z, to_z, step_z, safety_z):
+    r"""Streaming variant of :func:`rectangle_rounded_corners`, yields the Gcode line by line"""
+    return toolpath.iter_gcode(_rectangle_rounded_corners_moves(x_center, y_center, x_dimension, y_dimension,
+                                                                corner_radius, tool_diameter, feed_rate, z_feed_rate,
+                                                                from_z, to_z, step_z, safety_z))
+
+
+def _rectangle_rounded_corners_moves(x_center, y_center, x_dimension, y_dimension, corner_radius, tool_diameter,
+                                     feed_rate, z_feed_rate, from_z, to_z, step_z, safety_z):
+    r"""Generator of the moves of :func:`rectangle_rounded_corners`"""
+    yield toolpath.g0_move(x=0, y=0, z=safety_z)
     # go to start point (LOWER LEFT CORNER)
-    gcode.append(gcodes.g0_gcode(x=x_center - x_dimension / 2 + corner_radius,
-                                 y=y_center - y_dimension / 2 - tool_diameter / 2))
+    yield toolpath.g0_move(x=x_center - x_dimension / 2 + corner_radius,
+                           y=y_center - y_dimension / 2 - tool_diameter / 2)
 
-    for h in _generate_heights(from_z, to_z, step_z):
-        gcode.append(gcodes.g1_gcode(z=h, feedrate=z_feed_rate))
+    # the moves of a layer are built once, their arcs get the altitude of each layer
+    contour = [
         # LOWER EDGE
-        gcode.append(gcodes.g1_gcode(x=x_center + x_dimension / 2 - corner_radius, feedrate=feed_rate))
+        toolpath.g1_move(x=x_center + x_dimension / 2 - corner_radius, feedrate=feed_rate),
         # BOTTOM RIGHT CORNER
-        gcode.append(gcodes.g3_gcode(x_end_point=x_center + x_dimension / 2 + tool_diameter / 2,
-                                     y_end_point=y_center - y_dimension / 2 + corner_radius,
-                                     x_center_offset=0.0, y_center_offset=corner_radius + tool_diameter / 2,
-                                     spiral_end_altitude=h, feedrate=feed_rate))
+        toolpath.g3_move(x_end_point=x_center + x_dimension / 2 + tool_diameter / 2,
+                         y_end_point=y_center - y_dimension / 2 + corner_radius,
+                         x_center_offset=0.0, y_center_offset=corner_radius + tool_diameter / 2, feedrate=feed_rate),
         # RIGHT EDGE
-        gcode.append(gcodes.g1_gcode(y=y_center + y_dimension / 2 - corner_radius, feedrate=feed_rate))
+        toolpath.g1_move(y=y_center + y_dimension / 2 - corner_radius, feedrate=feed_rate),
         # UPPER RIGHT CORNER
-        gcode.append(gcodes.g3_gcode(x_end_point=x_center + x_dimension / 2 - corner_radius,
-                                     y_end_point=y_center + y_dimension / 2 + tool_diameter / 2,
-                                     x_center_offset=-corner_radius - tool_diameter / 2,
-                                     y_center_offset=0.0, spiral_end_altitude=h, feedrate=feed_rate))
+        toolpath.g3_move(x_end_point=x_center + x_dimension / 2 - corner_radius,
+                         y_end_point=y_center + y_dimension / 2 + tool_diameter / 2,
+                         x_center_offset=-corner_radius - tool_diameter / 2, y_center_offset=0.0, feedrate=feed_rate),
         # TOP EDGE
-        gcode.append(gcodes.g1_gcode(x=x_center - x_dimension / 2 + corner_radius, feedrate=feed_rate))
-        gcode.append(gcodes.g3_gcode(x_end_point=x_center - x_dimension / 2 - tool_diameter / 2,
-                                     y_end_point=y_center + y_dimension / 2 - corner_radius,
-                                     x_center_offset=0.0, y_center_offset=-corner_radius - tool_diameter / 2,
-                                     spiral_end_altitude=h, feedrate=feed_rate))
-        gcode.append(gcodes.g1_gcode(y=y_center - y_dimension / 2 + corner_radius, feedrate=feed_rate))
-        gcode.append(gcodes.g3_gcode(x_end_point=x_center - x_dimension / 2 + corner_radius,
-                                     y_end_point=y_center - y_dimension / 2 - tool_diameter / 2,
-                                     x_center_offset=corner_radius + tool_diameter / 2, y_center_offset=0.0,
-                                     spiral_end_altitude=h, feedrate=feed_rate))
-
-    gcode.append(gcodes.g1_gcode(z=safety_z, feedrate=feed_rate))
-    
-    return ''.join(gcode)
+        toolpath.g1_move(x=x_center - x_dimension / 2 + corner_radius, feedrate=feed_rate),
+        toolpath.g3_move(x_end_point=x_center - x_dimension / 2 - tool_diameter / 2,
+                         y_end_point=y_center + y_dimension / 2 - corner_radius,
+                         x_center_offset=0.0, y_center_offset=-corner_radius - tool_diameter / 2, feedrate=feed_rate),
+        toolpath.g1_move(y=y_center - y_dimension / 2 + corner_radius, feedrate=feed_rate),
+        toolpath.g3_move(x_end_point=x_center - x_dimension / 2 + corner_radius,
+                         y_end_point=y_center - y_dimension / 2 - tool_diameter / 2,
+                         x_center_offset=corner_radius + tool_diameter / 2, y_center_offset=0.0, feedrate=feed_rate)]
+
+    for h in layer_heights(from_z, to_z, step_z):
+        yield toolpath.g1_move(z=h, feedrate=z_feed_rate)
+        for move in _at_height(contour, h):
+            yield move
+
+    yield toolpath.g1_move(z=safety_z, feedrate=feed_rate)
 
 
 def thin_from_center(x_dimension, y_dimension, x_center, y_center, tool_diameter, feed_rate, z_feed_rate, from_z, to_z,
-                     step_z, safety_z):
+                     step_z, safety_z, step_over=None, entry='plunge', entry_radius=None):
     r"""Generate Gcode to remove some material from a region around the center of the region
 
     It is intended to be used to make the stock thinner over a region
     before cutting a part from the thinned region
+
+    See :func:`thin` for step_over, entry and entry_radius
     
     """
-    return thin(x_dimension, y_dimension, x_center - x_dimension / 2.0, y_center - y_dimension / 2.0, tool_diameter,
-                feed_rate, z_feed_rate, from_z, to_z, step_z, safety_z)
+    return ''.join(iter_thin_from_center(x_dimension, y_dimension, x_center, y_center, tool_diameter, feed_rate,
+                                         z_feed_rate, from_z, to_z, step_z, safety_z, step_over=step_over, entry=entry,
+                                         entry_radius=entry_radius))
+
+
+def iter_thin_from_center(x_dimension, y_dimension, x_center, y_center, tool_diameter, feed_rate, z_feed_rate, from_z,
+                          to_z, step_z, safety_z, step_over=None, entry='plunge', entry_radius=None):
+    r"""Streaming variant of :func:`thin_from_center`, yields the Gcode line by line"""
+    return toolpath.iter_gcode(_thin_from_center_moves(x_dimension, y_dimension, x_center, y_center, tool_diameter,
+                                                       feed_rate, z_feed_rate, from_z, to_z, step_z, safety_z,
+                                                       step_over=step_over, entry=entry, entry_radius=entry_radius))
+
+
+def _thin_from_center_moves(x_dimension, y_dimension, x_center, y_center, tool_diameter, feed_rate, z_feed_rate, from_z,
+                            to_z, step_z, safety_z, step_over=None, entry='plunge', entry_radius=None):
+    r"""Generator of the moves of :func:`thin_from_center`"""
+    return _thin_moves(x_dimension, y_dimension, x_center - x_dimension / 2.0, y_center - y_dimension / 2.0,
+                       tool_diameter, feed_rate, z_feed_rate, from_z, to_z, step_z, safety_z, step_over=step_over,
+                       entry=entry, entry_radius=entry_radius)
 
 
 def thin(x_dimension, y_dimension, x_mini, y_mini, tool_diameter, feed_rate, z_feed_rate, from_z, to_z, step_z,
-         safety_z):
+         safety_z, step_over=None, entry='plunge', entry_radius=None):
     r"""Generate Gcode to remove some material from a region defined by the bottom left point
     of a rectangle and its dimensions
 
     It is intended to be used to make the stock thinner over a region
     before cutting a part from the thinned region
+
+    Parameters
+    ----------
+    ...
+    step_over : float, optional
+        Distance between two rings of the spiral in mm (e.g. 0.4 * tool_diameter for a 40% radial engagement),
+        defaults to half the tool diameter
+    entry : str, optional
+        How the tool goes down to each depth: 'plunge' (the default, straight down at z_feed_rate),
+        'ramp' (zigzag along the first segment) or 'helix' (helical turns), at feed_rate
+        and at most ENTRY_ANGLE degrees down
+    entry_radius : float, optional
+        Radius of the helix entry, from the center along Y, defaults to a quarter of the tool diameter
+        (less in narrow regions)
     
     """
-    
+    return ''.join(iter_thin(x_dimension, y_dimension, x_mini, y_mini, tool_diameter, feed_rate, z_feed_rate, from_z,
+                             to_z, step_z, safety_z, step_over=step_over, entry=entry, entry_radius=entry_radius))
+
+
+def iter_thin(x_dimension, y_dimension, x_mini, y_mini, tool_diameter, feed_rate, z_feed_rate, from_z, to_z, step_z,
+              safety_z, step_over=None, entry='plunge', entry_radius=None):
+    r"""Streaming variant of :func:`thin`, yields the Gcode line by line"""
+    return toolpath.iter_gcode(_thin_moves(x_dimension, y_dimension, x_mini, y_mini, tool_diameter, feed_rate,
+                                           z_feed_rate, from_z, to_z, step_z, safety_z, step_over=step_over,
+                                           entry=entry, entry_radius=entry_radius))
+
+
+def _thin_moves(x_dimension, y_dimension, x_mini, y_mini, tool_diameter, feed_rate, z_feed_rate, from_z, to_z, step_z,
+                safety_z, step_over=None, entry='plunge', entry_radius=None):
+    r"""Generator of the moves of :func:`thin`"""
+    offsets = _ring_offsets(x_dimension, y_dimension, tool_diameter, step_over)
     x_center = x_mini + x_dimension / 2
     y_center = y_mini+y_dimension / 2
-    gcode = list()
-    gcode.append(gcodes.g0_gcode(x=0, y=0, z=safety_z))
-    gcode.append(gcodes.g0_gcode(x=x_center, y=y_center))
-
-    for h in _generate_heights(from_z, to_z, step_z):
-        gcode.append(gcodes.g1_gcode(x=x_center, y=y_center, feedrate=feed_rate))
-        gcode.append(gcodes.g1_gcode(z=h, feedrate=z_feed_rate))
+    yield toolpath.g0_move(x=0, y=0, z=safety_z)
+    yield toolpath.g0_move(x=x_center, y=y_center)
+    # towards the first ring
+    towards = [(x_center, min(y_center + offsets[0], y_mini + y_dimension - tool_diameter / 2)),
+               (min(x_center + offsets[0], x_mini + x_dimension - tool_diameter / 2), y_center)]
+    if entry_radius is None:
+        entry_radius = _pocket_entry_radius(x_dimension, y_dimension, tool_diameter)
+
+    previous_h = None
+    for h in layer_heights(from_z, to_z, step_z):
+        yield toolpath.g1_move(x=x_center, y=y_center, feedrate=feed_rate)
+        for move in _entry_moves(entry, x_center, y_center, towards, previous_h, h, entry_radius, feed_rate,
+                                 z_feed_rate):
+            yield move
         
-        nb_turns = 0.00
         # correction bug 25 SEP 2012 - parcours du perimètre exterieur sans prendre de matière
-        # division par 2 de y_dimension dans l expression de la boucle while
-        # while nb_turns/2*tool_diameter < x_dimension/2 or nb_turns/2*tool_diameter < y_dimension:
-        while nb_turns / 2 * tool_diameter < x_dimension/2 or nb_turns / 2 * tool_diameter < y_dimension / 2:
-            gcode.append(gcodes.g1_gcode(y=min(y_center + (nb_turns / 2 + 0.5) * tool_diameter,
-                                               y_mini + y_dimension - tool_diameter / 2), feedrate=feed_rate))
-            gcode.append(gcodes.g1_gcode(x=min(x_center + (nb_turns / 2 + 0.5) * tool_diameter,
-                                               x_mini + x_dimension - tool_diameter / 2), feedrate=feed_rate))
-            gcode.append(gcodes.g1_gcode(y=max(y_center - (nb_turns / 2 + 0.5) * tool_diameter,
-                                               y_mini + tool_diameter / 2), feedrate=feed_rate))
-            gcode.append(gcodes.g1_gcode(x=max(x_center - (nb_turns / 2 + 0.5) * tool_diameter,
-                                               x_mini + tool_diameter / 2), feedrate=feed_rate))
-            gcode.append(gcodes.g1_gcode(y=min(y_center + (nb_turns / 2 + 0.5) * tool_diameter,
-                                               y_mini + y_dimension - tool_diameter / 2), feedrate=feed_rate))
-            gcode.append(gcodes.g1_gcode(x=x_center, feedrate=feed_rate))
-            
-            nb_turns += 1.00
+        for offset in offsets:
+            yield toolpath.g1_move(y=min(y_center + offset, y_mini + y_dimension - tool_diameter / 2),
+                                   feedrate=feed_rate)
+            yield toolpath.g1_move(x=min(x_center + offset, x_mini + x_dimension - tool_diameter / 2),
+                                   feedrate=feed_rate)
+            yield toolpath.g1_move(y=max(y_center - offset, y_mini + tool_diameter / 2), feedrate=feed_rate)
+            yield toolpath.g1_move(x=max(x_center - offset, x_mini + tool_diameter / 2), feedrate=feed_rate)
+            yield toolpath.g1_move(y=min(y_center + offset, y_mini + y_dimension - tool_diameter / 2),
+                                   feedrate=feed_rate)
+            yield toolpath.g1_move(x=x_center, feedrate=feed_rate)
+        previous_h = h
 
-    gcode.append(gcodes.g1_gcode(z=safety_z, feedrate=feed_rate))
-    return ''.join(gcode)
+    yield toolpath.g1_move(z=safety_z, feedrate=feed_rate)
 
 
 # def hole(x_center, y_center, hole_diameter, tool_diameter, feed_rate, z_feed_rate, from_z, to_z, step_z, safety_z):
@@ -229,56 +453,176 @@ def hole(x_center, y_center, hole_diameter, tool_diameter, feed_rate, from_z, to
     If the hole diameter is bigger than 2 x tool_diameter the material in the center is not removed
     
     """
+    return ''.join(iter_hole(x_center, y_center, hole_diameter, tool_diameter, feed_rate, from_z, to_z, step_z,
+                             safety_z))
+
+
+def iter_hole(x_center, y_center, hole_diameter, tool_diameter, feed_rate, from_z, to_z, step_z, safety_z):
+    r"""Streaming variant of :func:`hole`, yields the Gcode line by line"""
+    return toolpath.iter_gcode(_hole_moves(x_center, y_center, hole_diameter, tool_diameter, feed_rate, from_z, to_z,
+                                           step_z, safety_z))
+
+
+def _hole_moves(x_center, y_center, hole_diameter, tool_diameter, feed_rate, from_z, to_z, step_z, safety_z):
+    r"""Generator of the moves of :func:`hole`"""
     if hole_diameter < tool_diameter:
         raise exceptions.WrongParameterError('Cannot make a hole smaller than the tool')
-    gcode = list()
-    gcode.append(gcodes.g0_gcode(z=safety_z))
-    gcode.append(gcodes.g0_gcode(x=x_center - hole_diameter / 2 + tool_diameter / 2, y=y_center))
+    yield toolpath.g0_move(z=safety_z)
+    yield toolpath.g0_move(x=x_center - hole_diameter / 2 + tool_diameter / 2, y=y_center)
 
-    for h in _generate_heights(from_z, to_z, step_z):
-        gcode.append(gcodes.g2_gcode(x_center_offset=hole_diameter / 2 - tool_diameter / 2, y_center_offset=0,
-                                     spiral_end_altitude=h, feedrate=feed_rate))
+    for h in layer_heights(from_z, to_z, step_z):
+        yield toolpath.g2_move(x_center_offset=hole_diameter / 2 - tool_diameter / 2, y_center_offset=0,
+                               spiral_end_altitude=h, feedrate=feed_rate)
         
-    gcode.append(gcodes.g1_gcode(z=safety_z, feedrate=feed_rate))
-    
-    return ''.join(gcode)
+    yield toolpath.g1_move(z=safety_z, feedrate=feed_rate)
 
 
 def full_hole(x_center, y_center, hole_diameter, tool_diameter, feed_rate, z_feed_rate, from_z, to_z, step_z, safety_z,
-              center_diameter=0.0):
+              center_diameter=0.0, step_over=None, strategy='concentric'):
     r"""Generate Gcode to cut a hole and remove the middle material
 
     If the hole diameter is bigger than 2 x tool_diameter the material in the center is removed
+
+    Parameters
+    ----------
+    ...
+    step_over : float, optional
+        Radial distance between two circles (or two turns of the spiral) in mm, defaults to half the tool diameter
+    strategy : str, optional
+        'concentric' (the default): circles joined by straight moves outwards, the tool is fully engaged on them.
+        'spiral': a spiral of half circles at constant radial engagement (step_over), then a finishing circle;
+        the tool goes back to the center above the cleared depth between the layers.
     
     """
+    return ''.join(iter_full_hole(x_center, y_center, hole_diameter, tool_diameter, feed_rate, z_feed_rate, from_z,
+                                  to_z, step_z, safety_z, center_diameter=center_diameter, step_over=step_over,
+                                  strategy=strategy))
+
+
+def iter_full_hole(x_center, y_center, hole_diameter, tool_diameter, feed_rate, z_feed_rate, from_z, to_z, step_z,
+                   safety_z, center_diameter=0.0, step_over=None, strategy='concentric'):
+    r"""Streaming variant of :func:`full_hole`, yields the Gcode line by line"""
+    return toolpath.iter_gcode(_full_hole_moves(x_center, y_center, hole_diameter, tool_diameter, feed_rate,
+                                                z_feed_rate, from_z, to_z, step_z, safety_z,
+                                                center_diameter=center_diameter, step_over=step_over,
+                                                strategy=strategy))
+
+
+def _full_hole_moves(x_center, y_center, hole_diameter, tool_diameter, feed_rate, z_feed_rate, from_z, to_z, step_z,
+                     safety_z, center_diameter=0.0, step_over=None, strategy='concentric'):
+    r"""Generator of the moves of :func:`full_hole`"""
     if hole_diameter < tool_diameter:
         raise exceptions.WrongParameterError('Cannot make a hole smaller than the tool')
-    gcode = list()
-    gcode.append(gcodes.g0_gcode(z=safety_z))
-    # gcode.append(_g0_gcode(x=x_center-tool_diameter/2,y=y_center))
-    gcode.append(gcodes.g0_gcode(x=x_center - tool_diameter / 2, y=y_center))
-
-    for h in _generate_heights(from_z, to_z, step_z):
-        gcode.append(gcodes.g1_gcode(z=h, feedrate=z_feed_rate))
-        for e in _generate_excentric(start=center_diameter/2.0, end=hole_diameter / 2, tool_diameter=tool_diameter):
-            gcode.append(gcodes.g1_gcode(x=x_center-e, y=y_center, feedrate=feed_rate))
-            gcode.append(gcodes.g2_gcode(x_center_offset=e, y_center_offset=0, spiral_end_altitude=h,
-                                         feedrate=feed_rate))
+    if strategy == 'spiral':
+        for move in _spiral_hole_moves(x_center, y_center, hole_diameter, tool_diameter, feed_rate, z_feed_rate,
+                                       from_z, to_z, step_z, safety_z, center_diameter, step_over):
+            yield move
+        return
+    if strategy != 'concentric':
+        raise exceptions.WrongParameterError('Unknown hole strategy %s' % strategy)
+    yield toolpath.g0_move(z=safety_z)
+    # yield _g0_gcode(x=x_center-tool_diameter/2,y=y_center)
+    yield toolpath.g0_move(x=x_center - tool_diameter / 2, y=y_center)
+
+    for h in layer_heights(from_z, to_z, step_z):
+        yield toolpath.g1_move(z=h, feedrate=z_feed_rate)
+        for e in _generate_excentric(start=center_diameter/2.0, end=hole_diameter / 2, tool_diameter=tool_diameter,
+                                     step=step_over):
+            yield toolpath.g1_move(x=x_center-e, y=y_center, feedrate=feed_rate)
+            yield toolpath.g2_move(x_center_offset=e, y_center_offset=0, spiral_end_altitude=h,
+                                   feedrate=feed_rate)
         
-    gcode.append(gcodes.g1_gcode(z=safety_z, feedrate=feed_rate))
-    return ''.join(gcode)
+    yield toolpath.g1_move(z=safety_z, feedrate=feed_rate)
+
+
+def _spiral_hole_moves(x_center, y_center, hole_diameter, tool_diameter, feed_rate, z_feed_rate, from_z, to_z, step_z,
+                       safety_z, center_diameter, step_over):
+    r"""Generator of the moves of :func:`full_hole` with the spiral strategy"""
+    step = _step_over(tool_diameter, step_over)
+    first = center_diameter / 2.0 + tool_diameter / 2.0
+    last = max(hole_diameter / 2.0 - tool_diameter / 2.0, first)
+    # the radius grows by at most half the step over at each half circle, alternately on the left and on the right
+    radii = _spread(first, last, step / 2.0) if last > first else [last]
+    ends = [x_center - radius if index % 2 == 0 else x_center + radius for index, radius in enumerate(radii)]
+
+    yield toolpath.g0_move(z=safety_z)
+    yield toolpath.g0_move(x=ends[0], y=y_center)
+
+    previous_h = None
+    for h in layer_heights(from_z, to_z, step_z):
+        if previous_h is not None:
+            # back to the start above the material removed by the previous layer
+            yield toolpath.g0_move(z=previous_h)
+            yield toolpath.g0_move(x=ends[0], y=y_center)
+        yield toolpath.g1_move(z=h, feedrate=z_feed_rate)
+        # the first circle clears the center
+        yield toolpath.g2_move(x_center_offset=x_center - ends[0], y_center_offset=0.0, feedrate=feed_rate)
+        for start, end in zip(ends, ends[1:]):
+            yield toolpath.g2_move(x_end_point=end, y_end_point=y_center, x_center_offset=(end - start) / 2.0,
+                                   y_center_offset=0.0, feedrate=feed_rate)
+        # finishing circle
+        yield toolpath.g2_move(x_center_offset=x_center - ends[-1], y_center_offset=0.0, feedrate=feed_rate)
+        previous_h = h
+
+    yield toolpath.g1_move(z=safety_z, feedrate=feed_rate)
 
 
 def square_pocket(x_center, y_center, x_dimension, y_dimension, tool_diameter, feed_rate, z_feed_rate, from_z, to_z,
-                  step_z, safety_z):
-    r"""Generate Gcode to dig a square and remove the middle material"""
-    
+                  step_z, safety_z, step_over=None, strategy='offset', entry='plunge', entry_radius=None):
+    r"""Generate Gcode to dig a square and remove the middle material
+
+    Parameters
+    ----------
+    ...
+    step_over : float, optional
+        'offset' strategy: distance between two rings of the spiral in mm (e.g. 0.4 * tool_diameter for a 40% radial
+        engagement), defaults to half the tool diameter.
+        'trochoidal' strategy: advance of the tool per loop in mm, defaults to a tenth of the tool diameter.
+    strategy : str, optional
+        'offset' (the default): rectangular spiral from the center, the first ring is a full width slot.
+        'trochoidal': parallel slots cleared with circular loops at constant engagement (step_over),
+        then a finishing pass along the walls; the tool moves between the slots above the cleared depth.
+        The corners keep the radius of the tool.
+    entry : str, optional
+        How the tool goes down to each depth: 'plunge' (the default, straight down at z_feed_rate),
+        'ramp' (zigzag along the first segment) or 'helix' (helical turns), at feed_rate
+        and at most ENTRY_ANGLE degrees down
+    entry_radius : float, optional
+        Radius of the helix entry: from the center along Y, defaults to a quarter of the tool diameter
+        (less in narrow pockets). The trochoidal strategy goes down along its first loop by default.
+
+    """
+    return ''.join(iter_square_pocket(x_center, y_center, x_dimension, y_dimension, tool_diameter, feed_rate,
+                                      z_feed_rate, from_z, to_z, step_z, safety_z, step_over=step_over,
+                                      strategy=strategy, entry=entry, entry_radius=entry_radius))
+
+
+def iter_square_pocket(x_center, y_center, x_dimension, y_dimension, tool_diameter, feed_rate, z_feed_rate, from_z,
+                       to_z, step_z, safety_z, step_over=None, strategy='offset', entry='plunge', entry_radius=None):
+    r"""Streaming variant of :func:`square_pocket`, yields the Gcode line by line"""
+    return toolpath.iter_gcode(_square_pocket_moves(x_center, y_center, x_dimension, y_dimension, tool_diameter,
+                                                    feed_rate, z_feed_rate, from_z, to_z, step_z, safety_z,
+                                                    step_over=step_over, strategy=strategy, entry=entry,
+                                                    entry_radius=entry_radius))
+
+
+def _square_pocket_moves(x_center, y_center, x_dimension, y_dimension, tool_diameter, feed_rate, z_feed_rate, from_z,
+                         to_z, step_z, safety_z, step_over=None, strategy='offset', entry='plunge', entry_radius=None):
+    r"""Generator of the moves of :func:`square_pocket`"""
     if x_dimension < tool_diameter or y_dimension < tool_diameter:
         raise exceptions.WrongParameterError('Cannot make a square pocket smaller than the tool')
-
-    gcode = list()
-    gcode.append(gcodes.g0_gcode(x=0, y=0, z=safety_z))
-    gcode.append(gcodes.g0_gcode(x=x_center, y=y_center))
+    if strategy == 'trochoidal':
+        for move in _trochoidal_pocket_moves(x_center, y_center, x_dimension, y_dimension, tool_diameter, feed_rate,
+                                             z_feed_rate, from_z, to_z, step_z, safety_z, step_over, entry,
+                                             entry_radius):
+            yield move
+        return
+    if strategy != 'offset':
+        raise exceptions.WrongParameterError('Unknown pocket strategy %s' % strategy)
+    offsets = _ring_offsets(x_dimension, y_dimension, tool_diameter, step_over)
+
+    yield toolpath.g0_move(x=0, y=0, z=safety_z)
+    yield toolpath.g0_move(x=x_center, y=y_center)
     
     x_absolute_maximum = x_center + x_dimension / 2
     x_absolute_minimum = x_center - x_dimension / 2
@@ -312,53 +656,109 @@ def square_pocket(x_center, y_center, x_dimension, y_dimension, tool_diameter, f
     path_to_follow.append(point9)
     path_to_follow.append(point1)
 
-    for h in _generate_heights(from_z, to_z, step_z):
-        gcode.append(gcodes.g1_gcode(x=x_center, y=y_center, feedrate=feed_rate))
-        gcode.append(gcodes.g1_gcode(z=h, feedrate=z_feed_rate))
+    # towards the first ring
+    towards = [(x_center, min(y_center + offsets[0], y_maximum)), (min(x_center + offsets[0], x_maximum), y_center)]
+    if entry_radius is None:
+        entry_radius = _pocket_entry_radius(x_dimension, y_dimension, tool_diameter)
+
+    previous_h = None
+    for h in layer_heights(from_z, to_z, step_z):
+        yield toolpath.g1_move(x=x_center, y=y_center, feedrate=feed_rate)
+        for move in _entry_moves(entry, x_center, y_center, towards, previous_h, h, entry_radius, feed_rate,
+                                 z_feed_rate):
+            yield move
         
-        nb_turns = 0.00
-        
-        while nb_turns / 2 * tool_diameter < x_dimension / 2 or nb_turns / 2 * tool_diameter < y_dimension / 2.0:
-            y_maxi = min(y_center + (nb_turns / 2 + 0.5) * tool_diameter,
-                         y_center + y_dimension / 2 - tool_diameter / 2)
-            x_maxi = min(x_center + (nb_turns / 2 + 0.5) * tool_diameter,
-                         x_center + x_dimension / 2 - tool_diameter / 2)
-            y_mini = max(y_center - (nb_turns / 2 + 0.5) * tool_diameter,
-                         y_center - y_dimension / 2 + tool_diameter / 2)
-            x_mini = max(x_center - (nb_turns / 2 + 0.5) * tool_diameter,
-                         x_center - x_dimension / 2 + tool_diameter / 2)
-
-            gcode.append(gcodes.g1_gcode(y=y_maxi, feedrate=feed_rate))
-            gcode.append(gcodes.g1_gcode(x=x_maxi, feedrate=feed_rate))
-            gcode.append(gcodes.g1_gcode(y=y_mini, feedrate=feed_rate))
-            gcode.append(gcodes.g1_gcode(x=x_mini, feedrate=feed_rate))
-            gcode.append(gcodes.g1_gcode(y=y_maxi, feedrate=feed_rate))
-            gcode.append(gcodes.g1_gcode(x=x_center, feedrate=feed_rate))
-            
-            nb_turns += 1.00
+        for offset in offsets:
+            y_maxi = min(y_center + offset, y_center + y_dimension / 2 - tool_diameter / 2)
+            x_maxi = min(x_center + offset, x_center + x_dimension / 2 - tool_diameter / 2)
+            y_mini = max(y_center - offset, y_center - y_dimension / 2 + tool_diameter / 2)
+            x_mini = max(x_center - offset, x_center - x_dimension / 2 + tool_diameter / 2)
+
+            yield toolpath.g1_move(y=y_maxi, feedrate=feed_rate)
+            yield toolpath.g1_move(x=x_maxi, feedrate=feed_rate)
+            yield toolpath.g1_move(y=y_mini, feedrate=feed_rate)
+            yield toolpath.g1_move(x=x_mini, feedrate=feed_rate)
+            yield toolpath.g1_move(y=y_maxi, feedrate=feed_rate)
+            yield toolpath.g1_move(x=x_center, feedrate=feed_rate)
             
         # Cut the corners
         for point in path_to_follow:
-            gcode.append(gcodes.g1_gcode(x=point[0], y=point[1], feedrate=feed_rate))
-
-    gcode.append(gcodes.g1_gcode(z=safety_z, feedrate=feed_rate))
-    return ''.join(gcode)
+            yield toolpath.g1_move(x=point[0], y=point[1], feedrate=feed_rate)
+        previous_h = h
+
+    yield toolpath.g1_move(z=safety_z, feedrate=feed_rate)
+
+
+def _trochoidal_pocket_moves(x_center, y_center, x_dimension, y_dimension, tool_diameter, feed_rate, z_feed_rate,
+                             from_z, to_z, step_z, safety_z, step_over, entry, entry_radius):
+    r"""Generator of the moves of :func:`square_pocket` with the trochoidal strategy"""
+    step = _step_over(tool_diameter, step_over if step_over is not None else tool_diameter / 10.0)
+    tool_radius = tool_diameter / 2.0
+    x_low, x_high = x_center - x_dimension / 2.0 + tool_radius, x_center + x_dimension / 2.0 - tool_radius
+    y_low, y_high = y_center - y_dimension / 2.0 + tool_radius, y_center + y_dimension / 2.0 - tool_radius
+    # loops of the tool radius (slots twice as wide as the tool), smaller in narrow pockets
+    loop_radius = min(tool_radius, (x_high - x_low) / 2.0, (y_high - y_low) / 2.0)
+    # the slots overlap by step_over
+    lines = _spread(y_low + loop_radius, y_high - loop_radius, 2.0 * loop_radius + tool_diameter - step)
+    loops = _spread(x_low + loop_radius, x_high - loop_radius, step)
+
+    yield toolpath.g0_move(x=0, y=0, z=safety_z)
+    yield toolpath.g0_move(x=loops[0], y=lines[0] - loop_radius)
+
+    previous_h = None
+    for h in layer_heights(from_z, to_z, step_z):
+        for number, line in enumerate(lines):
+            centers = loops if number % 2 == 0 else loops[::-1]
+            if previous_h is not None or number:
+                # above the material removed by the previous slots or layer
+                yield toolpath.g0_move(z=h if previous_h is None else previous_h)
+                yield toolpath.g0_move(x=centers[0], y=line - loop_radius)
+            # along the first loop
+            for move in _entry_moves(entry, centers[0], line - loop_radius, [(centers[0], line)], previous_h, h,
+                                     entry_radius if entry_radius is not None else loop_radius, feed_rate,
+                                     z_feed_rate):
+                yield move
+            for index, center in enumerate(centers):
+                if index:
+                    yield toolpath.g1_move(x=center, y=line - loop_radius, feedrate=feed_rate)
+                if loop_radius > 0.0:
+                    yield toolpath.g3_move(x_center_offset=0.0, y_center_offset=loop_radius, feedrate=feed_rate)
+        # finishing pass along the walls, from the top of the last loop
+        yield toolpath.g1_move(x=centers[-1], y=y_high, feedrate=feed_rate)
+        yield toolpath.g1_move(x=x_high, feedrate=feed_rate)
+        yield toolpath.g1_move(y=y_low, feedrate=feed_rate)
+        yield toolpath.g1_move(x=x_low, feedrate=feed_rate)
+        yield toolpath.g1_move(y=y_high, feedrate=feed_rate)
+        yield toolpath.g1_move(x=centers[-1], feedrate=feed_rate)
+        previous_h = h
+
+    yield toolpath.g1_move(z=safety_z, feedrate=feed_rate)
 
 
 # def cylinder(x_center, y_center, cylinder_diameter, tool_diameter, feed_rate, z_feed_rate, from_z, to_z, step_z,
 #              safety_z
 def cylinder(x_center, y_center, cylinder_diameter, tool_diameter, feed_rate, from_z, to_z, step_z, safety_z):
     r"""Generate Gcode to cut a cylinder"""
-    gcode = list()
-    gcode.append(gcodes.g0_gcode(z=safety_z))
-    gcode.append(gcodes.g0_gcode(x=x_center - (cylinder_diameter + tool_diameter) / 2 + tool_diameter / 2, y=y_center))
+    return ''.join(iter_cylinder(x_center, y_center, cylinder_diameter, tool_diameter, feed_rate, from_z, to_z, step_z,
+                                 safety_z))
+
+
+def iter_cylinder(x_center, y_center, cylinder_diameter, tool_diameter, feed_rate, from_z, to_z, step_z, safety_z):
+    r"""Streaming variant of :func:`cylinder`, yields the Gcode line by line"""
+    return toolpath.iter_gcode(_cylinder_moves(x_center, y_center, cylinder_diameter, tool_diameter, feed_rate, from_z,
+                                               to_z, step_z, safety_z))
 
-    for h in _generate_heights(from_z, to_z, step_z):
-        gcode.append(gcodes.g3_gcode(x_center_offset=(cylinder_diameter + tool_diameter) / 2 - tool_diameter / 2,
-                                     y_center_offset=0, spiral_end_altitude=h, feedrate=feed_rate))
 
-    gcode.append(gcodes.g1_gcode(z=safety_z, feedrate=feed_rate))
-    return ''.join(gcode)
+def _cylinder_moves(x_center, y_center, cylinder_diameter, tool_diameter, feed_rate, from_z, to_z, step_z, safety_z):
+    r"""Generator of the moves of :func:`cylinder`"""
+    yield toolpath.g0_move(z=safety_z)
+    yield toolpath.g0_move(x=x_center - (cylinder_diameter + tool_diameter) / 2 + tool_diameter / 2, y=y_center)
+
+    for h in layer_heights(from_z, to_z, step_z):
+        yield toolpath.g3_move(x_center_offset=(cylinder_diameter + tool_diameter) / 2 - tool_diameter / 2,
+                               y_center_offset=0, spiral_end_altitude=h, feedrate=feed_rate)
+
+    yield toolpath.g1_move(z=safety_z, feedrate=feed_rate)
 
 
 def two_concentric_holes(x_center, y_center, hole_diameter_1, hole_diameter_2, tool_diameter, feed_rate, z_feed_rate,
@@ -372,45 +772,266 @@ def two_concentric_holes(x_center, y_center, hole_diameter_1, hole_diameter_2, t
         end of 1st hole height, start of 2nd
     ...
     """
-    
+    return ''.join(iter_two_concentric_holes(x_center, y_center, hole_diameter_1, hole_diameter_2, tool_diameter,
+                                             feed_rate, z_feed_rate, from_z_1, to_z_1, to_z_2, step_z, safety_z))
+
+
+def iter_two_concentric_holes(x_center, y_center, hole_diameter_1, hole_diameter_2, tool_diameter, feed_rate,
+                              z_feed_rate, from_z_1, to_z_1, to_z_2, step_z, safety_z):
+    r"""Streaming variant of :func:`two_concentric_holes`, yields the Gcode line by line"""
+    return toolpath.iter_gcode(_two_concentric_holes_moves(x_center, y_center, hole_diameter_1, hole_diameter_2,
+                                                           tool_diameter, feed_rate, z_feed_rate, from_z_1, to_z_1,
+                                                           to_z_2, step_z, safety_z))
+
+
+def _two_concentric_holes_moves(x_center, y_center, hole_diameter_1, hole_diameter_2, tool_diameter, feed_rate,
+                                z_feed_rate, from_z_1, to_z_1, to_z_2, step_z, safety_z):
+    r"""Generator of the moves of :func:`two_concentric_holes`"""
     if hole_diameter_2 > hole_diameter_1:
         raise exceptions.WrongParameterError('hole number 2 has to be smaller than hole number 1')
-    gcode = list()
-    gcode.append(full_hole(x_center, y_center, hole_diameter_1, tool_diameter, feed_rate, z_feed_rate, from_z_1, to_z_1,
-                           step_z, safety_z))
-    gcode.append(full_hole(x_center, y_center, hole_diameter_2, tool_diameter, feed_rate, z_feed_rate, to_z_1, to_z_2,
-                           step_z, safety_z))
-    return ''.join(gcode)
+    for move in _full_hole_moves(x_center, y_center, hole_diameter_1, tool_diameter, feed_rate, z_feed_rate, from_z_1,
+                                 to_z_1, step_z, safety_z):
+        yield move
+    for move in _full_hole_moves(x_center, y_center, hole_diameter_2, tool_diameter, feed_rate, z_feed_rate, to_z_1,
+                                 to_z_2, step_z, safety_z):
+        yield move
 
 
 def drill(x, y, depth, safety_height, feedrate):
     r"""Generate Gcode to drill at x,y"""
-    gcode = list()
-    # gcode.append('G98\n')
-    gcode.append(gcodes.g0_gcode(z=safety_height))
-    gcode.append(gcodes.g0_gcode(x=x, y=y))
-    gcode.append(gcodes.g81_gcode(z=depth, r=safety_height, feedrate=feedrate))
-    return ''.join(gcode)
+    return ''.join(iter_drill(x, y, depth, safety_height, feedrate))
+
+
+def iter_drill(x, y, depth, safety_height, feedrate):
+    r"""Streaming variant of :func:`drill`, yields the Gcode line by line"""
+    return toolpath.iter_gcode(_drill_moves(x, y, depth, safety_height, feedrate))
+
+
+def _drill_moves(x, y, depth, safety_height, feedrate):
+    r"""Generator of the moves of :func:`drill`"""
+    # yield 'G98\n'
+    yield toolpath.g0_move(z=safety_height)
+    yield toolpath.g0_move(x=x, y=y)
+    yield toolpath.g81_move(z=depth, r=safety_height, feedrate=feedrate)
 
 
 def drill_g73(x, y, depth, depth_increment, safety_height, feedrate):
     r"""Generate Gcode to drill at x,y with chip breaking"""
-    gcode = list()
-    # gcode.append('G98\n')
-    gcode.append(gcodes.g0_gcode(z=safety_height))
-    gcode.append(gcodes.g0_gcode(x=x, y=y))
-    gcode.append(gcodes.g73_gcode(z=depth, r=safety_height, q=depth_increment, feedrate=feedrate))
-    return ''.join(gcode)
+    return ''.join(iter_drill_g73(x, y, depth, depth_increment, safety_height, feedrate))
+
+
+def iter_drill_g73(x, y, depth, depth_increment, safety_height, feedrate):
+    r"""Streaming variant of :func:`drill_g73`, yields the Gcode line by line"""
+    return toolpath.iter_gcode(_drill_g73_moves(x, y, depth, depth_increment, safety_height, feedrate))
+
+
+def _drill_g73_moves(x, y, depth, depth_increment, safety_height, feedrate):
+    r"""Generator of the moves of :func:`drill_g73`"""
+    # yield 'G98\n'
+    yield toolpath.g0_move(z=safety_height)
+    yield toolpath.g0_move(x=x, y=y)
+    yield toolpath.g73_move(z=depth, r=safety_height, q=depth_increment, feedrate=feedrate)
 
 
 def drill_g83(x, y, depth, depth_increment, safety_height, feedrate):
     r"""Generate Gcode to peck drill at x,y"""
-    gcode = list()
-    # gcode.append('G98\n')
-    gcode.append(gcodes.g0_gcode(z=safety_height))
-    gcode.append(gcodes.g0_gcode(x=x, y=y))
-    gcode.append(gcodes.g83_gcode(z=depth, r=safety_height, q=depth_increment, feedrate=feedrate))
-    return ''.join(gcode)
+    return ''.join(iter_drill_g83(x, y, depth, depth_increment, safety_height, feedrate))
+
+
+def iter_drill_g83(x, y, depth, depth_increment, safety_height, feedrate):
+    r"""Streaming variant of :func:`drill_g83`, yields the Gcode line by line"""
+    return toolpath.iter_gcode(_drill_g83_moves(x, y, depth, depth_increment, safety_height, feedrate))
+
+
+def _drill_g83_moves(x, y, depth, depth_increment, safety_height, feedrate):
+    r"""Generator of the moves of :func:`drill_g83`"""
+    # yield 'G98\n'
+    yield toolpath.g0_move(z=safety_height)
+    yield toolpath.g0_move(x=x, y=y)
+    yield toolpath.g83_move(z=depth, r=safety_height, q=depth_increment, feedrate=feedrate)
+
+
+def drill_many(xs, ys, depth, safety_height, feedrate, depth_increment=None, cycle='g81'):
+    r"""Generate Gcode to drill an array of holes with a single canned cycle
+
+    The canned cycle is written in full for the first hole; the next holes only get their X and Y words,
+    as the cycle and its Z, R, Q and F words are modal.
+
+    Parameters
+    ----------
+    xs, ys : sequences of float
+        Coordinates of the holes (lists, array.array, NumPy arrays ...), see also grid_points and bolt_circle_points
+    depth : float
+        Bottom of the holes
+    safety_height : float
+        Retract height between the holes
+    feedrate : float
+        Drilling feedrate in mm/mn
+    depth_increment : float, optional
+        Peck depth, required by the g73 and g83 cycles
+    cycle : str, optional
+        'g81' (normal drill, the default), 'g73' (chip breaking) or 'g83' (peck drill)
+
+    Raises
+    ------
+    WrongParameterError
+        If xs and ys do not have the same length, if there is no hole or if the cycle is unknown
+
+    Examples
+    --------
+    >>> print(drill_many([1.0, 2.0, 3.0], [0.0, 0.0, 1.0], -4.0, 10.0, 200.0).replace(' \n', '\n'))
+    G0 Z10.0
+    G0 X1.0 Y0.0
+    G81 G98 Z-4.0 R10.0 F200.0
+    X2.0 Y0.0
+    X3.0 Y1.0
+    <BLANKLINE>
+
+    """
+    return ''.join(iter_drill_many(xs, ys, depth, safety_height, feedrate, depth_increment=depth_increment,
+                                   cycle=cycle))
+
+
+def iter_drill_many(xs, ys, depth, safety_height, feedrate, depth_increment=None, cycle='g81'):
+    r"""Streaming variant of :func:`drill_many`, yields the Gcode line by line"""
+    return toolpath.iter_gcode(_drill_many_moves(xs, ys, depth, safety_height, feedrate,
+                                                 depth_increment=depth_increment, cycle=cycle))
+
+
+def _drill_many_moves(xs, ys, depth, safety_height, feedrate, depth_increment=None, cycle='g81'):
+    r"""Generator of the moves of :func:`drill_many`"""
+    if len(xs) != len(ys):
+        raise exceptions.WrongParameterError('xs and ys must have the same length')
+    if not len(xs):
+        raise exceptions.WrongParameterError('No hole to drill')
+    if cycle == 'g81':
+        first_cycle = toolpath.g81_move(z=depth, r=safety_height, feedrate=feedrate)
+    elif cycle == 'g73':
+        first_cycle = toolpath.g73_move(z=depth, r=safety_height, q=depth_increment, feedrate=feedrate)
+    elif cycle == 'g83':
+        first_cycle = toolpath.g83_move(z=depth, r=safety_height, q=depth_increment, feedrate=feedrate)
+    else:
+        raise exceptions.WrongParameterError('Unknown drilling cycle %s' % cycle)
+    holes = iter(zip(xs, ys))
+    x, y = next(holes)
+    yield toolpath.g0_move(z=safety_height)
+    yield toolpath.g0_move(x=float(x), y=float(y))
+    yield first_cycle
+    repeat_cycle_move = toolpath.repeat_cycle_move
+    kind = first_cycle.kind
+    for x, y in holes:
+        yield repeat_cycle_move(kind, float(x), float(y))
+
+
+def grid_points(x_start, y_start, x_count, y_count, x_pitch, y_pitch):
+    r"""Coordinates of a rectangular array of holes, in serpentine order to minimize the travel
+
+    Returns
+    -------
+    xs, ys : lists of float
+
+    Examples
+    --------
+    >>> grid_points(0.0, 0.0, 3, 2, 10.0, 5.0)
+    ([0.0, 10.0, 20.0, 20.0, 10.0, 0.0], [0.0, 0.0, 0.0, 5.0, 5.0, 5.0])
+
+    """
+    xs, ys = list(), list()
+    for row in range(y_count):
+        columns = range(x_count) if row % 2 == 0 else range(x_count - 1, -1, -1)
+        for column in columns:
+            xs.append(x_start + column * x_pitch)
+            ys.append(y_start + row * y_pitch)
+    return xs, ys
+
+
+def bolt_circle_points(x_center, y_center, diameter, count, start_angle=0.0):
+    r"""Coordinates of holes equally spaced on a circle, counterclockwise from start_angle (degrees)
+
+    Returns
+    -------
+    xs, ys : lists of float
+
+    Examples
+    --------
+    >>> xs, ys = bolt_circle_points(0.0, 0.0, 20.0, 4)
+    >>> [round(x, 9) for x in xs], [round(y, 9) for y in ys]
+    ([10.0, 0.0, -10.0, -0.0], [0.0, 10.0, 0.0, -10.0])
+
+    """
+    if count < 1:
+        raise exceptions.WrongParameterError('A bolt circle needs at least one hole')
+    xs, ys = list(), list()
+    for k in range(count):
+        angle = math.radians(start_angle + 360.0 * k / count)
+        xs.append(x_center + diameter / 2.0 * math.cos(angle))
+        ys.append(y_center + diameter / 2.0 * math.sin(angle))
+    return xs, ys
+
+
+def layer_heights(from_z, to_z, step_z, even=False, finishing=None):
+    r"""Heights of the layers that mill down from from_z to to_z, at most -step_z apart
+
+    Every height is computed from its index, so the number of layers is exact: no near duplicate of to_z
+    (e.g. -0.9999999999999999 before -1.0) adds a layer of cutting.
+
+    Parameters
+    ----------
+    from_z : float
+        Height of the first layer (usually the surface)
+    to_z : float
+        Height of the last layer, below from_z
+    step_z : negative float
+        Largest step between two layers
+    even : bool, optional
+        Same step between all the layers, else full steps and a thinner last layer. Defaults to False
+    finishing : float, optional
+        Depth of a last, finishing layer: the other layers go down to to_z + finishing. Defaults to None
+
+    Returns
+    -------
+    array.array of float
+
+    Raises
+    ------
+    MissingParameterError
+        If a height or the step is None
+    WrongParameterError
+        If to_z is above from_z, if step_z is not negative or if finishing is not in ]0, from_z - to_z[
+
+    Examples
+    --------
+    >>> list(layer_heights(0.0, -1.0, -0.4))
+    [0.0, -0.4, -0.8, -1.0]
+    >>> list(layer_heights(0.0, -1.0, -0.4, even=True))
+    [0.0, -0.3333333333333333, -0.6666666666666666, -1.0]
+    >>> list(layer_heights(0.0, -1.0, -0.4, finishing=0.1))
+    [0.0, -0.4, -0.8, -0.9, -1.0]
+    >>> len(layer_heights(0.0, -1.0, -0.1))
+    11
+
+    """
+    if to_z is None or from_z is None or step_z is None:
+        raise exceptions.MissingParameterError('Missing parameter')
+    if from_z < to_z:
+        raise exceptions.WrongParameterError('we are supposed to mill down - altitude problem')
+    if step_z >= 0:
+        raise exceptions.WrongParameterError('we are supposed to mill down - step problem')
+    if finishing is not None:
+        if not 0.0 < finishing < from_z - to_z:
+            raise exceptions.WrongParameterError('The finishing depth must be positive and less than the depth')
+        heights = layer_heights(from_z, to_z + finishing, step_z, even=even)
+        heights.append(to_z)
+        return heights
+
+    from_z, to_z = float(from_z), float(to_z)
+    count = int(math.ceil((from_z - to_z) / -step_z - 1e-9))
+    if even:
+        heights = array('d', (from_z + (to_z - from_z) * index / count for index in range(count)))
+    else:
+        heights = array('d', (from_z + index * step_z for index in range(count)))
+    heights.append(to_z)
+    return heights
 
 
 def start_gcode():
@@ -432,8 +1053,110 @@ def end_gcode():
     return ''.join(end_code)
 
 
+_MOVE_GENERATORS = {'oval': _oval_moves,
+                    'path': _path_moves,
+                    'rectangle': _rectangle_moves,
+                    'rectangle_rounded_corners': _rectangle_rounded_corners_moves,
+                    'thin_from_center': _thin_from_center_moves,
+                    'thin': _thin_moves,
+                    'hole': _hole_moves,
+                    'full_hole': _full_hole_moves,
+                    'square_pocket': _square_pocket_moves,
+                    'cylinder': _cylinder_moves,
+                    'two_concentric_holes': _two_concentric_holes_moves,
+                    'drill': _drill_moves,
+                    'drill_g73': _drill_g73_moves,
+                    'drill_g83': _drill_g83_moves,
+                    'drill_many': _drill_many_moves}
+
+SHAPES = tuple(sorted(_MOVE_GENERATORS))
+
+
+def make_toolpath(shape, *args, **kwargs):
+    r"""Generate the toolpath of a shape instead of its Gcode
+
+    Parameters
+    ----------
+    shape : function or str
+        One of the shape functions of this module (e.g. square_pocket) or its name
+    args, kwargs
+        The parameters of the shape function
+
+    Returns
+    -------
+    toolpath.Toolpath
+
+    Raises
+    ------
+    WrongParameterError
+        If shape is not a shape function of this module
+
+    Examples
+    --------
+    >>> tp = make_toolpath(drill, 1.0, 2.0, -4.0, 10.0, 200.0)
+    >>> len(tp)
+    3
+    >>> tp.to_gcode() == drill(1.0, 2.0, -4.0, 10.0, 200.0)
+    True
+
+    """
+    name = getattr(shape, '__name__', shape)
+    try:
+        moves = _MOVE_GENERATORS[name]
+    except KeyError:
+        raise exceptions.WrongParameterError('%s is not a shape' % name)
+    return toolpath.Toolpath.from_moves(moves(*args, **kwargs))
+
+
+def write_to(fileobj, gcode, chunk_size=1024):
+    r"""Write Gcode to a file-like object without building the whole program in memory
+
+    Parameters
+    ----------
+    fileobj : file-like
+        Any object with a write() method (file, socket.makefile(), io.StringIO ...)
+    gcode : str or iterable of str
+        Gcode text, or the lines yielded by one of the iter_* generators
+    chunk_size : int, optional
+        Number of lines joined together before each write() call, defaults to 1024
+
+    Returns
+    -------
+    int
+        The number of characters written
+
+    Examples
+    --------
+    >>> import io
+    >>> f = io.StringIO()
+    >>> write_to(f, iter_drill(1.0, 2.0, -4.0, 10.0, 200.0))
+    52
+    >>> f.getvalue() == drill(1.0, 2.0, -4.0, 10.0, 200.0)
+    True
+
+    """
+    if chunk_size < 1:
+        raise exceptions.WrongParameterError('chunk_size must be strictly positive')
+    if isinstance(gcode, str):
+        gcode = [gcode]
+    written = 0
+    chunk = list()
+    for line in gcode:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            data = ''.join(chunk)
+            fileobj.write(data)
+            written += len(data)
+            chunk = list()
+    if chunk:
+        data = ''.join(chunk)
+        fileobj.write(data)
+        written += len(data)
+    return written
+
+
 def _generate_heights(from_z=0.0, to_z=-1.0, step=-0.10):
-    """Generator of Z heights, intended to be used in a for loop to mill down in steps.
+    """Generator of Z heights, intended to be used in a for loop to mill down in steps, see layer_heights
 
     Parameters
     ----------
@@ -445,28 +1168,16 @@ def _generate_heights(from_z=0.0, to_z=-1.0, step=-0.10):
         the step by which the milling head goes from from_z to to_z, defaults to -0.1
 
     """
-    if to_z is None or from_z is None or step is None:
-        raise exceptions.MissingParameterError('Missing parameter')
+    for h in layer_heights(from_z, to_z, step):
+        yield h
 
-    if from_z < to_z:
-        raise exceptions.WrongParameterError('we are supposed to mill down - altitude problem')
-    
-    if step >= 0:
-        raise exceptions.WrongParameterError('we are supposed to mill down - step problem')
 
-    cur = float(from_z)
-    
-    while cur > to_z:
-        yield cur
-        cur += step
-        
-    yield to_z
-
-
-def _generate_excentric(start=0.0, end=1.0, tool_diameter=3.0):
+def _generate_excentric(start=0.0, end=1.0, tool_diameter=3.0, step=None):
     """Generator of Z excentric values, This function is intended 
     to be used in a for loop to mill outwards in steps of tool_diameter/2
 
+    Every value is computed from its index, so the last step is not followed by a near duplicate of the last value.
+
     Parameters
     ----------
     start : float, optional
@@ -475,23 +1186,210 @@ def _generate_excentric(start=0.0, end=1.0, tool_diameter=3.0):
         end position, defaults to 1.0
     tool_diameter : float, optional
         tool diameter in mm, defaults to 3.0
+    step : float, optional
+        radial step in mm, defaults to tool_diameter/2
 
     """
     if end < tool_diameter / 2.0:
         raise exceptions.WrongParameterError('cannot generate excentric dimensions')
-    
-    value = float(start) + float(tool_diameter / 2.0)
-    
-    while value < end-tool_diameter/2.0:
-        yield value 
-        value += tool_diameter / 2.0
-        
-    yield end - tool_diameter / 2.0
+    step = _step_over(tool_diameter, step)
+
+    first = float(start) + float(tool_diameter / 2.0)
+    last = end - tool_diameter / 2.0
+    count = int(math.ceil((last - first) / step - 1e-9))
+    for index in range(count):
+        yield first + index * step
+
+    yield last
 
 
-class Point:
+def _step_over(tool_diameter, step_over):
+    """Returns the step over in mm, half the tool diameter by default
+
+    Raises
+    ------
+    WrongParameterError
+        If the step over is not in ]0, tool_diameter]
+
+    """
+    if step_over is None:
+        return tool_diameter / 2.0
+    if not 0.0 < step_over <= tool_diameter:
+        raise exceptions.WrongParameterError('The step over must be positive and at most the tool diameter')
+    return step_over
+
+
+def _spread(first, last, step):
+    """Evenly spaced values from first to last, at most step apart (the middle if last < first)
+
+    Examples
+    --------
+    >>> _spread(0.0, 10.0, 4.0)
+    [0.0, 3.3333333333333335, 6.666666666666667, 10.0]
+    >>> _spread(2.0, 1.0, 4.0)
+    [1.5]
+
+    """
+    if last <= first:
+        return [(first + last) / 2.0]
+    count = int(math.ceil((last - first) / step - 1e-9))
+    return [first + (last - first) * index / count for index in range(count)] + [last]
+
+
+def _entry_moves(entry, x, y, towards, from_height, to_height, radius, feed_rate, z_feed_rate, side=0):
+    """Generator of the moves going down at (x, y) from from_height to to_height, ending at (x, y)
+
+    The direction of the entry is the one of the first of the (x, y) points of towards that is not (x, y).
+    The ramp goes back and forth along it, the full circles of the helix go through (x, y) and their center
+    is radius away in that direction (side=0), on its left (side=1) or on its right (side=-1).
+    The tool plunges at z_feed_rate if entry is 'plunge', if from_height is None or if there is no direction.
+
+    Examples
+    --------
+    >>> import pycnc.toolpath as toolpath
+    >>> moves = list(_entry_moves('ramp', 0.0, 0.0, [(0.0, 0.0), (10.0, 0.0)], 0.0, -0.5, None, 600.0, 200.0))
+    >>> [(round(move.x, 3), move.y, move.z) for move in moves]
+    [(4.77, 0.0, -0.25), (0.0, 0.0, -0.5)]
+    >>> moves = list(_entry_moves('helix', 0.0, 0.0, [(10.0, 0.0)], 0.0, -0.5, 2.0, 600.0, 200.0, side=-1))
+    >>> [(move.kind == toolpath.ARC_CW, move.z, move.i, move.j) for move in moves]
+    [(True, -0.5, 0.0, -2.0)]
+
+    """
+    if entry not in ENTRIES:
+        raise exceptions.WrongParameterError('Unknown entry %s' % entry)
+    direction = None
+    if entry != 'plunge' and from_height is not None and from_height > to_height:
+        for x_towards, y_towards in towards:
+            length = math.hypot(x_towards - x, y_towards - y)
+            if length > 1e-9:
+                direction = ((x_towards - x) / length, (y_towards - y) / length)
+                break
+    if direction is None:
+        yield toolpath.g1_move(z=to_height, feedrate=z_feed_rate)
+        return
+
+    depth = from_height - to_height
+    slope = math.tan(math.radians(ENTRY_ANGLE))
+    if entry == 'ramp':
+        # as many back and forth moves as needed to stay on the segment
+        count = int(math.ceil(depth / slope / (2.0 * length) - 1e-9))
+        leg = depth / slope / (2.0 * count)
+        for index in range(count):
+            yield toolpath.g1_move(x=x + leg * direction[0], y=y + leg * direction[1],
+                                   z=from_height - (index + 0.5) * depth / count, feedrate=feed_rate)
+            yield toolpath.g1_move(x=x, y=y, z=from_height - (index + 1) * depth / count, feedrate=feed_rate)
+        return
+
+    if radius is None:
+        raise exceptions.MissingParameterError('The helix entry needs a radius')
+    if radius <= 0.0:
+        raise exceptions.WrongParameterError('The radius of the helix entry must be positive')
+    x_offset, y_offset = direction if not side else (-side * direction[1], side * direction[0])
+    count = int(math.ceil(depth / (slope * 2.0 * math.pi * radius) - 1e-9))
+    for index in range(count):
+        yield toolpath.g2_move(x_end_point=x, y_end_point=y,
+                               spiral_end_altitude=from_height - (index + 1) * depth / count,
+                               x_center_offset=radius * x_offset, y_center_offset=radius * y_offset,
+                               feedrate=feed_rate)
+
+
+def _continuous(descent, entry):
+    """True for the continuous descent, checking the descent and entry parameters"""
+    if descent not in ('layers', 'continuous'):
+        raise exceptions.WrongParameterError('Unknown descent %s' % descent)
+    if descent == 'continuous' and entry != 'plunge':
+        raise exceptions.WrongParameterError('The continuous descent has no entry')
+    return descent == 'continuous'
+
+
+def _descending_moves(x, y, contour, from_height, to_height):
+    """Generator of the moves of a contour starting at (x, y), going down from from_height to to_height
+
+    The contour is made of G1, G2 and G3 moves whose X and Y are all defined. The altitude decreases in proportion
+    to the length travelled: linearly along the lines, helically along the arcs.
+
+    Examples
+    --------
+    >>> import pycnc.toolpath as toolpath
+    >>> contour = [toolpath.g1_move(x=x, y=y) for x, y in ((10.0, 0.0), (10.0, 10.0), (0.0, 10.0), (0.0, 0.0))]
+    >>> [move.z for move in _descending_moves(0.0, 0.0, contour, 0.0, -1.0)]
+    [-0.25, -0.5, -0.75, -1.0]
+
+    """
+    lengths = list()
+    x_start, y_start = x, y
+    for move in contour:
+        if move.kind == toolpath.LINEAR:
+            lengths.append(math.hypot(move.x - x_start, move.y - y_start))
+        else:
+            lengths.append(math.hypot(move.i, move.j) * geometry.arc_sweep(x_start, y_start, move.x, move.y, move.i,
+                                                                           move.j, move.kind == toolpath.ARC_CW))
+        x_start, y_start = move.x, move.y
+    total = sum(lengths)
+    travelled = 0.0
+    for index, (move, length) in enumerate(zip(contour, lengths)):
+        travelled += length
+        if index == len(contour) - 1:
+            yield move._replace(z=to_height)
+        else:
+            yield move._replace(z=from_height - (from_height - to_height) * travelled / total)
+
+
+def _continuous_moves(x, y, contour, from_z, to_z, step_z, z_feed_rate):
+    """Generator of the moves of a closed contour starting at (x, y) with the continuous descent
+
+    The tool goes down to from_z, then down along the contour by step_z at each turn and once more flat at to_z.
+    """
+    heights = layer_heights(from_z, to_z, step_z)
+    yield toolpath.g1_move(z=heights[0], feedrate=z_feed_rate)
+    for previous_h, h in zip(heights, heights[1:]):
+        for move in _descending_moves(x, y, contour, previous_h, h):
+            yield move
+    for move in contour:
+        yield move
+
+
+def _at_height(contour, h):
+    """Generator of the moves of a contour at the altitude h: its arcs end at h, its lines are yielded as they are
+
+    The moves of the contour are built once, so that toolpath.iter_gcode formats them once for all the layers.
+    """
+    linear = toolpath.LINEAR
+    for move in contour:
+        yield move if move.kind == linear else toolpath.with_z(move, h)
+
+
+def _pocket_entry_radius(x_dimension, y_dimension, tool_diameter):
+    """Default radius of the helix entry from the center of a region, towards +Y, that stays inside the region"""
+    return min(tool_diameter / 4.0, (y_dimension - tool_diameter) / 4.0, (x_dimension - tool_diameter) / 2.0)
+
+
+def _ring_offsets(x_dimension, y_dimension, tool_diameter, step_over=None):
+    """Offsets from the center of the rings of a rectangular spiral clearing a region
+
+    The first ring is at half the tool diameter from the center and the next ones are step_over further,
+    until the last ring reaches the walls on both axes (the offsets are clipped to the walls by the caller).
+    This is the minimal number of rings: none is repeated at the walls.
+
+    Examples
+    --------
+    >>> _ring_offsets(25.1, 25.1, 6.0)
+    [3.0, 6.0, 9.0, 12.0]
+    >>> _ring_offsets(25.1, 10.0, 6.0, step_over=2.4)
+    [3.0, 5.4, 7.8, 10.2]
+
+    """
+    step = _step_over(tool_diameter, step_over)
+    farthest = max(x_dimension, y_dimension) / 2.0 - tool_diameter / 2.0
+    count = max(1, int(math.ceil((farthest - tool_diameter / 2.0) / step - 1e-9)) + 1)
+    return [tool_diameter / 2.0 + ring * step for ring in range(count)]
+
+
+class Point(object):
     r"""Simple class that stores 2D coordinates for a point
 
+    See pycnc.geometry to transform batches of points.
+
     Parameters
     ----------
     x : float
@@ -507,6 +1405,8 @@ class Point:
         The Y coordinate.
 
     """
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -563,9 +1463,7 @@ class Point:
         1.0
 
         """
-        rads = math.radians(degs)
-        return Point(self.x * math.cos(rads) - self.y * math.sin(rads),
-                     self.x * math.sin(rads) + self.y * math.cos(rads))
+        return Point(*geometry.Rotation(0.0, 0.0, degs, clockwise=False).apply(self.x, self.y))
     
     def rotate(self, center, degs):
         r"""Return a new point created by rotating self CW (clockwise)around center
@@ -584,10 +1482,4 @@ class Point:
         0.0
 
         """
-        rads = math.radians(degs)
-        displacement = self - center
-        point = Point(0, 0)
-        point.x = displacement.x * math.cos(rads) + displacement.y * math.sin(rads)
-        point.y = displacement.y * math.cos(rads) - displacement.x * math.sin(rads)
-        point = point + center
-        return point
+        return Point(*geometry.Rotation(center.x, center.y, degs).apply(self.x, self.y))
@@ -0,0 +1,246 @@
+# coding: utf-8
+
+r"""Machining time estimation
+
+Summary
+-------
+Estimates the length and the duration of toolpaths (generated by pycnc.core or parsed .ngc files):
+straight lengths for G0 and G1, true helical lengths for G2 and G3 (arc and altitude change),
+and the motions of the G73, G81 and G83 canned cycles.
+
+Each move starts and ends at rest, as in the exact path mode (G61) set by core.start_gcode(),
+so with an acceleration limit the duration of a move follows a trapezoidal (or triangular) speed profile.
+The speed on arcs is also limited by the centripetal acceleration.
+
+"""
+
+from __future__ import division
+
+import math
+from collections import namedtuple
+
+import pycnc.geometry as geometry
+import pycnc.parser as parser
+import pycnc.toolpath as toolpath
+import pycnc.exceptions as exceptions
+
+
+Estimate = namedtuple('Estimate', ['time', 'cutting_time', 'rapid_time', 'cutting_length', 'rapid_length'])
+Estimate.__doc__ = r"""Durations in seconds and lengths in mm of a set of moves"""
+
+
+class Machine(object):
+    r"""Kinematic limits of a machine
+
+    Parameters
+    ----------
+    rapid_rate : float, optional
+        Speed of the rapid moves in mm/min, defaults to 3000.0
+    z_rapid_rate : float, optional
+        Maximum speed of the Z axis in rapid moves in mm/min, defaults to rapid_rate
+    max_feedrate : float, optional
+        Maximum cutting speed in mm/min (the F words are capped to it), defaults to None i.e. no limit
+    acceleration : float, optional
+        Acceleration of the axes in mm/s2, defaults to None i.e. infinite
+
+    """
+    def __init__(self, rapid_rate=3000.0, z_rapid_rate=None, max_feedrate=None, acceleration=None):
+        if rapid_rate <= 0.0 or (z_rapid_rate is not None and z_rapid_rate <= 0.0):
+            raise exceptions.WrongParameterError('Rapid rates must be positive')
+        if acceleration is not None and acceleration <= 0.0:
+            raise exceptions.WrongParameterError('The acceleration must be positive')
+        self.rapid_rate = rapid_rate
+        self.z_rapid_rate = z_rapid_rate if z_rapid_rate is not None else rapid_rate
+        self.max_feedrate = max_feedrate
+        self.acceleration = acceleration
+
+    def move_time(self, length, rate, radius=None):
+        r"""Duration in seconds of a move of length mm at rate mm/min, starting and ending at rest
+
+        Examples
+        --------
+        >>> Machine().move_time(100.0, 600.0)
+        10.0
+        >>> Machine(acceleration=100.0).move_time(100.0, 600.0)
+        10.1
+        >>> Machine(acceleration=100.0).move_time(0.04, 600.0)
+        0.04
+
+        """
+        if length <= 0.0:
+            return 0.0
+        speed = rate / 60.0
+        acceleration = self.acceleration
+        if acceleration is None:
+            return length / speed
+        if radius:
+            speed = min(speed, math.sqrt(acceleration * radius))
+        if length >= speed * speed / acceleration:
+            return length / speed + speed / acceleration
+        return 2.0 * math.sqrt(length / acceleration)
+
+
+def arc_length(x_start, y_start, x_end, y_end, i, j, dz, clockwise):
+    r"""Length of a helical arc (G2 if clockwise, else G3), a full turn if it ends where it starts
+
+    Examples
+    --------
+    >>> round(arc_length(0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, True), 9) == round(2.0 * math.pi, 9)
+    True
+    >>> round(arc_length(0.0, 0.0, 2.0, 0.0, 1.0, 0.0, -math.pi, True), 9) == round(math.pi * math.sqrt(2.0), 9)
+    True
+
+    """
+    sweep = geometry.arc_sweep(x_start, y_start, x_end, y_end, i, j, clockwise)
+    return math.hypot(math.hypot(i, j) * sweep, dz)
+
+
+class Estimator(object):
+    r"""Accumulates the length and duration of moves, keeping the position between calls
+
+    Parameters
+    ----------
+    machine : Machine, optional
+        Defaults to Machine()
+    start : tuple, optional
+        (x, y, z) position of the tool at the start, None for an unknown coordinate
+        (moves from an unknown coordinate do not count on that axis), defaults to (0.0, 0.0, None)
+
+    Examples
+    --------
+    >>> import pycnc.core
+    >>> estimator = Estimator(Machine(rapid_rate=6000.0))
+    >>> estimator.add(pycnc.core.make_toolpath('drill', 30.0, 40.0, -5.0, 5.0, 120.0))
+    Estimate(time=5.6, cutting_time=5.0, rapid_time=0.6, cutting_length=10.0, rapid_length=60.0)
+    >>> estimator.position
+    [30.0, 40.0, 5.0]
+
+    """
+    def __init__(self, machine=None, start=(0.0, 0.0, None)):
+        self.machine = machine if machine is not None else Machine()
+        self.position = list(start)
+        self.feedrate = None
+        self.total = Estimate(0.0, 0.0, 0.0, 0.0, 0.0)
+        self._cycle = {'z': None, 'r': None, 'q': None, 'initial_z': None}
+        self._in_cycle = False
+
+    def add(self, moves):
+        r"""Returns the Estimate of moves (a toolpath.Toolpath or an iterable of toolpath.Move), added to total"""
+        if isinstance(moves, toolpath.Toolpath):
+            moves = zip(moves.kind, moves.x, moves.y, moves.z, moves.i, moves.j, moves.r, moves.q, moves.feedrate)
+        move_time = self.machine.move_time
+        position = self.position
+        cutting_time = rapid_time = cutting_length = rapid_length = 0.0
+        for kind, x, y, z, i, j, r, q, feedrate in moves:
+            # None (parsed moves) and NaN (toolpath arrays) are undefined words
+            if feedrate is not None and feedrate == feedrate:
+                self.feedrate = feedrate
+            if kind in toolpath.CANNED_CYCLES:
+                cycle = self._cycle_motions(kind, x, y, z, r, q)
+                for rapid, length, dz in cycle:
+                    if rapid:
+                        rapid_length += length
+                        rapid_time += move_time(length, self._rapid_rate(length, dz))
+                    else:
+                        cutting_length += length
+                        cutting_time += move_time(length, self._cutting_rate())
+                continue
+            self._in_cycle = False
+            x_start, y_start, z_start = position
+            if x is not None and x == x:
+                position[0] = x
+            if y is not None and y == y:
+                position[1] = y
+            if z is not None and z == z:
+                position[2] = z
+            dx = 0.0 if x_start is None or position[0] is None else position[0] - x_start
+            dy = 0.0 if y_start is None or position[1] is None else position[1] - y_start
+            dz = 0.0 if z_start is None or position[2] is None else position[2] - z_start
+            if kind == toolpath.RAPID:
+                length = math.sqrt(dx * dx + dy * dy + dz * dz)
+                rapid_length += length
+                rapid_time += move_time(length, self._rapid_rate(length, dz))
+            elif kind == toolpath.LINEAR:
+                length = math.sqrt(dx * dx + dy * dy + dz * dz)
+                cutting_length += length
+                cutting_time += move_time(length, self._cutting_rate())
+            else:
+                i = 0.0 if i is None or i != i else i
+                j = 0.0 if j is None or j != j else j
+                length = arc_length(x_start or 0.0, y_start or 0.0, (x_start or 0.0) + dx, (y_start or 0.0) + dy, i,
+                                    j, dz, kind == toolpath.ARC_CW)
+                cutting_length += length
+                cutting_time += move_time(length, self._cutting_rate(), radius=math.hypot(i, j))
+        estimate = Estimate(cutting_time + rapid_time, cutting_time, rapid_time, cutting_length, rapid_length)
+        self.total = Estimate(*[a + b for a, b in zip(self.total, estimate)])
+        return estimate
+
+    def _cutting_rate(self):
+        if not self.feedrate:
+            raise exceptions.WrongParameterError('Cutting move without feedrate')
+        if self.machine.max_feedrate is not None:
+            return min(self.feedrate, self.machine.max_feedrate)
+        return self.feedrate
+
+    def _rapid_rate(self, length, dz):
+        if not dz:
+            return self.machine.rapid_rate
+        return min(self.machine.rapid_rate, self.machine.z_rapid_rate * length / abs(dz))
+
+    def _cycle_motions(self, kind, x, y, z, r, q):
+        r"""Returns the (rapid, length, dz) motions of a canned cycle move (with the G98 retract of pycnc)"""
+        cycle = self._cycle
+        position = self.position
+        if not self._in_cycle:
+            cycle['initial_z'] = position[2]
+            self._in_cycle = True
+        for name, value in (('z', z), ('r', r), ('q', q)):
+            if value is not None and value == value:
+                cycle[name] = value
+        bottom, retract = cycle['z'], cycle['r']
+        if bottom is None or retract is None:
+            raise exceptions.WrongParameterError('Canned cycle without Z or R')
+        motions = list()
+        x_start, y_start = position[0], position[1]
+        if x is not None and x == x:
+            position[0] = x
+        if y is not None and y == y:
+            position[1] = y
+        dx = 0.0 if x_start is None or position[0] is None else position[0] - x_start
+        dy = 0.0 if y_start is None or position[1] is None else position[1] - y_start
+        motions.append((True, math.hypot(dx, dy), 0.0))
+        current_z = position[2] if position[2] is not None else retract
+        motions.append((True, abs(current_z - retract), current_z - retract))
+        depth = retract - bottom
+        motions.append((False, depth, depth))
+        if kind == toolpath.DRILL_PECK and cycle['q']:
+            # back to R after each peck, then rapid down to the previous depth
+            pecks = int(math.ceil(depth / cycle['q'] - 1e-9))
+            for peck in range(1, pecks):
+                reached = min(peck * cycle['q'], depth)
+                motions.append((True, 2.0 * reached, 2.0 * reached))
+        clearance = retract if cycle['initial_z'] is None else max(cycle['initial_z'], retract)
+        motions.append((True, clearance - bottom, clearance - bottom))
+        position[2] = clearance
+        return motions
+
+
+def estimate(moves, machine=None, start=(0.0, 0.0, None)):
+    r"""Returns the Estimate of moves (a toolpath.Toolpath or an iterable of toolpath.Move)
+
+    Examples
+    --------
+    >>> import pycnc.core
+    >>> tp = pycnc.core.make_toolpath('hole', 0.0, 0.0, 10.0, 2.0, 600.0, 0.0, -1.0, -1.0, 5.0)
+    >>> result = estimate(tp, start=(-4.0, 0.0, 5.0))
+    >>> turns = math.hypot(8.0 * math.pi, 5.0) + math.hypot(8.0 * math.pi, 1.0)
+    >>> round(result.cutting_length, 6) == round(turns + 6.0, 6)
+    True
+
+    """
+    return Estimator(machine, start=start).add(moves)
+
+
+def estimate_file(filename, machine=None, start=(0.0, 0.0, None)):
+    r"""Returns the Estimate of a Gcode (.ngc) file"""
+    return Estimator(machine, start=start).add(parser.parse_file(filename))
@@ -4,6 +4,7 @@
 import os
 
 import pycnc.core
+import pycnc.job
 
 
 def get_filepath(dir_='C:/', filename='gcode', extension='.ngc'):
@@ -26,24 +27,13 @@ def main():
     gcode_file_name = 'A_ExamplePlate_x1_y1_drill3.0_s7000'
     f = open(get_filepath(dir_=directory, filename=gcode_file_name), 'w')
 
-    f.write(pycnc.core.start_gcode())
-
-    f.write(pycnc.core.drill(-8.5, -8.5, -PLATE_THICKNESS - 1.0, SAFETY_HEIGHT, PLUNGE_RATE))
-    f.write(pycnc.core.drill(8.5, -8.5, -PLATE_THICKNESS - 1.0, SAFETY_HEIGHT, PLUNGE_RATE))
-    f.write(pycnc.core.drill(8.5, 8.5, -PLATE_THICKNESS - 1.0, SAFETY_HEIGHT, PLUNGE_RATE))
-    f.write(pycnc.core.drill(-8.5, 8.5, -PLATE_THICKNESS - 1.0, SAFETY_HEIGHT, PLUNGE_RATE))
-
-    f.write(pycnc.core.drill(-19.0, -19.0, -PLATE_THICKNESS - 1.0, SAFETY_HEIGHT, PLUNGE_RATE))
-    f.write(pycnc.core.drill(19.0, -19.0, -PLATE_THICKNESS - 1.0, SAFETY_HEIGHT, PLUNGE_RATE))
-    f.write(pycnc.core.drill(19.0, 19.0, -PLATE_THICKNESS - 1.0, SAFETY_HEIGHT, PLUNGE_RATE))
-    f.write(pycnc.core.drill(-19.0, 19.0, -PLATE_THICKNESS-1.0, SAFETY_HEIGHT, PLUNGE_RATE))
-
-    f.write(pycnc.core.drill(-19.0, 0.0, -PLATE_THICKNESS - 1.0, SAFETY_HEIGHT, PLUNGE_RATE))
-    f.write(pycnc.core.drill(0.0, -19.0, -PLATE_THICKNESS - 1.0, SAFETY_HEIGHT, PLUNGE_RATE))
-    f.write(pycnc.core.drill(19.0, 0.0, -PLATE_THICKNESS - 1.0, SAFETY_HEIGHT, PLUNGE_RATE))
-    f.write(pycnc.core.drill(0.0, 19.0, -PLATE_THICKNESS - 1.0, SAFETY_HEIGHT, PLUNGE_RATE))
-
-    f.write(pycnc.core.end_gcode())
+    # the holes are reordered to minimize the rapid moves between them
+    job = pycnc.job.Job()
+    for x, y in [(-8.5, -8.5), (8.5, -8.5), (8.5, 8.5), (-8.5, 8.5),
+                 (-19.0, -19.0), (19.0, -19.0), (19.0, 19.0), (-19.0, 19.0),
+                 (-19.0, 0.0), (0.0, -19.0), (19.0, 0.0), (0.0, 19.0)]:
+        job.add(pycnc.core.drill, x, y, -PLATE_THICKNESS - 1.0, SAFETY_HEIGHT, PLUNGE_RATE)
+    job.write_to(f)
     f.close()
     # END OF DRILLING CYCLE
 
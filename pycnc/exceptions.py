@@ -21,3 +21,13 @@ class WrongParameterError(RootException):
 class GcodeParameterError(RootException):
     r"""Missing or wrong parameter for atomic GCode instructions"""
     pass
+
+
+class GcodeParseError(RootException):
+    r"""Gcode that cannot be read back into moves"""
+    pass
+
+
+class ControllerError(RootException):
+    r"""Error reported by a controller, or lost connection, while streaming Gcode"""
+    pass
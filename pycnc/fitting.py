@@ -0,0 +1,199 @@
+# coding: utf-8
+
+r"""Polyline simplification and arc fitting
+
+Summary
+-------
+Compression of the long polylines produced by flattening curves (DXF, SVG) into fewer, longer moves:
+runs of points lying on a circle become G2 / G3 arcs, the other points are simplified
+with the Douglas-Peucker algorithm. The result stays within a tolerance of every input point.
+
+"""
+
+from __future__ import division
+
+import math
+
+import pycnc.toolpath as toolpath
+
+
+def simplify(points, tolerance):
+    r"""Douglas-Peucker simplification of a polyline
+
+    Parameters
+    ----------
+    points : sequence
+        (x, y) points
+    tolerance : float
+        Maximum distance in mm between a removed point and the simplified polyline
+
+    Returns
+    -------
+    list
+        The kept points, the first and the last one included
+
+    Examples
+    --------
+    >>> simplify([(0.0, 0.0), (1.0, 0.01), (2.0, -0.01), (3.0, 0.0), (3.0, 2.0)], 0.05)
+    [(0.0, 0.0), (3.0, 0.0), (3.0, 2.0)]
+
+    """
+    count = len(points)
+    if count < 3:
+        return list(points)
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    # iterative, the polylines have tens of thousands of points
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        x0, y0 = points[first]
+        x1, y1 = points[last]
+        dx, dy = x1 - x0, y1 - y0
+        length = math.hypot(dx, dy)
+        farthest, distance = None, tolerance
+        for index in range(first + 1, last):
+            x, y = points[index]
+            if length:
+                d = abs(dy * (x - x0) - dx * (y - y0)) / length
+            else:
+                d = math.hypot(x - x0, y - y0)
+            if d > distance:
+                farthest, distance = index, d
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def _circle(a, b, c):
+    r"""Center and radius of the circle through 3 points, None if they are aligned"""
+    (xa, ya), (xb, yb), (xc, yc) = a, b, c
+    determinant = 2.0 * ((xb - xa) * (yc - ya) - (yb - ya) * (xc - xa))
+    if abs(determinant) < 1e-12:
+        return None
+    sa = (xb - xa) * (xb + xa) + (yb - ya) * (yb + ya)
+    sc = (xc - xa) * (xc + xa) + (yc - ya) * (yc + ya)
+    x_center = (sa * (yc - ya) - sc * (yb - ya)) / determinant
+    y_center = (sc * (xb - xa) - sa * (xc - xa)) / determinant
+    return x_center, y_center, math.hypot(xa - x_center, ya - y_center)
+
+
+def _arc(points, first, last, tolerance):
+    r"""(x_center, y_center, clockwise, straight) of the arc through points[first:last + 1], None if they do not fit one
+
+    The points must be within tolerance of the circle through the first, middle and last points,
+    in order along it, with chords within tolerance of the arc.
+    straight is True if the points are also within tolerance of the line from the first to the last one.
+    """
+    circle = _circle(points[first], points[(first + last) // 2], points[last])
+    if circle is None:
+        return None
+    x_center, y_center, radius = circle
+    (x0, y0), (x1, y1) = points[first], points[last]
+    dx, dy = x1 - x0, y1 - y0
+    length = math.hypot(dx, dy)
+    straight = True
+    # the largest angular step whose chord stays within tolerance of the arc
+    max_step = 2.0 * math.acos(max(-1.0, 1.0 - tolerance / radius))
+    sweep = 0.0
+    previous_angle = math.atan2(y0 - y_center, x0 - x_center)
+    for index in range(first + 1, last + 1):
+        x, y = points[index]
+        if abs(math.hypot(x - x_center, y - y_center) - radius) > tolerance:
+            return None
+        if straight and index < last:
+            if not length or abs(dy * (x - x0) - dx * (y - y0)) > tolerance * length:
+                straight = False
+        angle = math.atan2(y - y_center, x - x_center)
+        step = (angle - previous_angle + math.pi) % (2.0 * math.pi) - math.pi
+        if step * sweep < 0.0 or abs(step) > max_step:
+            return None
+        sweep += step
+        previous_angle = angle
+    if abs(sweep) >= 2.0 * math.pi - 1e-6 or sweep == 0.0:
+        return None
+    return x_center, y_center, sweep < 0.0, straight
+
+
+def _longest_arc(points, first, tolerance, min_points):
+    r"""Index of the last point of the longest arc from points[first] (at least min_points points), or None"""
+    last_index = len(points) - 1
+    end = first + min_points - 1
+    if end > last_index or _arc(points, first, end, tolerance) is None:
+        return None
+    # double the span, then bisect between the last fitting end and the first one that does not fit
+    good, bad = end, None
+    while bad is None:
+        candidate = min(first + 2 * (good - first), last_index)
+        if candidate == good:
+            return good
+        if _arc(points, first, candidate, tolerance) is None:
+            bad = candidate
+        else:
+            good = candidate
+    while bad - good > 1:
+        middle = (good + bad) // 2
+        if _arc(points, first, middle, tolerance) is None:
+            bad = middle
+        else:
+            good = middle
+    return good
+
+
+def fit_arcs(points, tolerance, feedrate=None, min_points=4):
+    r"""Moves following a polyline within tolerance, with arcs where the points lie on circles
+
+    Parameters
+    ----------
+    points : sequence
+        (x, y) points
+    tolerance : float
+        Maximum distance in mm between an input point and the moves
+    feedrate : float, optional
+        Feed rate of the moves, defaults to None
+    min_points : int, optional
+        Minimum number of points replaced by an arc, defaults to 4
+
+    Returns
+    -------
+    list
+        toolpath.Move (G1, G2, G3) from points[0] (excluded) to the last point
+
+    Examples
+    --------
+    >>> quarter = [(math.cos(k * math.pi / 40.0), math.sin(k * math.pi / 40.0)) for k in range(21)]
+    >>> moves = fit_arcs(quarter + [(-1.0, 2.0), (-2.0, 3.0)], 0.001)
+    >>> [(move.kind, round(move.x, 6), round(move.y, 6)) for move in moves]
+    [(3, 0.0, 1.0), (1, -2.0, 3.0)]
+    >>> round(moves[0].i, 6), abs(moves[0].j) < 1e-9
+    (-1.0, True)
+
+    """
+    moves = list()
+    run_start = 0
+    first = 0
+    while first < len(points) - 1:
+        last = _longest_arc(points, first, tolerance, min_points)
+        if last is None:
+            first += 1
+            continue
+        x_center, y_center, clockwise, straight = _arc(points, first, last, tolerance)
+        if straight:
+            # left to the lines, as the points up to the end of the arc
+            first = last
+            continue
+        moves.extend(_lines(points[run_start:first + 1], tolerance, feedrate))
+        (x0, y0), (x1, y1) = points[first], points[last]
+        arc_move = toolpath.g2_move if clockwise else toolpath.g3_move
+        moves.append(arc_move(x_end_point=x1, y_end_point=y1, x_center_offset=x_center - x0,
+                              y_center_offset=y_center - y0, feedrate=feedrate))
+        run_start = first = last
+    moves.extend(_lines(points[run_start:], tolerance, feedrate))
+    return moves
+
+
+def _lines(points, tolerance, feedrate):
+    r"""G1 moves of the simplified polyline, from points[0] (excluded)"""
+    return [toolpath.g1_move(x=x, y=y, feedrate=feedrate) for x, y in simplify(points, tolerance)[1:]]
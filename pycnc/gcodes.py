@@ -11,6 +11,191 @@ Formatting of GCode (G0, G1, G2, G3, G73, G81, G83) instructions
 import pycnc.exceptions as exceptions
 
 
+class GcodeFormatter(object):
+    r"""Precompiled Gcode line formatter
+
+    The word templates (e.g. 'X%s ') and the instruction heads (e.g. 'G1 ') are built once,
+    so formatting a line only performs one string interpolation per defined word.
+
+    Parameters
+    ----------
+    precision : int or dict, optional
+        Number of decimal places of the emitted values, either for every word or per word letter
+        (e.g. {'X': 3, 'Y': 3, 'Z': 3, 'F': 0}). Words that are not given a precision, and every word
+        when precision is None (the default), are formatted with %s exactly as pycnc always did.
+    strip_zeros : bool, optional
+        Remove the trailing zeros (and the trailing decimal point) of the values, defaults to False
+    snap : float, optional
+        Values whose absolute value is below snap are emitted as 0, defaults to None (no snapping)
+
+    Notes
+    -----
+    docs/gcode_best_practices.md recommends 3 decimal places in millimeters and 4 in inches.
+    A fixed precision never produces exponent notation (e.g. X-1.2246467991473532e-16).
+
+    Examples
+    --------
+    >>> GcodeFormatter().format('G1', x=1.0, y=2.5, feedrate=640.0)
+    'G1 X1.0 Y2.5 F640.0 \n'
+    >>> GcodeFormatter(precision=3).format('G1', x=1.0, y=2.5, feedrate=640.0)
+    'G1 X1.000 Y2.500 F640.000 \n'
+    >>> GcodeFormatter(precision=3, strip_zeros=True).format('G1', x=-1.2246467991473532e-16, y=2.5, feedrate=640.0)
+    'G1 X0 Y2.5 F640 \n'
+    >>> GcodeFormatter(precision={'X': 4, 'Y': 4}, snap=1e-9).format('G1', x=1e-12, y=2.5, feedrate=640.0)
+    'G1 X0.0000 Y2.5000 F640.0 \n'
+
+    """
+    letters = ('X', 'Y', 'Z', 'I', 'J', 'R', 'Q', 'F')
+
+    def __init__(self, precision=None, strip_zeros=False, snap=None):
+        if isinstance(precision, dict):
+            unknown = set(precision) - set(self.letters)
+            if unknown:
+                raise exceptions.GcodeParameterError('Unknown word letter(s) %s' % ', '.join(sorted(unknown)))
+            precisions = tuple(precision.get(letter) for letter in self.letters)
+        else:
+            precisions = (precision, ) * len(self.letters)
+        if any(p is not None and p < 0 for p in precisions):
+            raise exceptions.GcodeParameterError('precision cannot be negative')
+        if snap is not None and snap < 0:
+            raise exceptions.GcodeParameterError('snap cannot be negative')
+        self.precision = precision
+        self.strip_zeros = strip_zeros
+        self.snap = snap
+        self._value_formats = tuple('%s' if p is None else '%%.%if' % p for p in precisions)
+        self._templates = tuple('%s%s ' % (letter, value_format)
+                                for letter, value_format in zip(self.letters, self._value_formats))
+        self._heads = dict()
+        self._compact = strip_zeros or snap is not None
+        if self._compact:
+            self.format = self._format_compact
+
+    def __reduce__(self):
+        # the options rebuild the compiled templates, e.g. in the processes of a Job
+        return self.__class__, (self.precision, self.strip_zeros, self.snap)
+
+    def _compile_head(self, prefix):
+        r"""Validate an instruction prefix and cache the start of its lines
+
+        An empty prefix formats a line that only holds words, for the motion mode in effect
+
+        """
+        if not prefix:
+            head = self._heads[prefix] = ''
+            return head
+        if prefix[0] not in ['G', 'M']:
+            raise exceptions.GcodeParameterError('What instruction is that?')
+        head = self._heads[prefix] = prefix + ' '
+        return head
+
+    def _value(self, index, value):
+        r"""Formats a value of the word at index in letters, applying snapping and zero stripping"""
+        if self.snap is not None and -self.snap < value < self.snap:
+            value = 0.0 if isinstance(value, float) else 0
+        text = self._value_formats[index] % value
+        if self.strip_zeros and '.' in text and 'e' not in text:
+            text = text.rstrip('0').rstrip('.')
+        if text[0] == '-' and text.strip('-0.') == '':
+            text = text[1:]  # no negative zero
+        return text
+
+    def word(self, letter, value):
+        r"""Formats a single word (e.g. 'X1.0 ')
+
+        Examples
+        --------
+        >>> GcodeFormatter(precision=3).word('Z', -0.5)
+        'Z-0.500 '
+
+        """
+        index = self.letters.index(letter)
+        if self._compact:
+            return '%s%s ' % (letter, self._value(index, value))
+        return self._templates[index] % value
+
+    def format(self, prefix, x=None, y=None, z=None, i=None, j=None, r=None, q=None, feedrate=None):
+        r"""Formats the Gcode line discarding undefined parameters
+
+        See _gcode_format for the meaning of the parameters
+
+        """
+        try:
+            line = self._heads[prefix]
+        except KeyError:
+            line = self._compile_head(prefix)
+        t = self._templates
+        if x is not None:
+            line += t[0] % x
+        if y is not None:
+            line += t[1] % y
+        if z is not None:
+            line += t[2] % z
+        if i is not None:
+            line += t[3] % i
+        if j is not None:
+            line += t[4] % j
+        if r is not None:
+            line += t[5] % r
+        if q is not None:
+            line += t[6] % q
+        if feedrate is not None:
+            line += t[7] % feedrate
+        return line + '\n'
+
+    def _format_compact(self, prefix, x=None, y=None, z=None, i=None, j=None, r=None, q=None, feedrate=None):
+        r"""Same as format, with zero stripping and/or snapping of the values"""
+        try:
+            line = self._heads[prefix]
+        except KeyError:
+            line = self._compile_head(prefix)
+        for index, value in enumerate((x, y, z, i, j, r, q, feedrate)):
+            if value is not None:
+                line += '%s%s ' % (self.letters[index], self._value(index, value))
+        return line + '\n'
+
+
+_formatter = GcodeFormatter()
+
+
+def get_formatter():
+    r"""Returns the GcodeFormatter used by all the Gcode functions of pycnc"""
+    return _formatter
+
+
+def set_formatter(formatter=None, **kwargs):
+    r"""Replace the GcodeFormatter used by all the Gcode functions of pycnc
+
+    Parameters
+    ----------
+    formatter : GcodeFormatter, optional
+        The new formatter. If None, a GcodeFormatter is built from the keyword arguments
+        (precision, strip_zeros, snap); without any argument the compatibility formatter is restored.
+
+    Returns
+    -------
+    GcodeFormatter
+        The previous formatter, so that it can be restored
+
+    Examples
+    --------
+    >>> previous = set_formatter(precision=3, strip_zeros=True, snap=1e-9)
+    >>> g1_gcode(x=1.25, y=-1e-16, feedrate=640.0)
+    'G1 X1.25 Y0 F640 \n'
+    >>> _ = set_formatter(previous)
+    >>> g1_gcode(x=1.25, y=-1e-16, feedrate=640.0)
+    'G1 X1.25 Y-1e-16 F640.0 \n'
+
+    """
+    global _formatter
+    if formatter is None:
+        formatter = GcodeFormatter(**kwargs)
+    elif kwargs:
+        raise exceptions.GcodeParameterError('Give either a formatter or formatting options, not both')
+    previous = _formatter
+    _formatter = formatter
+    return previous
+
+
 def _gcode_format(prefix, x=None, y=None, z=None, i=None, j=None, r=None, q=None, feedrate=None):
     r"""Formats the Gcode line discarding undefined parameters
 
@@ -47,29 +232,7 @@ def _gcode_format(prefix, x=None, y=None, z=None, i=None, j=None, r=None, q=None
     GcodeParameterError: What instruction is that?
 
     """
-    if prefix[0] not in ['G', 'M']:
-        raise exceptions.GcodeParameterError('What instruction is that?')
-    gcode = list()
-    gcode.append(prefix)
-    gcode.append(' ')
-    if x is not None:
-        gcode.append('X%(x)s ' % {'x': x})
-    if y is not None:
-        gcode.append('Y%(y)s ' % {'y': y})
-    if z is not None:
-        gcode.append('Z%(z)s ' % {'z': z})
-    if i is not None:
-        gcode.append('I%(i)s ' % {'i': i})
-    if j is not None:
-        gcode.append('J%(j)s ' % {'j': j})
-    if r is not None:
-        gcode.append('R%(r)s ' % {'r': r})
-    if q is not None:
-        gcode.append('Q%(q)s ' % {'q': q})
-    if feedrate is not None:
-        gcode.append('F%(f)s ' % {'f': feedrate})
-    gcode.append('\n')
-    return ''.join(gcode)
+    return _formatter.format(prefix, x, y, z, i, j, r, q, feedrate)
 
 
 def g0_gcode(x=None, y=None, z=None):
@@ -88,7 +251,7 @@ def g0_gcode(x=None, y=None, z=None):
     """
     if x is None and y is None and z is None:
         raise exceptions.GcodeParameterError('G0 parameter error')
-    return _gcode_format(prefix='G0', x=x, y=y, z=z)
+    return _formatter.format('G0', x, y, z)
 
 
 def g1_gcode(x=None, y=None, z=None, feedrate=None):
@@ -109,7 +272,7 @@ def g1_gcode(x=None, y=None, z=None, feedrate=None):
     """
     if x is None and y is None and z is None:
         raise exceptions.GcodeParameterError('G1 parameter error')
-    return _gcode_format(prefix='G1', x=x, y=y, z=z, feedrate=feedrate)
+    return _formatter.format('G1', x, y, z, feedrate=feedrate)
 
 
 def g2_gcode(x_end_point=None, y_end_point=None, spiral_end_altitude=None, x_center_offset=None, y_center_offset=None,
@@ -143,8 +306,8 @@ def g2_gcode(x_end_point=None, y_end_point=None, spiral_end_altitude=None, x_cen
     """
     if x_center_offset is None and y_center_offset is None:
         raise exceptions.GcodeParameterError('G2 parameter error')
-    return _gcode_format(prefix='G2', x=x_end_point, y=y_end_point, z=spiral_end_altitude, i=x_center_offset,
-                         j=y_center_offset, feedrate=feedrate)
+    return _formatter.format('G2', x_end_point, y_end_point, spiral_end_altitude, x_center_offset, y_center_offset,
+                             feedrate=feedrate)
 
 
 def g3_gcode(x_end_point=None, y_end_point=None, x_center_offset=None, y_center_offset=None, spiral_end_altitude=None,
@@ -178,8 +341,8 @@ def g3_gcode(x_end_point=None, y_end_point=None, x_center_offset=None, y_center_
     """
     if x_center_offset is None and y_center_offset is None:
         raise exceptions.GcodeParameterError('G3 parameter error')
-    return _gcode_format(prefix='G3', x=x_end_point, y=y_end_point, i=x_center_offset, j=y_center_offset,
-                         z=spiral_end_altitude, feedrate=feedrate)
+    return _formatter.format('G3', x_end_point, y_end_point, spiral_end_altitude, x_center_offset, y_center_offset,
+                             feedrate=feedrate)
 
 
 def g73_gcode(x=None, y=None, z=None, r=None, q=None, feedrate=None):
@@ -227,7 +390,7 @@ def g73_gcode(x=None, y=None, z=None, r=None, q=None, feedrate=None):
         raise exceptions.GcodeParameterError('G73 parameter error - r smaller than z')
     if q <= 0:
         raise exceptions.GcodeParameterError('G83 parameter error - q must be strictly positive')
-    return _gcode_format(prefix='G73 G98', x=x, y=y, z=z, r=r, q=q, feedrate=feedrate)
+    return _formatter.format('G73 G98', x, y, z, r=r, q=q, feedrate=feedrate)
 
 
 def g83_gcode(x=None, y=None, z=None, r=None, q=None, feedrate=None):
@@ -275,7 +438,7 @@ def g83_gcode(x=None, y=None, z=None, r=None, q=None, feedrate=None):
         raise exceptions.GcodeParameterError('G83 parameter error - r smaller than z')
     if q <= 0:
         raise exceptions.GcodeParameterError('G83 parameter error - q must be strictly positive')
-    return _gcode_format(prefix='G83 G98', x=x, y=y, z=z, r=r, q=q, feedrate=feedrate)
+    return _formatter.format('G83 G98', x, y, z, r=r, q=q, feedrate=feedrate)
 
 
 def g81_gcode(x=None, y=None, z=None, r=None, feedrate=None):
@@ -313,4 +476,123 @@ def g81_gcode(x=None, y=None, z=None, r=None, feedrate=None):
         raise exceptions.GcodeParameterError('G81 parameter error')
     if r < z:
         raise exceptions.GcodeParameterError('G81 parameter error - r smaller than z')
-    return _gcode_format(prefix='G81 G98', x=x, y=y, z=z, r=r, feedrate=feedrate)
+    return _formatter.format('G81 G98', x, y, z, r=r, feedrate=feedrate)
+
+
+class ModalEmitter(object):
+    r"""Stateful filter that removes the redundant words of Gcode lines
+
+    The emitter tracks the modal state of the controller (motion mode, feedrate, last X Y Z position)
+    and drops the motion code when it is already active, the F word when the feedrate did not change,
+    and the X Y Z words of the axes that do not move. G0/G1 lines that do not move any axis are dropped.
+    The resulting program is equivalent, only smaller.
+
+    Lines that are not a single G0 G1 G2 G3 instruction (canned cycles, setup codes, M codes ...)
+    are passed through unchanged, and update or invalidate the tracked state.
+
+    Examples
+    --------
+    >>> emitter = ModalEmitter()
+    >>> emitter.emit(g1_gcode(x=1.0, y=2.0, feedrate=640.0))
+    'G1 X1.0 Y2.0 F640.0\n'
+    >>> emitter.emit(g1_gcode(x=3.0, y=2.0, feedrate=640.0))
+    'X3.0\n'
+    >>> emitter.emit(g1_gcode(x=3.0, feedrate=640.0))
+    ''
+    >>> list(ModalEmitter().filter(['G21\n', 'G0 X0 Y0 Z10.0 \n', 'G0 X0 Y0 \n', 'G1 Z-1.0 F200.0 \n']))
+    ['G21\n', 'G0 X0 Y0 Z10.0\n', 'G1 Z-1.0 F200.0\n']
+
+    """
+    motion_codes = ('G0', 'G1', 'G2', 'G3')
+    canned_cycle_codes = ('G73', 'G81', 'G82', 'G83', 'G85', 'G89')
+    # codes after which the tracked position is meaningless
+    position_codes = ('G20', 'G21', 'G28', 'G30', 'G53', 'G54', 'G55', 'G56', 'G57', 'G58', 'G59', 'G91', 'G92')
+    end_codes = ('M2', 'M30')
+
+    def __init__(self):
+        self.motion = None
+        self.feedrate = None
+        self.position = dict()
+        self.reset()
+
+    def reset(self):
+        r"""Forget the modal state, as at the start of a program"""
+        self.motion = None
+        self.feedrate = None
+        self.position = {'X': None, 'Y': None, 'Z': None}
+
+    def emit(self, line):
+        r"""Returns the line without its redundant words ('' if the whole line is redundant)"""
+        words = line.split()
+        if not words:
+            return line
+        if words[0][0] in 'XYZIJRQF':
+            # no motion code: the motion mode in effect applies
+            if self.motion in self.motion_codes:
+                return self._emit_motion(self.motion, words)
+            self._update_state([], words)
+            return line
+        if words[0][0] not in 'GM':
+            return line
+        codes = [word for word in words if word[0] in 'GM']
+        if len(codes) == 1 and codes[0] in self.motion_codes and words[0] == codes[0]:
+            return self._emit_motion(codes[0], words[1:])
+        self._update_state(codes, words)
+        return line
+
+    def filter(self, lines):
+        r"""Generator of the reduced lines, intended to wrap one of the core.iter_* generators"""
+        emit = self.emit
+        for line in lines:
+            line = emit(line)
+            if line:
+                yield line
+
+    def _emit_motion(self, motion, words):
+        r"""Reduce a G0 G1 G2 G3 line"""
+        kept = list()
+        moves = dict()
+        feedrate = None
+        for word in words:
+            letter = word[0]
+            value = float(word[1:])
+            if letter in self.position:
+                if self.position[letter] != value:
+                    kept.append(word)
+                moves[letter] = value
+            elif letter == 'F':
+                if self.feedrate != value:
+                    kept.append(word)
+                    feedrate = value
+            else:
+                kept.append(word)  # arc offsets are never modal
+        if motion in ('G0', 'G1') and not any(word[0] in self.position for word in kept):
+            return ''  # no axis moves: the controller would do nothing
+        if motion != self.motion:
+            kept.insert(0, motion)
+            self.motion = motion
+        self.position.update(moves)
+        if feedrate is not None:
+            self.feedrate = feedrate
+        return ' '.join(kept) + '\n'
+
+    def _update_state(self, codes, words):
+        r"""Track the effect of a line that is passed through unchanged"""
+        if any(code in self.end_codes for code in codes):
+            self.reset()
+            return
+        for code in codes:
+            if code in self.motion_codes or code in self.canned_cycle_codes:
+                self.motion = code
+            elif code == 'G80':
+                self.motion = None
+            elif code in self.position_codes:
+                self.position = dict.fromkeys(self.position)
+        for word in words:
+            letter = word[0]
+            if letter == 'F':
+                self.feedrate = float(word[1:])
+            elif letter in self.position:
+                self.position[letter] = float(word[1:])
+        if self.motion in self.canned_cycle_codes:
+            self.position['Z'] = None  # the retract height depends on G98/G99 and on the initial Z
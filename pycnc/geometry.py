@@ -0,0 +1,157 @@
+# coding: utf-8
+
+r"""2D geometry on batches of points
+
+Summary
+-------
+Rotations and affine transforms whose coefficients are computed once,
+applied to single points or to batches of points stored as two coordinate sequences
+(lists, array.array or NumPy arrays in, array.array out).
+
+"""
+
+from __future__ import division
+
+import math
+from array import array
+
+
+_TWO_PI = 2.0 * math.pi
+
+
+def arc_sweep(x_start, y_start, x_end, y_end, i, j, clockwise):
+    r"""Angle in radians swept by an arc (G2 if clockwise, else G3), 2 pi if it ends where it starts
+
+    i and j are the offsets of the center from the start point, as in Gcode.
+
+    Examples
+    --------
+    >>> arc_sweep(0.0, 0.0, 1.0, 1.0, 1.0, 0.0, True) == math.pi / 2.0
+    True
+    >>> arc_sweep(0.0, 0.0, 1.0, 1.0, 1.0, 0.0, False) == 3.0 * math.pi / 2.0
+    True
+
+    """
+    x_center, y_center = x_start + i, y_start + j
+    start_angle = math.atan2(y_start - y_center, x_start - x_center)
+    end_angle = math.atan2(y_end - y_center, x_end - x_center)
+    sweep = (start_angle - end_angle) if clockwise else (end_angle - start_angle)
+    sweep %= _TWO_PI
+    if sweep < 1e-9:
+        sweep = _TWO_PI
+    return sweep
+
+
+class Rotation(object):
+    r"""Rotation around a center, whose sine and cosine are computed once
+
+    The arithmetic is the one of core.Point.rotate, so the results are identical to rotating
+    Point objects one by one.
+
+    Parameters
+    ----------
+    x_center, y_center : float
+        Center of the rotation
+    degs : float
+        Rotation angle in degrees
+    clockwise : bool, optional
+        Rotation direction, defaults to True (as core.Point.rotate)
+
+    Examples
+    --------
+    >>> rotation = Rotation(0.0, 1.0, 90.0)
+    >>> x, y = rotation.apply(1.0, 1.0)
+    >>> -1e-15 < x < 1e-15, y
+    (True, 0.0)
+    >>> xs, ys = rotation.apply_many([1.0, 0.0], [1.0, 2.0])
+    >>> [round(x, 12) for x in xs], [round(y, 12) for y in ys]
+    ([0.0, 1.0], [0.0, 1.0])
+
+    """
+    def __init__(self, x_center, y_center, degs, clockwise=True):
+        self.x_center = x_center
+        self.y_center = y_center
+        self.degs = degs
+        self.clockwise = clockwise
+        rads = math.radians(degs)
+        self.cos = math.cos(rads)
+        self.sin = math.sin(rads) if clockwise else -math.sin(rads)
+
+    def apply(self, x, y):
+        r"""Returns the rotated (x, y)"""
+        dx = x - self.x_center
+        dy = y - self.y_center
+        return (dx * self.cos + dy * self.sin) + self.x_center, (dy * self.cos - dx * self.sin) + self.y_center
+
+    def apply_many(self, xs, ys):
+        r"""Returns the rotated coordinates of a batch of points as two arrays"""
+        cos, sin, x_center, y_center = self.cos, self.sin, self.x_center, self.y_center
+        dxs = [x - x_center for x in xs]
+        dys = [y - y_center for y in ys]
+        return (array('d', [(dx * cos + dy * sin) + x_center for dx, dy in zip(dxs, dys)]),
+                array('d', [(dy * cos - dx * sin) + y_center for dx, dy in zip(dxs, dys)]))
+
+
+class Affine(object):
+    r"""2D affine transform x' = a.x + b.y + c, y' = d.x + e.y + f
+
+    Transforms compose with *: (t1 * t2) applies t2 first, then t1.
+
+    Examples
+    --------
+    >>> t = Affine.translation(10.0, 0.0) * Affine.rotation(90.0)
+    >>> [round(value, 12) for value in t.apply(1.0, 0.0)]
+    [10.0, 1.0]
+    >>> xs, ys = Affine.scaling(2.0, 3.0).apply_many([1.0, 2.0], [1.0, 1.0])
+    >>> list(xs), list(ys)
+    ([2.0, 4.0], [3.0, 3.0])
+
+    """
+    def __init__(self, a=1.0, b=0.0, c=0.0, d=0.0, e=1.0, f=0.0):
+        self.coefficients = (a, b, c, d, e, f)
+
+    @classmethod
+    def identity(cls):
+        return cls()
+
+    @classmethod
+    def translation(cls, dx, dy):
+        return cls(1.0, 0.0, dx, 0.0, 1.0, dy)
+
+    @classmethod
+    def rotation(cls, degs, x_center=0.0, y_center=0.0):
+        r"""Counterclockwise rotation around (x_center, y_center)"""
+        rads = math.radians(degs)
+        cos, sin = math.cos(rads), math.sin(rads)
+        return cls(cos, -sin, x_center - cos * x_center + sin * y_center,
+                   sin, cos, y_center - sin * x_center - cos * y_center)
+
+    @classmethod
+    def scaling(cls, sx, sy=None):
+        return cls(sx, 0.0, 0.0, 0.0, sx if sy is None else sy, 0.0)
+
+    def __mul__(self, other):
+        a1, b1, c1, d1, e1, f1 = self.coefficients
+        a2, b2, c2, d2, e2, f2 = other.coefficients
+        return Affine(a1 * a2 + b1 * d2, a1 * b2 + b1 * e2, a1 * c2 + b1 * f2 + c1,
+                      d1 * a2 + e1 * d2, d1 * b2 + e1 * e2, d1 * c2 + e1 * f2 + f1)
+
+    def apply(self, x, y):
+        r"""Returns the transformed (x, y)"""
+        a, b, c, d, e, f = self.coefficients
+        return a * x + b * y + c, d * x + e * y + f
+
+    def apply_many(self, xs, ys):
+        r"""Returns the transformed coordinates of a batch of points as two arrays"""
+        a, b, c, d, e, f = self.coefficients
+        return (array('d', [a * x + b * y + c for x, y in zip(xs, ys)]),
+                array('d', [d * x + e * y + f for x, y in zip(xs, ys)]))
+
+    def is_rigid(self):
+        r"""True if the transform preserves distances and angles (rotation + translation), e.g. maps arcs to arcs
+
+        A reflection preserves distances too, but it reverses the direction of the arcs (G2 to G3): it is not rigid.
+        """
+        a, b, _, d, e, _ = self.coefficients
+        return (abs(a * a + d * d - 1.0) < 1e-12 and abs(b * b + e * e - 1.0) < 1e-12 and abs(a * b + d * e) < 1e-12 and
+                a * e - b * d > 0.0)
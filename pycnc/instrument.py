@@ -0,0 +1,419 @@
+# coding: utf-8
+
+r"""Opt-in instrumentation of the Gcode generators
+
+Summary
+-------
+Once enabled, the calls to the shape functions of pycnc.core (and to their iter_* variants) and to the Gcode
+emitters are recorded: their duration, the number of lines and characters they emitted and, for the shapes,
+the statistics of their motions (number of moves of each kind, plunges, rapid and cutting lengths, estimated
+machining time).
+
+The emitters are toolpath.iter_gcode, that formats the moves of every shape (with the number of moves
+of each kind), the format and word methods of the GcodeFormatter in effect, and the g0_gcode ... functions
+of pycnc.gcodes. They are recorded even when a shape calls them.
+
+The statistics are aggregated per function and exported as a JSON report, to follow the generation cost
+and the program sizes from one release to the next. A cProfile.Profile can be given to profile the
+instrumented calls only.
+
+The instrumentation replaces the functions of the pycnc.core, pycnc.toolpath and pycnc.gcodes modules, so it sees
+the calls made through the modules (core.square_pocket(...), Job) but not the functions imported before it was
+enabled (from pycnc.core import square_pocket), nor a formatter set with gcodes.set_formatter once it is enabled.
+The features that a Job generates on other processes are not recorded.
+
+Examples
+--------
+>>> import pycnc.core as core
+>>> with instrumented() as recorder:
+...     gcode = core.drill(1.0, 2.0, -4.0, 10.0, 200.0)
+>>> statistics = recorder.functions['drill']
+>>> statistics.calls, statistics.lines, statistics.bytes, sorted(statistics.moves.items())
+(1, 3, 52, [('G0', 2), ('G81', 1)])
+>>> round(statistics.rapid_length, 3), statistics.cutting_length
+(16.236, 14.0)
+>>> statistics = recorder.functions['iter_gcode']
+>>> statistics.calls, statistics.lines, sorted(statistics.moves.items())
+(1, 3, [('G0', 2), ('G81', 1)])
+
+"""
+
+from __future__ import division
+
+import functools
+import json
+import platform
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pycnc
+import pycnc.core as core
+import pycnc.estimate as estimate
+import pycnc.gcodes as gcodes
+import pycnc.parser as parser
+import pycnc.toolpath as toolpath
+import pycnc.exceptions as exceptions
+
+
+EMITTERS = ('g0_gcode', 'g1_gcode', 'g2_gcode', 'g3_gcode', 'g73_gcode', 'g81_gcode', 'g83_gcode')
+
+# methods of the formatter in effect, recorded as 'GcodeFormatter.format' ...
+FORMATTER_METHODS = ('format', 'word')
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+# the recorder of the instrumentation in effect, and the original functions it replaced
+# (None for a method of the formatter, that is deleted from the instance)
+_recorder = None
+_originals = dict()
+
+
+class Statistics(object):
+    r"""Aggregated statistics of the calls to a function
+
+    Attributes
+    ----------
+    calls : int
+    time, min_time, max_time : float
+        Total, shortest and longest durations of the calls in seconds
+    lines, bytes : int
+        Number of lines and characters emitted
+    moves : dict
+        Number of moves of each kind e.g. {'G0': 2, 'G1': 10} (shapes when the motions are recorded, and iter_gcode)
+    plunges : int
+        Number of moves that only go down along Z
+    rapid_length, cutting_length : float
+        In mm
+    machining_time : float
+        Estimated with estimate.Machine(), in seconds
+
+    """
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0
+        self.min_time = None
+        self.max_time = None
+        self.lines = 0
+        self.bytes = 0
+        self.moves = dict()
+        self.plunges = 0
+        self.rapid_length = 0.0
+        self.cutting_length = 0.0
+        self.machining_time = 0.0
+
+    def add(self, other):
+        r"""Add the statistics of other calls"""
+        self.calls += other.calls
+        self.time += other.time
+        for name, function in (('min_time', min), ('max_time', max)):
+            values = [value for value in (getattr(self, name), getattr(other, name)) if value is not None]
+            setattr(self, name, function(values) if values else None)
+        self.lines += other.lines
+        self.bytes += other.bytes
+        for kind, count in other.moves.items():
+            self.moves[kind] = self.moves.get(kind, 0) + count
+        self.plunges += other.plunges
+        self.rapid_length += other.rapid_length
+        self.cutting_length += other.cutting_length
+        self.machining_time += other.machining_time
+
+    def as_dict(self):
+        return OrderedDict([('calls', self.calls), ('time', self.time), ('min_time', self.min_time),
+                            ('max_time', self.max_time), ('lines', self.lines), ('bytes', self.bytes),
+                            ('moves', dict(self.moves)), ('plunges', self.plunges),
+                            ('rapid_length', self.rapid_length), ('cutting_length', self.cutting_length),
+                            ('machining_time', self.machining_time)])
+
+
+class _Call(Statistics):
+    r"""Statistics of one call, that reads back the lines it emitted if the motions are recorded"""
+    def __init__(self, motion):
+        Statistics.__init__(self)
+        self.calls = 1
+        self._parser = parser.GcodeParser() if motion else None
+        self._estimator = estimate.Estimator() if motion else None
+        self._z = None
+
+    def add_lines(self, text, count):
+        self.lines += count
+        self.bytes += len(text)
+        if self._parser is None:
+            return
+        moves = list(self._parser.parse(text.splitlines(True)))
+        for move in moves:
+            kind = toolpath.PREFIXES[move.kind].split()[0]
+            self.moves[kind] = self.moves.get(kind, 0) + 1
+            if move.z is not None:
+                if (move.kind == toolpath.LINEAR and move.x is None and move.y is None and self._z is not None and
+                        move.z < self._z):
+                    self.plunges += 1
+                self._z = move.z
+        try:
+            motion = self._estimator.add(moves)
+        except exceptions.WrongParameterError:  # a cutting move without feedrate, not timed
+            return
+        self.rapid_length += motion.rapid_length
+        self.cutting_length += motion.cutting_length
+        self.machining_time += motion.time
+
+    def timed(self, seconds):
+        self.time += seconds
+        self.min_time = self.max_time = self.time
+
+
+class Recorder(object):
+    r"""Statistics of the instrumented calls
+
+    Parameters
+    ----------
+    motion : bool, optional
+        Also record the motion statistics of the shapes (their Gcode is read back, after the timing),
+        defaults to True
+    profiler : cProfile.Profile, optional
+        Enabled during the instrumented calls only, defaults to None
+    max_calls : int, optional
+        Number of shape calls whose own statistics are kept in calls, defaults to 10000
+
+    Attributes
+    ----------
+    functions : OrderedDict
+        Statistics of each function, by name (e.g. 'square_pocket', 'iter_square_pocket', 'iter_gcode',
+        'GcodeFormatter.format', 'g1_gcode')
+    calls : list
+        (name, Statistics) of the first max_calls calls to the shape functions
+
+    """
+    def __init__(self, motion=True, profiler=None, max_calls=10000):
+        self.motion = motion
+        self.profiler = profiler
+        self.max_calls = max_calls
+        self.functions = OrderedDict()
+        self.calls = list()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def busy(self):
+        r"""True while a shape call runs in this thread: the shapes it calls are not recorded on their own"""
+        return getattr(self._local, 'busy', False)
+
+    def _start(self):
+        self._local.busy = True
+        if self.profiler is not None:
+            self.profiler.enable()
+        return _clock()
+
+    def _stop(self, start):
+        seconds = _clock() - start
+        if self.profiler is not None:
+            self.profiler.disable()
+        self._local.busy = False
+        return seconds
+
+    def _record(self, name, call, shape):
+        with self._lock:
+            self.functions.setdefault(name, Statistics()).add(call)
+            if shape and len(self.calls) < self.max_calls:
+                self.calls.append((name, call))
+
+    def call(self, name, function, args, kwargs):
+        r"""Call a shape function that returns Gcode, and record it"""
+        call = _Call(self.motion)
+        start = self._start()
+        try:
+            gcode = function(*args, **kwargs)
+        finally:
+            call.timed(self._stop(start))
+        call.add_lines(gcode, gcode.count('\n'))
+        self._record(name, call, True)
+        return gcode
+
+    def emit(self, name, function, args, kwargs):
+        r"""Call an emitter that returns Gcode, and record its duration and what it emitted"""
+        start = _clock()
+        text = function(*args, **kwargs)
+        call = Statistics()
+        call.calls = 1
+        call.time = call.min_time = call.max_time = _clock() - start
+        call.lines = text.count('\n')
+        call.bytes = len(text)
+        self._record(name, call, False)
+        return text
+
+    def iterate_moves(self, name, function, moves):
+        r"""Generator of the lines of toolpath.iter_gcode, recorded with its moves when it is exhausted or closed
+
+        The time spent generating the lines includes the time spent generating the moves, if they are generated
+        lazily (as the shapes do).
+        """
+        call = Statistics()
+        call.calls = 1
+        kinds = dict()
+        seconds = 0.0
+        lines = function(_count_kinds(moves, kinds))
+        try:
+            while True:
+                start = _clock()
+                try:
+                    line = next(lines)
+                except StopIteration:
+                    break
+                finally:
+                    seconds += _clock() - start
+                call.lines += 1
+                call.bytes += len(line)
+                yield line
+        finally:
+            for kind, count in kinds.items():
+                kind = toolpath.PREFIXES[kind].split()[0]
+                call.moves[kind] = call.moves.get(kind, 0) + count
+            call.time = call.min_time = call.max_time = seconds
+            self._record(name, call, False)
+
+    def iterate(self, name, function, args, kwargs):
+        r"""Generator of the lines of an iter_* shape function, recorded when it is exhausted or closed
+
+        Only the time spent generating the lines is counted, not the time spent by the consumer.
+        """
+        call = _Call(self.motion)
+        seconds = 0.0
+        start = self._start()
+        try:
+            lines = function(*args, **kwargs)
+        finally:
+            seconds += self._stop(start)
+        try:
+            while True:
+                start = self._start()
+                try:
+                    line = next(lines)
+                except StopIteration:
+                    break
+                finally:
+                    seconds += self._stop(start)
+                call.add_lines(line, 1)
+                yield line
+        finally:
+            call.timed(seconds)
+            self._record(name, call, True)
+
+    def total(self):
+        r"""Statistics of all the recorded shape calls"""
+        total = Statistics()
+        for _, call in self.calls:
+            total.add(call)
+        return total
+
+    def report(self):
+        r"""Returns the statistics as a dict of JSON types"""
+        return OrderedDict([('pycnc', pycnc.get_version()),
+                            ('python', platform.python_version()),
+                            ('motion', self.motion),
+                            ('functions', OrderedDict((name, statistics.as_dict())
+                                                      for name, statistics in self.functions.items())),
+                            ('calls', [OrderedDict([('function', name)] + list(call.as_dict().items()))
+                                       for name, call in self.calls])])
+
+    def write_json(self, fileobj, indent=2):
+        r"""Write the report to a file-like object as JSON"""
+        fileobj.write(json.dumps(self.report(), indent=indent))
+
+
+def _count_kinds(moves, kinds):
+    r"""Generator of the moves, that counts the moves of each kind in kinds"""
+    for move in moves:
+        kinds[move[0]] = kinds.get(move[0], 0) + 1
+        yield move
+
+
+def _wrap(recorder, name, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if recorder.busy():
+            return function(*args, **kwargs)
+        return recorder.call(name, function, args, kwargs)
+    return wrapper
+
+
+def _wrap_iter(recorder, name, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if recorder.busy():
+            return function(*args, **kwargs)
+        return recorder.iterate(name, function, args, kwargs)
+    return wrapper
+
+
+def _wrap_emitter(recorder, name, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        return recorder.emit(name, function, args, kwargs)
+    return wrapper
+
+
+def _wrap_iter_gcode(recorder, function):
+    @functools.wraps(function)
+    def wrapper(moves):
+        return recorder.iterate_moves('iter_gcode', function, moves)
+    return wrapper
+
+
+def enable(motion=True, profiler=None, max_calls=10000):
+    r"""Start recording the calls to the shape functions and to the Gcode emitters
+
+    See Recorder for the parameters.
+
+    Returns
+    -------
+    Recorder
+
+    Raises
+    ------
+    WrongParameterError
+        If the instrumentation is already enabled
+
+    """
+    global _recorder
+    if _recorder is not None:
+        raise exceptions.WrongParameterError('The instrumentation is already enabled')
+    recorder = Recorder(motion=motion, profiler=profiler, max_calls=max_calls)
+    for name in core.SHAPES:
+        function = _originals[(core, name)] = getattr(core, name)
+        setattr(core, name, _wrap(recorder, name, function))
+        function = _originals[(core, 'iter_' + name)] = getattr(core, 'iter_' + name)
+        setattr(core, 'iter_' + name, _wrap_iter(recorder, 'iter_' + name, function))
+    for name in EMITTERS:
+        function = _originals[(gcodes, name)] = getattr(gcodes, name)
+        setattr(gcodes, name, _wrap_emitter(recorder, name, function))
+    function = _originals[(toolpath, 'iter_gcode')] = toolpath.iter_gcode
+    toolpath.iter_gcode = _wrap_iter_gcode(recorder, function)
+    formatter = gcodes.get_formatter()
+    for name in FORMATTER_METHODS:
+        _originals[(formatter, name)] = vars(formatter).get(name)
+        setattr(formatter, name, _wrap_emitter(recorder, 'GcodeFormatter.' + name, getattr(formatter, name)))
+    _recorder = recorder
+    return recorder
+
+
+def disable():
+    r"""Stop recording, restore the original functions and return the Recorder (None if it was not enabled)"""
+    global _recorder
+    for (owner, name), function in _originals.items():
+        if function is None:
+            delattr(owner, name)
+        else:
+            setattr(owner, name, function)
+    _originals.clear()
+    recorder, _recorder = _recorder, None
+    return recorder
+
+
+@contextmanager
+def instrumented(motion=True, profiler=None, max_calls=10000):
+    r"""Context manager that records the calls made in its block, yields the Recorder"""
+    recorder = enable(motion=motion, profiler=profiler, max_calls=max_calls)
+    try:
+        yield recorder
+    finally:
+        disable()
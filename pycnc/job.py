@@ -0,0 +1,496 @@
+# coding: utf-8
+
+r"""Multi-feature jobs
+
+Summary
+-------
+A Job collects the features (calls to the shape functions of pycnc.core) of an NC file
+and writes them between core.start_gcode() and core.end_gcode().
+
+The features can be reordered to minimize the rapid travel between them
+(nearest neighbour tour improved by 2-opt), and the return to the origin
+that most shapes start with is dropped.
+
+The features are independent, so a Job can generate them on several processes.
+
+The layers of the features and the features repeated at several positions can be written
+as LinuxCNC O-word subroutines (see pycnc.subroutines).
+
+The jobs of the successive tools can share a model of the stock, so that the pockets and holes of a smaller
+tool only cut where the earlier operations left material (see pycnc.rest).
+
+"""
+
+from __future__ import division
+
+import functools
+import math
+import os
+from collections import namedtuple
+
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:  # Python 2 without the futures backport
+    ProcessPoolExecutor = None
+
+import pycnc.cache as cache
+import pycnc.core as core
+import pycnc.estimate as estimate
+import pycnc.gcodes as gcodes
+import pycnc.rest as rest
+import pycnc.subroutines as subroutines
+import pycnc.toolpath as toolpath
+import pycnc.exceptions as exceptions
+
+
+Feature = namedtuple('Feature', ['shape', 'args', 'kwargs'])
+Feature.__doc__ = r"""A call to a shape function of pycnc.core, identified by its name"""
+
+
+def feature_gcode(feature):
+    r"""Returns the Gcode of a feature, exactly as its shape function writes it"""
+    return getattr(core, feature.shape)(*feature.args, **feature.kwargs)
+
+
+def feature_toolpath(feature, optimize=True):
+    r"""Returns the toolpath.Toolpath of a feature, without its return to the origin if optimize"""
+    tp = core.make_toolpath(feature.shape, *feature.args, **feature.kwargs)
+    if optimize:
+        strip_origin_return(tp)
+    return tp
+
+
+def _formatted(formatter, function, item):
+    r"""Returns function(item) with the GcodeFormatter of the process that made the pool"""
+    previous = gcodes.set_formatter(formatter)
+    try:
+        return function(item)
+    finally:
+        gcodes.set_formatter(previous)
+
+
+def parallel_map(function, items, workers=None, context=None):
+    r"""Returns [function(item) for item in items], computed on a pool of processes
+
+    The results are in the order of items whatever the process that computed them.
+    function must be a module level function and items must be picklable
+    (features are, as they hold the name of their shape function).
+    The processes format the Gcode with the formatter of this process (see gcodes.set_formatter),
+    whatever the way they are started.
+
+    Parameters
+    ----------
+    function : function
+    items : list
+    workers : int, optional
+        Number of processes, defaults to the number of CPUs.
+        With 1 worker, or when concurrent.futures is not available, the items are processed in this process.
+    context : multiprocessing context, optional
+        Starts the processes (e.g. multiprocessing.get_context('spawn')), defaults to the one of the platform
+
+    Examples
+    --------
+    >>> parallel_map(abs, [-1, 2, -3], workers=2)
+    [1, 2, 3]
+
+    """
+    items = list(items)
+    if workers is None:
+        workers = os.cpu_count() if hasattr(os, 'cpu_count') else 1
+    workers = min(workers or 1, len(items))
+    if workers < 2 or ProcessPoolExecutor is None:
+        return [function(item) for item in items]
+    # a few chunks per process keep the processes busy without paying the IPC per item
+    chunksize = max(1, len(items) // (4 * workers))
+    kwargs = dict() if context is None else dict(mp_context=context)
+    function = functools.partial(_formatted, gcodes.get_formatter(), function)
+    with ProcessPoolExecutor(max_workers=workers, **kwargs) as executor:
+        return list(executor.map(function, items, chunksize=chunksize))
+
+
+def _distance(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def strip_origin_return(tp):
+    r"""Remove the rapid move to X0 Y0 at the start of a toolpath (in place)
+
+    The move is only removed if a later rapid move positions X and Y before the first cut: an oval or a hole
+    centered on the origin has no other approach move.
+
+    Examples
+    --------
+    >>> tp = core.make_toolpath('rectangle', 20.0, 10.0, 1.0, 2.0, 3.0, 640.0, 200.0, 0.0, -1.0, -1.0, 10.0)
+    >>> tp[0]
+    Move(kind=0, x=0.0, y=0.0, z=10.0, i=None, j=None, r=None, q=None, feedrate=None)
+    >>> strip_origin_return(tp)
+    >>> tp[0]
+    Move(kind=0, x=None, y=None, z=10.0, i=None, j=None, r=None, q=None, feedrate=None)
+
+    """
+    if not len(tp) or tp.kind[0] != toolpath.RAPID or tp.x[0] != 0.0 or tp.y[0] != 0.0:
+        return
+    x_set = y_set = False
+    for kind, x, y in zip(tp.kind[1:], tp.x[1:], tp.y[1:]):
+        if kind != toolpath.RAPID:
+            break
+        x_set = x_set or x == x
+        y_set = y_set or y == y
+    if not (x_set and y_set):
+        return
+    if tp.z[0] != tp.z[0]:
+        for name in ('kind', ) + toolpath.Toolpath.columns:
+            del tp.column(name)[0]
+    else:
+        tp.x[0] = toolpath.NAN
+        tp.y[0] = toolpath.NAN
+
+
+def entry_exit(tp, start=(0.0, 0.0)):
+    r"""Returns the XY point where a toolpath starts cutting and the XY point where it ends
+
+    Parameters
+    ----------
+    tp : toolpath.Toolpath
+    start : tuple, optional
+        XY position of the tool before the toolpath, defaults to the origin
+
+    """
+    x, y = start
+    entry = None
+    for kind, move_x, move_y in zip(tp.kind, tp.x, tp.y):
+        if entry is None and kind != toolpath.RAPID:
+            entry = (x, y)
+        if move_x == move_x:
+            x = move_x
+        if move_y == move_y:
+            y = move_y
+    if entry is None:
+        entry = (x, y)
+    return entry, (x, y)
+
+
+def rapid_length(tp, start=(0.0, 0.0)):
+    r"""Returns the XY length of the rapid moves of a toolpath"""
+    x, y = start
+    length = 0.0
+    for kind, move_x, move_y in zip(tp.kind, tp.x, tp.y):
+        next_x = move_x if move_x == move_x else x
+        next_y = move_y if move_y == move_y else y
+        if kind == toolpath.RAPID:
+            length += math.hypot(next_x - x, next_y - y)
+        x, y = next_x, next_y
+    return length
+
+
+def _nearest_neighbour(entries, exits, start):
+    r"""Greedy tour: always go to the closest feature that has not been machined yet"""
+    remaining = set(range(len(entries)))
+    order = list()
+    position = start
+    while remaining:
+        index = min(remaining, key=lambda k: (_distance(position, entries[k]), k))
+        remaining.remove(index)
+        order.append(index)
+        position = exits[index]
+    return order
+
+
+def _two_opt(order, entries, exits, start, max_passes):
+    r"""Improve an open tour by reversing segments, as long as it shortens the travel
+
+    Features whose entry and exit points differ are taken into account:
+    reversing a segment also changes the travel inside the segment.
+
+    """
+    n = len(order)
+
+    def cumulated_travels():
+        r"""Cumulated travel along the tour, forward and as if it was walked backwards"""
+        forward, backward = [0.0], [0.0]
+        for k in range(n - 1):
+            forward.append(forward[-1] + _distance(exits[order[k]], entries[order[k + 1]]))
+            backward.append(backward[-1] + _distance(exits[order[k + 1]], entries[order[k]]))
+        return forward, backward
+
+    for _ in range(max_passes):
+        improved = False
+        forward, backward = cumulated_travels()
+        for i in range(n - 1):
+            before = start if i == 0 else exits[order[i - 1]]
+            for j in range(i + 1, n):
+                # current: before -> i ... j -> j + 1, candidate: before -> j ... i -> j + 1
+                old = _distance(before, entries[order[i]]) + forward[j] - forward[i]
+                new = _distance(before, entries[order[j]]) + backward[j] - backward[i]
+                if j + 1 < n:
+                    old += forward[j + 1] - forward[j]
+                    new += _distance(exits[order[i]], entries[order[j + 1]])
+                if new < old - 1e-9:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    forward, backward = cumulated_travels()
+                    improved = True
+        if not improved:
+            break
+    return order
+
+
+def optimize_order(entries, exits, start=(0.0, 0.0), two_opt=True, max_passes=10):
+    r"""Order features to minimize the rapid travel between them
+
+    Parameters
+    ----------
+    entries, exits : list of (x, y) tuples
+        Where each feature starts and ends
+    start : tuple, optional
+        XY position of the tool before the first feature, defaults to the origin
+    two_opt : bool, optional
+        Improve the nearest neighbour tour with 2-opt, defaults to True
+    max_passes : int, optional
+        Maximum number of 2-opt passes over the tour, defaults to 10
+
+    Returns
+    -------
+    list
+        The indices of the features in machining order
+
+    Examples
+    --------
+    >>> points = [(10.0, 0.0), (0.0, 0.0), (5.0, 0.0)]
+    >>> optimize_order(points, points)
+    [1, 2, 0]
+
+    """
+    if len(entries) != len(exits):
+        raise exceptions.WrongParameterError('entries and exits must have the same length')
+    order = _nearest_neighbour(entries, exits, start)
+    if two_opt and len(order) > 2:
+        order = _two_opt(order, entries, exits, start, max_passes)
+    return order
+
+
+class Job(object):
+    r"""A set of features written into one NC file
+
+    Parameters
+    ----------
+    optimize : bool, optional
+        Reorder the features to minimize the rapid travel and drop their return to the origin,
+        defaults to True. If False, the features are written in the order they were added,
+        exactly as the shape functions write them.
+    start : tuple, optional
+        XY position of the tool at the start of the program, defaults to the origin
+    features : list of Feature or of (shape, args, kwargs) tuples, optional
+        Initial features
+    workers : int, optional
+        Number of processes that generate the features (see generate), defaults to 1
+        i.e. the features are generated in this process, when needed.
+        None uses all the CPUs.
+    cache : cache.FeatureCache, optional
+        Cache of the feature toolpaths, shared between jobs, defaults to None.
+        Only used by optimized jobs: the Gcode of a not optimized job is exactly the one of the shape functions.
+    subroutines : bool, optional
+        Write the layers of the features, and the features that are translations of one another,
+        as LinuxCNC O-word subroutines called in loops, defaults to False. Only used by optimized jobs.
+    stock : simulate.Heightmap, optional
+        Model of the stock, shared with the jobs of the other tools, defaults to None. The features are simulated
+        on it in machining order the first time the job is generated, and the features of rest.REST_SHAPES only
+        cut where material remains. Only used by optimized jobs.
+
+    Examples
+    --------
+    >>> job = Job()
+    >>> for x in (10.0, 0.0, 5.0):
+    ...     job.add(core.drill, x, 0.0, -4.0, 10.0, 200.0)
+    >>> [feature.args[0] for feature in job.ordered_features()]
+    [0.0, 5.0, 10.0]
+    >>> job.rapid_travel(), Job(optimize=False, features=job.features).rapid_travel()
+    (10.0, 25.0)
+
+    """
+    def __init__(self, optimize=True, start=(0.0, 0.0), features=None, workers=1, cache=None, subroutines=False,
+                 stock=None):
+        self.optimize = optimize
+        self.start = start
+        self.workers = workers
+        self.cache = cache
+        self.subroutines = subroutines
+        self.stock = stock
+        self.features = list()
+        self._toolpaths = dict()
+        self._machined = None
+        self._gcodes = dict()
+        for shape, args, kwargs in features or ():
+            self.add(shape, *args, **kwargs)
+
+    def add(self, shape, *args, **kwargs):
+        r"""Add a feature: a shape function of pycnc.core (or its name) and its parameters"""
+        name = getattr(shape, '__name__', shape)
+        if name not in core.SHAPES:
+            raise exceptions.WrongParameterError('%s is not a shape' % name)
+        if self._machined is not None:
+            raise exceptions.WrongParameterError('The features of the job were already machined on the stock')
+        self.features.append(Feature(name, args, kwargs))
+
+    def generate(self, workers=None):
+        r"""Generate the features that have not been generated yet, on a pool of processes
+
+        The shape functions are pure, so the result does not depend on the number of processes.
+
+        Parameters
+        ----------
+        workers : int, optional
+            Number of processes, defaults to the number of CPUs
+
+        """
+        generated = self._toolpaths if self.optimize else self._gcodes
+        missing = [index for index in range(len(self.features)) if index not in generated]
+        if self.optimize and self.cache is not None:
+            missing = [index for index in missing if not self._from_cache(index)]
+            results = parallel_map(functools.partial(feature_toolpath, optimize=False),
+                                   [self.features[index] for index in missing], workers=workers)
+            for index, tp in zip(missing, results):
+                self.cache.store(*(self.features[index] + (tp, )))
+                strip_origin_return(tp)
+                generated[index] = tp
+            return
+        function = feature_toolpath if self.optimize else feature_gcode
+        results = parallel_map(function, [self.features[index] for index in missing], workers=workers)
+        generated.update(zip(missing, results))
+
+    def _from_cache(self, index):
+        r"""Get the toolpath of a feature from the cache, returns False if it is not cached"""
+        tp = self.cache.lookup(*self.features[index])
+        if tp is None:
+            return False
+        strip_origin_return(tp)
+        self._toolpaths[index] = tp
+        return True
+
+    def __len__(self):
+        return len(self.features)
+
+    def _toolpath(self, index):
+        r"""Toolpath of a feature, generated once"""
+        try:
+            return self._toolpaths[index]
+        except KeyError:
+            feature = self.features[index]
+            if self.optimize and self.cache is not None:
+                tp = self.cache.toolpath(feature.shape, *feature.args, **feature.kwargs)
+                strip_origin_return(tp)
+            else:
+                tp = feature_toolpath(feature, optimize=self.optimize)
+            self._toolpaths[index] = tp
+            return tp
+
+    def _machining(self, index):
+        r"""Toolpath of a feature as it is written: only where material remains if the job has a stock"""
+        if self.stock is None or not self.optimize:
+            return self._toolpath(index)
+        if self._machined is None:
+            machined = dict()
+            for machined_index in self._order():
+                feature = self.features[machined_index]
+                machined[machined_index] = rest.machine_feature(self.stock, feature.shape, feature.args,
+                                                                feature.kwargs, moves=self._toolpath(machined_index))
+            self._machined = machined
+        return self._machined[index]
+
+    def _order(self):
+        r"""Machining order of the features (indices)"""
+        if not self.optimize:
+            return list(range(len(self.features)))
+        entries, exits = self._entries_exits()
+        return optimize_order(entries, exits, start=self.start)
+
+    def _entries_exits(self):
+        entries, exits = list(), list()
+        for index in range(len(self.features)):
+            entry, exit_ = entry_exit(self._toolpath(index))
+            entries.append(entry)
+            exits.append(exit_)
+        return entries, exits
+
+    def ordered_features(self):
+        r"""Returns the features in machining order"""
+        return [self.features[index] for index in self._order()]
+
+    def rapid_travel(self):
+        r"""XY length of all the rapid moves of the job"""
+        return rapid_length(self.toolpath(), start=self.start)
+
+    def estimate(self, machine=None):
+        r"""Estimate the machining time of the job
+
+        Parameters
+        ----------
+        machine : estimate.Machine, optional
+            Kinematic limits, defaults to estimate.Machine()
+
+        Returns
+        -------
+        features : list
+            (Feature, estimate.Estimate) tuples, in machining order
+        total : estimate.Estimate
+
+        """
+        estimator = estimate.Estimator(machine, start=(self.start[0], self.start[1], None))
+        features = [(self.features[index], estimator.add(self._machining(index))) for index in self._order()]
+        return features, estimator.total
+
+    def toolpath(self):
+        r"""Returns the toolpath.Toolpath of all the features, in machining order"""
+        tp = toolpath.Toolpath()
+        for index in self._order():
+            tp.extend(self._machining(index))
+        return tp
+
+    def program(self):
+        r"""Returns the subroutines.Program of the features, in machining order
+
+        The features that are translations of one another (same cache.feature_key) call one subroutine
+        with their position, the other ones are written with their layers in a subroutine.
+        With a stock, the toolpaths of the features depend on the earlier ones: none is a translation.
+        """
+        order = self._order()
+        keys = dict((index, cache.feature_key(*self.features[index])) for index in order)
+        counts = dict()
+        for key, position in keys.values():
+            if position is not None and self.stock is None:
+                counts[key] = counts.get(key, 0) + 1
+        program = subroutines.Program()
+        for index in order:
+            key, position = keys[index]
+            if counts.get(key, 0) > 1:
+                program.add_instance(key, self._toolpath(index), position[0], position[1])
+            else:
+                program.add(self._machining(index))
+        return program
+
+    def iter_gcode(self):
+        r"""Generator of the Gcode of the NC file (start code, features, end code)"""
+        if self.workers != 1:
+            self.generate(workers=self.workers)
+        yield core.start_gcode()
+        if self.optimize and self.subroutines:
+            for line in self.program().iter_gcode():
+                yield line
+            yield core.end_gcode()
+            return
+        for index in self._order():
+            if self.optimize:
+                for line in self._machining(index).iter_gcode():
+                    yield line
+            elif index in self._gcodes:
+                yield self._gcodes[index]
+            else:
+                yield feature_gcode(self.features[index])
+        yield core.end_gcode()
+
+    def to_gcode(self):
+        r"""Returns the Gcode of the NC file as a string"""
+        return ''.join(self.iter_gcode())
+
+    def write_to(self, fileobj):
+        r"""Write the NC file to a file-like object, returns the number of characters written"""
+        return core.write_to(fileobj, self.iter_gcode())
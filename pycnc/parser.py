@@ -0,0 +1,245 @@
+# coding: utf-8
+
+r"""Gcode parsing
+
+Summary
+-------
+Streaming reader of the Gcode subset written by pycnc (G0, G1, G2, G3, G73, G81, G83,
+the modal settings of core.start_gcode(), M2 ...) that yields toolpath.Move tuples.
+
+Lines whose motion code was elided (see gcodes.ModalEmitter) use the active motion mode,
+so that the output of pycnc and of the ModalEmitter can both be read back.
+
+"""
+
+from __future__ import division
+
+import io
+import re
+
+import pycnc.toolpath as toolpath
+import pycnc.exceptions as exceptions
+
+
+_WORD = re.compile(r'([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:E[-+]?\d+)?)')
+_COMMENT = re.compile(r'\([^)]*\)')
+
+MOTIONS = {'G0': toolpath.RAPID,
+           'G1': toolpath.LINEAR,
+           'G2': toolpath.ARC_CW,
+           'G3': toolpath.ARC_CCW,
+           'G73': toolpath.DRILL_CHIP_BREAKING,
+           'G81': toolpath.DRILL,
+           'G83': toolpath.DRILL_PECK}
+
+CANNED_CYCLES = toolpath.CANNED_CYCLES
+
+# modal group of each supported non motion code
+MODAL_GROUPS = {'G17': 'plane', 'G18': 'plane', 'G19': 'plane',
+                'G20': 'units', 'G21': 'units',
+                'G40': 'cutter_compensation',
+                'G43': 'tool_length_offset', 'G49': 'tool_length_offset',
+                'G54': 'coordinate_system', 'G55': 'coordinate_system', 'G56': 'coordinate_system',
+                'G57': 'coordinate_system', 'G58': 'coordinate_system', 'G59': 'coordinate_system',
+                'G61': 'path_control', 'G61.1': 'path_control', 'G64': 'path_control',
+                'G90': 'distance', 'G91': 'distance',
+                'G93': 'feed_mode', 'G94': 'feed_mode', 'G95': 'feed_mode',
+                'G98': 'retract', 'G99': 'retract'}
+
+PROGRAM_END_CODES = ('M2', 'M30')
+
+
+def _number(text):
+    r"""Integers stay integers so that parsed pycnc Gcode is written back identically"""
+    if '.' in text or 'E' in text:
+        return float(text)
+    return int(text)
+
+
+class GcodeParser(object):
+    r"""Stateful Gcode reader
+
+    Parameters
+    ----------
+    resolve : bool, optional
+        If False (the default) the moves only hold the words written on their line.
+        If True the moves are resolved against the modal state: X Y Z are absolute end positions
+        and F is the active feedrate; canned cycles also get the sticky Z R Q of their cycle.
+        In both cases incremental (G91) axis words are converted to absolute positions.
+
+    Attributes
+    ----------
+    modes : dict
+        Active code of each modal group (e.g. modes['units'] == 'G21')
+    position : dict
+        Last known X Y Z (None when unknown)
+    feedrate : float
+        Active feedrate
+    program_end : bool
+        True once M2 or M30 has been read
+    unsupported : dict
+        Count of the codes that were read but are not interpreted
+
+    Examples
+    --------
+    >>> parser = GcodeParser()
+    >>> moves = list(parser.parse(['G21\n', 'G1 X1.0 Y2 F640.0 \n', 'X3.5\n']))
+    >>> moves[1]
+    Move(kind=1, x=3.5, y=None, z=None, i=None, j=None, r=None, q=None, feedrate=None)
+    >>> parser.modes['units'], parser.position['X'], parser.position['Y'], parser.feedrate
+    ('G21', 3.5, 2, 640.0)
+
+    """
+
+    def __init__(self, resolve=False):
+        self.resolve = resolve
+        self.motion = None
+        self.modes = dict()
+        self.position = dict()
+        self.feedrate = None
+        self.cycle = dict()
+        self.program_end = False
+        self.unsupported = dict()
+        self.line_number = 0
+        self._cycle_initial_z = None
+        self.reset()
+
+    def reset(self):
+        r"""Forget the modal state, as at the start of a program"""
+        self.motion = None
+        self.modes = {'distance': 'G90', 'retract': 'G98'}
+        self.position = {'X': None, 'Y': None, 'Z': None}
+        self.feedrate = None
+        self.cycle = {'Z': None, 'R': None, 'Q': None}
+        self.program_end = False
+        self._cycle_initial_z = None
+
+    def parse(self, lines):
+        r"""Generator of the moves of an iterable of Gcode lines"""
+        parse_line = self.parse_line
+        for line in lines:
+            move = parse_line(line)
+            if move is not None:
+                yield move
+
+    def parse_line(self, line):
+        r"""Returns the move of a line of Gcode, or None if the line does not move the tool
+
+        Raises
+        ------
+        GcodeParseError
+            If the line has axis words but no motion mode is active
+
+        """
+        self.line_number += 1
+        line = line.upper()
+        if '(' in line:
+            line = _COMMENT.sub(' ', line)
+        if ';' in line:
+            line = line[:line.index(';')]
+        words = dict()
+        motion = None
+        for letter, text in _WORD.findall(line):
+            if letter == 'G' or letter == 'M':
+                code = letter + (text.lstrip('0') or '0')
+                if code in MOTIONS:
+                    motion = code
+                elif code == 'G80':
+                    self.motion = None
+                    self._cycle_initial_z = None
+                elif code in MODAL_GROUPS:
+                    self.modes[MODAL_GROUPS[code]] = code
+                elif code in PROGRAM_END_CODES:
+                    self.reset()
+                    self.program_end = True
+                else:
+                    self.unsupported[code] = self.unsupported.get(code, 0) + 1
+            elif letter in 'XYZIJRQF':
+                words[letter] = _number(text)
+            # N (line numbers), S (spindle speed), T (tool) ... words are not interpreted
+        if motion is not None:
+            if MOTIONS[motion] not in CANNED_CYCLES or self.motion != MOTIONS[motion]:
+                self._cycle_initial_z = None
+            self.motion = MOTIONS[motion]
+        if 'F' in words:
+            self.feedrate = words['F']
+        if not ('X' in words or 'Y' in words or 'Z' in words or 'I' in words or 'J' in words):
+            return None
+        if self.motion is None:
+            raise exceptions.GcodeParseError('line %i: axis words without an active motion mode' % self.line_number)
+        return self._move(words)
+
+    def _move(self, words):
+        r"""Build the move and update the position"""
+        get = words.get
+        kind = self.motion
+        x, y, z = get('X'), get('Y'), get('Z')
+        incremental = self.modes['distance'] == 'G91'
+        position = self.position
+        if incremental:
+            x = None if x is None or position['X'] is None else position['X'] + x
+            y = None if y is None or position['Y'] is None else position['Y'] + y
+            z = None if z is None or position['Z'] is None else position['Z'] + z
+        r, q = get('R'), get('Q')
+        if kind in CANNED_CYCLES:
+            cycle = self.cycle
+            if self._cycle_initial_z is None:
+                self._cycle_initial_z = position['Z']
+            for letter, value in (('Z', z), ('R', r), ('Q', q)):
+                if value is not None:
+                    cycle[letter] = value
+            if x is not None:
+                position['X'] = x
+            if y is not None:
+                position['Y'] = y
+            if self.resolve:
+                x, y, z, r, q = position['X'], position['Y'], cycle['Z'], cycle['R'], cycle['Q']
+            if self.modes['retract'] == 'G99' or self._cycle_initial_z is None or cycle['R'] is None:
+                position['Z'] = cycle['R']
+            else:
+                position['Z'] = max(self._cycle_initial_z, cycle['R'])
+        else:
+            if x is not None:
+                position['X'] = x
+            if y is not None:
+                position['Y'] = y
+            if z is not None:
+                position['Z'] = z
+            if self.resolve:
+                x, y, z = position['X'], position['Y'], position['Z']
+        feedrate = self.feedrate if self.resolve else get('F')
+        return toolpath.Move(kind, x, y, z, get('I'), get('J'), r, q, feedrate)
+
+
+def parse(gcode, resolve=False):
+    r"""Generator of the moves of Gcode given as a string or an iterable of lines
+
+    Examples
+    --------
+    >>> import pycnc.core
+    >>> moves = list(parse(pycnc.core.drill(1.0, 2.0, -4.0, 10.0, 200.0)))
+    >>> [move.kind for move in moves]
+    [0, 0, 81]
+    >>> toolpath.to_gcode(moves) == pycnc.core.drill(1.0, 2.0, -4.0, 10.0, 200.0)
+    True
+
+    """
+    if isinstance(gcode, str):
+        gcode = gcode.splitlines(True)
+    return GcodeParser(resolve=resolve).parse(gcode)
+
+
+def parse_file(filename, resolve=False, buffer_size=1 << 20):
+    r"""Generator of the moves of a Gcode (.ngc) file
+
+    The file is read in chunks of buffer_size bytes, so that files of any size are parsed in constant memory
+
+    """
+    with io.open(filename, 'r', encoding='ascii', errors='replace', buffering=buffer_size) as f:
+        for move in GcodeParser(resolve=resolve).parse(f):
+            yield move
+
+
+def read_toolpath(filename, resolve=False):
+    r"""Returns the toolpath.Toolpath of a Gcode (.ngc) file"""
+    return toolpath.Toolpath.from_moves(parse_file(filename, resolve=resolve))
@@ -0,0 +1,157 @@
+# coding: utf-8
+
+r"""Rest machining
+
+Summary
+-------
+A stock model (a simulate.Heightmap of the top of the material) follows the operations of a job,
+or of the jobs of the successive tools: every feature is simulated on it in machining order.
+
+The features of REST_SHAPES only cut where material remains: the moves that would only cut air,
+because an earlier operation (e.g. a larger tool) already removed the material, are replaced
+by a retract to the safety height, a rapid move over the stock and a rapid move down to just above
+the depth where the cutting starts again, when that is faster.
+
+The features without a tool_diameter parameter (the drillings, path) are not simulated:
+the diameter of their tool is not known.
+
+Examples
+--------
+>>> import pycnc.core as core
+>>> import pycnc.simulate as simulate
+>>> stock = simulate.Heightmap(-1.0, -1.0, 41.0, 41.0, resolution=0.25)
+>>> hole = machine_feature(stock, 'full_hole', (20.0, 20.0, 30.0, 6.0, 600.0, 200.0, 0.0, -2.0, -1.0, 5.0), {})
+>>> corners = machine_feature(stock, 'square_pocket', (20.0, 20.0, 30.0, 30.0, 2.0, 600.0, 200.0, 0.0, -2.0,
+...                                                    -1.0, 5.0), {})
+>>> len(corners), len(core.make_toolpath('square_pocket', 20.0, 20.0, 30.0, 30.0, 2.0, 600.0, 200.0, 0.0, -2.0,
+...                                      -1.0, 5.0))
+(98, 291)
+
+"""
+
+from __future__ import division
+
+import pycnc.cache as cache
+import pycnc.core as core
+import pycnc.estimate as estimate
+import pycnc.simulate as simulate
+import pycnc.toolpath as toolpath
+
+
+# shapes that only cut where material remains
+REST_SHAPES = ('square_pocket', 'thin', 'thin_from_center', 'full_hole')
+
+# height above the depth of the next cut where the rapid moves down stop, in mm
+CLEARANCE = 0.5
+
+
+def _bridge(run, start, end, feedrate, safety_z, z_feed_rate, machine, clearance):
+    r"""The moves that replace a run of moves that cut nothing from start to end, if they are faster, else run"""
+    x, y, z = end
+    top = max(safety_z, z)
+    bridge = list()
+    if start[2] < top:
+        bridge.append(toolpath.g0_move(z=top))
+    bridge.append(toolpath.g0_move(x=x, y=y))
+    if z < top:
+        if z + clearance < top:
+            bridge.append(toolpath.g0_move(z=z + clearance))
+        bridge.append(toolpath.g1_move(z=z, feedrate=z_feed_rate))
+    times = list()
+    for moves in (run, bridge):
+        estimator = estimate.Estimator(machine, start=start)
+        estimator.feedrate = feedrate
+        times.append(estimator.add(moves).time)
+    return bridge if times[1] < times[0] else run
+
+
+def rest_moves(moves, simulator, safety_z, z_feed_rate, machine=None, clearance=CLEARANCE):
+    r"""Simulate moves on the stock of a simulator, returns them without the runs of moves that only cut air
+
+    A run of moves that removes no material is replaced by a retract to safety_z, a rapid move over its end,
+    a rapid move down to clearance above its end and a plunge at z_feed_rate, if that is faster
+    (estimated with machine).
+
+    Parameters
+    ----------
+    moves : iterable
+        toolpath.Move (or a toolpath.Toolpath)
+    simulator : simulate.Simulator
+        The tool and the stock, updated by the moves
+    safety_z : float
+        Height above the stock
+    z_feed_rate : float
+        Feedrate of the plunges in mm/min
+    machine : estimate.Machine, optional
+        Defaults to estimate.Machine()
+    clearance : float, optional
+        Defaults to CLEARANCE
+
+    Returns
+    -------
+    list
+        toolpath.Move
+
+    """
+    kept = list()
+    run, run_start = list(), None
+    feedrate = None  # in effect before the current move
+    for move in moves:
+        start = tuple(simulator.position)
+        cut = simulator.step(move.kind, move.x, move.y, move.z, move.i, move.j, move.r)
+        if cut or None in start or move.kind in toolpath.CANNED_CYCLES:
+            if run:
+                replaced = _bridge(run, run_start, start, feedrate_before_run, safety_z, z_feed_rate, machine,
+                                   clearance)
+                kept.extend(replaced)
+                if replaced is not run and move.kind != toolpath.RAPID and move.feedrate is None:
+                    move = move._replace(feedrate=feedrate)  # the plunge changed the feedrate in effect
+                run = list()
+            kept.append(move)
+        else:
+            if not run:
+                run_start, feedrate_before_run = start, feedrate
+            run.append(move)
+        if move.feedrate is not None:
+            feedrate = move.feedrate
+    if run:
+        kept.extend(_bridge(run, run_start, tuple(simulator.position), feedrate_before_run, safety_z, z_feed_rate,
+                            machine, clearance))
+    return kept
+
+
+def machine_feature(stock, shape, args, kwargs, moves=None, machine=None, clearance=CLEARANCE):
+    r"""Simulate a feature on the stock, returns its toolpath, only where material remains for REST_SHAPES
+
+    Parameters
+    ----------
+    stock : simulate.Heightmap
+        Updated in place
+    shape : str or function
+        Shape function of pycnc.core
+    args, kwargs
+        Parameters of the shape function
+    moves : toolpath.Toolpath, optional
+        Toolpath of the feature, defaults to the one generated by the shape function
+    machine : estimate.Machine, optional
+        Estimates whether skipping the moves that cut air saves time, defaults to estimate.Machine()
+    clearance : float, optional
+        Defaults to CLEARANCE
+
+    Returns
+    -------
+    toolpath.Toolpath
+
+    """
+    name = getattr(shape, '__name__', shape)
+    if moves is None:
+        moves = core.make_toolpath(name, *args, **kwargs)
+    arguments = cache.call_arguments(name, args, kwargs)
+    if 'tool_diameter' not in arguments:
+        return moves
+    simulator = simulate.Simulator(stock, arguments['tool_diameter'])
+    if name not in REST_SHAPES:
+        simulator.run(moves)
+        return moves
+    return toolpath.Toolpath(rest_moves(moves, simulator, arguments['safety_z'], arguments['z_feed_rate'],
+                                        machine=machine, clearance=clearance))
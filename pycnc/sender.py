@@ -0,0 +1,396 @@
+# coding: utf-8
+
+r"""Streaming of Gcode to GRBL-style controllers
+
+Summary
+-------
+The lines are sent as they are generated (e.g. by the iter_* generators of pycnc.core or by
+Job.iter_gcode()), so the machine starts cutting with the first lines of the program.
+
+The flow control is GRBL's character counting: the controller acknowledges every line with 'ok'
+(or 'error:<code>') once it has taken it out of its receive buffer, and the sender keeps at most
+buffer_size characters unacknowledged, so the buffer never overflows and never runs dry.
+
+The sender runs on an asyncio event loop (Python 3), reading the device (a serial port or a pty)
+when it has data and writing to it when it takes data, in non-blocking mode. FakeController answers like a controller on a pseudo-terminal, for testing.
+
+Notes
+-----
+A not optimized Job generates its features one after the other as they are streamed,
+an optimized Job generates all its features to order them before its first line.
+
+"""
+
+from __future__ import division
+
+import os
+import re
+from collections import deque
+
+try:
+    import asyncio
+except ImportError:  # Python 2
+    asyncio = None
+
+import pycnc.exceptions as exceptions
+
+
+# size of the receive buffer of GRBL (serial.h RX_BUFFER_SIZE)
+GRBL_BUFFER_SIZE = 128
+
+_ERROR = re.compile(r'^(error|ALARM):?(.*)$')
+
+
+def _iter_lines(gcode):
+    r"""Generator of the non empty lines of Gcode (a string or an iterable of strings that may hold several lines),
+    without their trailing white spaces, terminated by a newline
+
+    Examples
+    --------
+    >>> list(_iter_lines(['G21\nG90\n', 'G0 Z10.0 \n', '\n']))
+    ['G21\n', 'G90\n', 'G0 Z10.0\n']
+
+    """
+    if isinstance(gcode, str):
+        gcode = [gcode]
+    for chunk in gcode:
+        for line in chunk.splitlines():
+            line = line.rstrip()
+            if line:
+                yield line + '\n'
+
+
+class CharacterCounting(object):
+    r"""Character counting flow control: what the receive buffer of the controller holds
+
+    Parameters
+    ----------
+    buffer_size : int, optional
+        Size of the receive buffer of the controller, defaults to GRBL_BUFFER_SIZE
+
+    Examples
+    --------
+    >>> flow = CharacterCounting(buffer_size=10)
+    >>> flow.sent('G0 Z10\n')
+    >>> flow.can_send(4), flow.can_send(3)
+    (False, True)
+    >>> flow.acknowledged()
+    7
+    >>> flow.pending
+    0
+
+    """
+    def __init__(self, buffer_size=GRBL_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self.pending = 0
+        self._lengths = deque()
+
+    def can_send(self, length):
+        r"""True if a line of length characters fits in the buffer along the unacknowledged lines"""
+        return self.pending + length <= self.buffer_size
+
+    def sent(self, line):
+        r"""Account for a line sent to the controller"""
+        if len(line) > self.buffer_size:
+            raise exceptions.WrongParameterError('Line longer than the buffer of the controller: %s' % line.strip())
+        self._lengths.append(len(line))
+        self.pending += len(line)
+
+    def acknowledged(self):
+        r"""Account for the acknowledgement of the oldest unacknowledged line, returns its length"""
+        if not self._lengths:
+            raise exceptions.ControllerError('Acknowledgement of a line that was not sent')
+        length = self._lengths.popleft()
+        self.pending -= length
+        return length
+
+    def __len__(self):
+        r"""Number of unacknowledged lines"""
+        return len(self._lengths)
+
+
+class Sender(object):
+    r"""Streams Gcode lines to a controller connected to a file descriptor, with character counting
+
+    Parameters
+    ----------
+    fd : int
+        File descriptor of the device (serial port or pty), open for reading and writing
+    loop : asyncio event loop
+    buffer_size : int, optional
+        Size of the receive buffer of the controller, defaults to GRBL_BUFFER_SIZE
+    stop_on_error : bool, optional
+        Stop sending at the first error reported by the controller, defaults to True.
+        Else the errors are collected in errors.
+    on_message : function, optional
+        Called with the lines of the controller that are not acknowledgements (status reports, messages)
+
+    """
+    def __init__(self, fd, loop, buffer_size=GRBL_BUFFER_SIZE, stop_on_error=True, on_message=None):
+        self.fd = fd
+        self.loop = loop
+        self.flow = CharacterCounting(buffer_size)
+        self.stop_on_error = stop_on_error
+        self.on_message = on_message
+        self.errors = list()
+        self.acknowledged = 0
+        self._lines = None
+        self._next_line = None
+        self._sent = deque()
+        self._received = b''
+        self._unwritten = b''  # sent lines the device has not taken yet
+        self._blocking = None  # mode of the file descriptor before the streaming
+        self._future = None
+
+    def stream(self, gcode):
+        r"""Start streaming Gcode, a string or an iterable of lines that is consumed as the controller takes them
+
+        The file descriptor is in non-blocking mode until the future is done (or cancelled e.g. by asyncio.wait_for).
+
+        Returns
+        -------
+        asyncio.Future
+            Whose result is the number of lines acknowledged by the controller, or whose exception is a
+            ControllerError
+        """
+        if self._future is not None and not self._future.done():
+            raise exceptions.ControllerError('Already streaming')
+        self._lines = _iter_lines(gcode)
+        self._next_line = None
+        self._unwritten = b''
+        self._blocking = os.get_blocking(self.fd)
+        os.set_blocking(self.fd, False)
+        self._future = asyncio.Future(loop=self.loop)
+        self._future.add_done_callback(self.close)
+        self.loop.add_reader(self.fd, self._read)
+        self._send()
+        return self._future
+
+    def close(self, future=None):
+        r"""Stop watching the file descriptor and restore its mode, called when the streaming is done or cancelled"""
+        self.loop.remove_reader(self.fd)
+        self.loop.remove_writer(self.fd)
+        if self._blocking is not None:
+            os.set_blocking(self.fd, self._blocking)
+            self._blocking = None
+
+    def _finish(self, error=None):
+        self.close()
+        if self._future.done():
+            return
+        if error is None:
+            self._future.set_result(self.acknowledged)
+        else:
+            self._future.set_exception(error)
+
+    def _send(self):
+        r"""Send the next lines while they fit in the buffer of the controller"""
+        while True:
+            if self._next_line is None:
+                try:
+                    self._next_line = next(self._lines)
+                except StopIteration:
+                    break
+                except Exception as error:  # generation error: the lines already sent are still acknowledged
+                    self._lines = iter(())
+                    self._finish(error)
+                    return
+                if len(self._next_line) > self.flow.buffer_size:
+                    self._finish(exceptions.WrongParameterError('Line longer than the buffer of the controller: %s'
+                                                                % self._next_line.strip()))
+                    return
+            if not self.flow.can_send(len(self._next_line)):
+                break
+            self._unwritten += self._next_line.encode('ascii')
+            self.flow.sent(self._next_line)
+            self._sent.append(self._next_line)
+            self._next_line = None
+        if self._unwritten:
+            self._write()
+        elif not len(self.flow):
+            self._finish()
+
+    def _write(self):
+        r"""Write what the device takes without blocking, the rest once it is writable"""
+        try:
+            written = os.write(self.fd, self._unwritten)
+        except BlockingIOError:
+            written = 0
+        except OSError as error:
+            self._finish(exceptions.ControllerError('Connection lost: %s' % error))
+            return
+        self._unwritten = self._unwritten[written:]
+        if self._unwritten:
+            self.loop.add_writer(self.fd, self._write)
+        else:
+            self.loop.remove_writer(self.fd)
+
+    def _read(self):
+        try:
+            data = os.read(self.fd, 1024)
+        except BlockingIOError:  # nothing to read after all
+            return
+        except OSError as error:
+            self._finish(exceptions.ControllerError('Connection lost: %s' % error))
+            return
+        if not data:
+            self._finish(exceptions.ControllerError('Connection closed'))
+            return
+        self._received += data
+        responses = self._received.split(b'\n')
+        self._received = responses.pop()
+        for response in responses:
+            response = response.strip().decode('ascii', 'replace')
+            if not response:
+                continue
+            if response == 'ok':
+                if not self._acknowledge():
+                    return
+                continue
+            match = _ERROR.match(response)
+            if match is None:
+                if self.on_message is not None:
+                    self.on_message(response)
+                continue
+            if match.group(1) == 'ALARM':
+                # not the answer to a line: the machine stopped
+                self._finish(exceptions.ControllerError(response))
+                return
+            line = self._sent[0] if self._sent else ''
+            if not self._acknowledge():
+                return
+            self.errors.append((self.acknowledged, line.strip(), response))
+            if self.stop_on_error:
+                self._finish(exceptions.ControllerError('%s on line %i: %s' % (response, self.acknowledged,
+                                                                               line.strip())))
+                return
+        if not self._future.done():
+            self._send()
+
+    def _acknowledge(self):
+        r"""Account for an acknowledgement, returns False if no line was waiting for one"""
+        if not self._sent:
+            self._finish(exceptions.ControllerError('Acknowledgement of a line that was not sent'))
+            return False
+        self._sent.popleft()
+        self.flow.acknowledged()
+        self.acknowledged += 1
+        return True
+
+
+def stream(gcode, device, buffer_size=GRBL_BUFFER_SIZE, timeout=None, stop_on_error=True, loop=None):
+    r"""Stream Gcode to a controller and wait until it has acknowledged every line
+
+    Parameters
+    ----------
+    gcode : str or iterable of str
+        Gcode text, or the lines yielded by one of the iter_* generators or by Job.iter_gcode(),
+        consumed as the controller takes the lines
+    device : str or int
+        Path of the device of the controller, or its file descriptor. A serial port must already be set up
+        (speed, raw mode), e.g. with stty
+    buffer_size : int, optional
+        Size of the receive buffer of the controller, defaults to GRBL_BUFFER_SIZE
+    timeout : float, optional
+        Maximum duration of the streaming in seconds, defaults to None (no limit)
+    stop_on_error : bool, optional
+        Stop sending at the first error reported by the controller, defaults to True
+    loop : asyncio event loop, optional
+        Defaults to a new event loop, closed at the end
+
+    Returns
+    -------
+    int
+        The number of lines acknowledged by the controller
+
+    Raises
+    ------
+    ControllerError
+        If the controller reports an error (and stop_on_error) or an alarm, or if the connection is lost
+
+    """
+    if asyncio is None:
+        raise exceptions.ControllerError('Streaming needs asyncio (Python 3)')
+    fd = os.open(device, os.O_RDWR | os.O_NOCTTY) if isinstance(device, str) else device
+    own_loop = loop is None
+    loop = asyncio.new_event_loop() if own_loop else loop
+    sender = Sender(fd, loop, buffer_size=buffer_size, stop_on_error=stop_on_error)
+    try:
+        future = sender.stream(gcode)
+        return loop.run_until_complete(future if timeout is None else asyncio.wait_for(future, timeout))
+    finally:
+        sender.close()  # the done callback of a cancelled future may not have run yet
+        if isinstance(device, str):
+            os.close(fd)
+        if own_loop:
+            loop.close()
+
+
+class FakeController(object):
+    r"""A GRBL-like controller on a pseudo-terminal, for testing (Unix)
+
+    The controller takes the lines out of its receive buffer one every line_time seconds, and answers 'ok',
+    or 'error:20' (unsupported command) if the line does not start with a G, M or axis word or a $ command
+    (e.g. O-words, that GRBL does not support).
+
+    Parameters
+    ----------
+    loop : asyncio event loop
+        The loop the controller answers on
+    buffer_size : int, optional
+        Size of the receive buffer, defaults to GRBL_BUFFER_SIZE
+    line_time : float, optional
+        Time taken by every line in seconds, defaults to 0.0
+
+    Attributes
+    ----------
+    device : str
+        Path of the pty to stream to
+    lines : list
+        The lines taken out of the buffer, without their newline
+    max_buffered : int
+        Maximum number of characters that were waiting in the buffer
+    overflows : int
+        Number of times the buffer overflowed
+
+    """
+    def __init__(self, loop, buffer_size=GRBL_BUFFER_SIZE, line_time=0.0):
+        import tty
+        self.loop = loop
+        self.buffer_size = buffer_size
+        self.line_time = line_time
+        self.lines = list()
+        self.max_buffered = 0
+        self.overflows = 0
+        self._buffer = b''
+        self._busy = False
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)  # no echo and no line editing
+        self.device = os.ttyname(self._slave)
+        loop.add_reader(self._master, self._read)
+
+    def _read(self):
+        self._buffer += os.read(self._master, 1024)
+        self.max_buffered = max(self.max_buffered, len(self._buffer))
+        if len(self._buffer) > self.buffer_size:
+            self.overflows += 1
+        if not self._busy and b'\n' in self._buffer:
+            self._busy = True
+            self.loop.call_later(self.line_time, self._execute)
+
+    def _execute(self):
+        r"""Take the oldest line out of the buffer and answer it"""
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        line = line.decode('ascii').strip()
+        self.lines.append(line)
+        answer = 'ok' if line[:1].upper() in 'GMXYZFIJS$' else 'error:20'
+        os.write(self._master, (answer + '\r\n').encode('ascii'))
+        if b'\n' in self._buffer:
+            self.loop.call_later(self.line_time, self._execute)
+        else:
+            self._busy = False
+
+    def close(self):
+        self.loop.remove_reader(self._master)
+        os.close(self._master)
+        os.close(self._slave)
@@ -0,0 +1,415 @@
+# coding: utf-8
+
+r"""Material removal simulation
+
+Summary
+-------
+2.5D simulation of a flat endmill on a heightmap (a Z-buffer of the top of the stock).
+Every move sweeps the tool disc along the path: each row of the heightmap crossed by the swept
+area (a capsule for a straight move, chords for arcs) is lowered on one span of cells, so that
+the work is proportional to the area touched, not to the size of the plate.
+
+The simulated surface is compared to a target heightmap to find the remaining stock, the gouges
+(cut below the target floor) and the over-cut regions (cut where no material should be removed).
+
+"""
+
+from __future__ import division
+
+import math
+from array import array
+from collections import namedtuple
+from itertools import repeat
+
+import pycnc.geometry as geometry
+import pycnc.toolpath as toolpath
+import pycnc.exceptions as exceptions
+
+
+Report = namedtuple('Report', ['remaining_cells', 'remaining_volume', 'max_remaining', 'remaining_bounds',
+                               'gouge_cells', 'gouge_volume', 'max_gouge', 'gouge_bounds',
+                               'overcut_cells', 'overcut_volume', 'max_overcut', 'overcut_bounds',
+                               'rapid_collisions'])
+Report.__doc__ = r"""Differences between a simulated surface and a target
+
+Cells counts, volumes in mm3, depths in mm and (x_min, y_min, x_max, y_max) bounds (None if there is no such cell)
+"""
+
+_INFINITY = float('inf')
+
+# the cells are single precision floats: a cell lowered to z may be above z by a rounding error
+_EPSILON = 1e-5
+
+
+def _interval(a, b, low, high):
+    r"""Values of x such that low <= a.x + b <= high, as (x_min, x_max)"""
+    if a == 0.0:
+        return (-_INFINITY, _INFINITY) if low <= b <= high else (_INFINITY, -_INFINITY)
+    x1, x2 = (low - b) / a, (high - b) / a
+    return (x1, x2) if x1 <= x2 else (x2, x1)
+
+
+def capsule_span(x0, y0, x1, y1, radius, y):
+    r"""Intersection of the horizontal line at y with the area swept by a disc moving from (x0, y0) to (x1, y1)
+
+    Returns
+    -------
+    (x_min, x_max), empty if x_min > x_max
+
+    Examples
+    --------
+    >>> capsule_span(0.0, 0.0, 10.0, 0.0, 1.0, 0.0)
+    (-1.0, 11.0)
+    >>> [round(x, 9) for x in capsule_span(0.0, 0.0, 10.0, 10.0, 1.0, 5.0)] == [round(5.0 - math.sqrt(2.0), 9),
+    ...                                                                       round(5.0 + math.sqrt(2.0), 9)]
+    True
+
+    """
+    low, high = _INFINITY, -_INFINITY
+    for x_center, y_center in ((x0, y0), (x1, y1)):
+        dy = y - y_center
+        if -radius <= dy <= radius:
+            half = math.sqrt(radius * radius - dy * dy)
+            low, high = min(low, x_center - half), max(high, x_center + half)
+    length = math.hypot(x1 - x0, y1 - y0)
+    if length > 0.0:
+        ux, uy = (x1 - x0) / length, (y1 - y0) / length
+        # along the segment: 0 <= (x - x0).ux + (y - y0).uy <= length, across: |(y - y0).ux - (x - x0).uy| <= radius
+        along = _interval(ux, (y - y0) * uy - x0 * ux, 0.0, length)
+        across = _interval(-uy, (y - y0) * ux + x0 * uy, -radius, radius)
+        strip_low, strip_high = max(along[0], across[0]), min(along[1], across[1])
+        if strip_low <= strip_high:
+            low, high = min(low, strip_low), max(high, strip_high)
+    return low, high
+
+
+class Heightmap(object):
+    r"""Top of the stock sampled on a regular grid (one float per cell, stored row by row)
+
+    Parameters
+    ----------
+    x_min, y_min, x_max, y_max : float
+        Area of the stock
+    resolution : float, optional
+        Size of the cells in mm, defaults to 0.1
+    top : float, optional
+        Initial height of the stock, defaults to 0.0
+
+    Examples
+    --------
+    >>> heightmap = Heightmap(0.0, 0.0, 10.0, 10.0, resolution=1.0)
+    >>> heightmap.lower_capsule(2.0, 5.0, 8.0, 5.0, 1.0, -1.0)
+    True
+    >>> heightmap.lower_capsule(2.0, 5.0, 8.0, 5.0, 1.0, -0.5)
+    False
+    >>> heightmap.height(5.0, 5.0), heightmap.height(5.0, 8.0)
+    (-1.0, 0.0)
+    >>> heightmap.removed_volume()
+    16.0
+
+    """
+    def __init__(self, x_min, y_min, x_max, y_max, resolution=0.1, top=0.0):
+        if x_max <= x_min or y_max <= y_min or resolution <= 0.0:
+            raise exceptions.WrongParameterError('Empty heightmap')
+        self.x_min = x_min
+        self.y_min = y_min
+        self.resolution = resolution
+        self.top = top
+        self.nx = int(math.ceil((x_max - x_min) / resolution - 1e-9))
+        self.ny = int(math.ceil((y_max - y_min) / resolution - 1e-9))
+        row = array('f', [top]) * self.nx
+        self.rows = [array('f', row) for _ in range(self.ny)]
+
+    @classmethod
+    def around(cls, moves, tool_diameter, resolution=0.1, top=0.0, margin=1.0):
+        r"""Heightmap covering the area reached by a toolpath (a toolpath.Toolpath or a list of moves)"""
+        if not isinstance(moves, toolpath.Toolpath):
+            moves = toolpath.Toolpath(moves)
+        xs = [x for x in moves.x if x == x]
+        ys = [y for y in moves.y if y == y]
+        if not xs or not ys:
+            raise exceptions.WrongParameterError('The toolpath does not move in X and Y')
+        radii = [math.hypot(i if i == i else 0.0, j if j == j else 0.0) for i, j in zip(moves.i, moves.j)]
+        extra = 2.0 * max(radii + [0.0]) + tool_diameter / 2.0 + margin
+        return cls(min(xs) - extra, min(ys) - extra, max(xs) + extra, max(ys) + extra, resolution=resolution, top=top)
+
+    def copy(self):
+        r"""Returns an independent copy of the heightmap"""
+        heightmap = Heightmap.__new__(Heightmap)
+        heightmap.__dict__.update(self.__dict__)
+        heightmap.rows = [array('f', row) for row in self.rows]
+        return heightmap
+
+    def same_grid(self, other):
+        r"""True if other has the same cells"""
+        return (self.x_min, self.y_min, self.resolution, self.nx, self.ny) == (other.x_min, other.y_min,
+                                                                              other.resolution, other.nx, other.ny)
+
+    def height(self, x, y):
+        r"""Height of the stock at (x, y)"""
+        column = int((x - self.x_min) / self.resolution)
+        row = int((y - self.y_min) / self.resolution)
+        if not (0 <= column < self.nx and 0 <= row < self.ny):
+            raise exceptions.WrongParameterError('(%s, %s) is out of the heightmap' % (x, y))
+        return self.rows[row][column]
+
+    def removed_volume(self):
+        r"""Volume removed from the initial stock, in mm3"""
+        top, nx = self.top, self.nx
+        return (top * nx * self.ny - sum(math.fsum(row) for row in self.rows)) * self.resolution ** 2
+
+    def _lower_span(self, row, x_low, x_high, z):
+        r"""Lower the cells of a row whose centers are in [x_low, x_high] to z, returns True if one was above z"""
+        resolution = self.resolution
+        first = max(0, int(math.ceil((x_low - self.x_min) / resolution - 0.5)))
+        last = min(self.nx - 1, int(math.floor((x_high - self.x_min) / resolution - 0.5)))
+        if first > last:
+            return False
+        cells = self.rows[row]
+        span = cells[first:last + 1]
+        if max(span) <= z + _EPSILON:
+            return False
+        if min(span) >= z:
+            # the whole span is above z (e.g. uncut stock), no need to compare cell by cell
+            cells[first:last + 1] = array('f', [z]) * (last + 1 - first)
+        else:
+            cells[first:last + 1] = array('f', map(min, span, repeat(z)))
+        return True
+
+    def lower_capsule(self, x0, y0, x1, y1, radius, z):
+        r"""Lower the stock to z under a disc of radius moving from (x0, y0) to (x1, y1), returns True if cut
+
+        The cells are sampled at their centers.
+        """
+        resolution, y_min = self.resolution, self.y_min
+        first = max(0, int(math.ceil((min(y0, y1) - radius - y_min) / resolution - 0.5)))
+        last = min(self.ny - 1, int(math.floor((max(y0, y1) + radius - y_min) / resolution - 0.5)))
+        cut = False
+        for row in range(first, last + 1):
+            low, high = capsule_span(x0, y0, x1, y1, radius, y_min + (row + 0.5) * resolution)
+            if low <= high and self._lower_span(row, low, high, z):
+                cut = True
+        return cut
+
+    def lower_disc(self, x, y, radius, z):
+        r"""Lower the stock to z in a disc, returns True if cut"""
+        return self.lower_capsule(x, y, x, y, radius, z)
+
+    def lower_rectangle(self, x_min, y_min, x_max, y_max, z):
+        r"""Lower the stock to z in a rectangle (e.g. to build a target), returns True if cut"""
+        resolution = self.resolution
+        first = max(0, int(math.ceil((y_min - self.y_min) / resolution - 0.5)))
+        last = min(self.ny - 1, int(math.floor((y_max - self.y_min) / resolution - 0.5)))
+        cut = False
+        for row in range(first, last + 1):
+            if self._lower_span(row, x_min, x_max, z):
+                cut = True
+        return cut
+
+
+class Simulator(object):
+    r"""Sweeps a flat endmill along toolpaths on a heightmap
+
+    Parameters
+    ----------
+    heightmap : Heightmap
+        The stock, modified in place
+    tool_diameter : float
+    z_tolerance : float, optional
+        Maximum altitude change of the pieces a plunging or helical move is split into, defaults to 0.01
+    chord_tolerance : float, optional
+        Maximum distance between an arc and its chords, defaults to a quarter of the resolution
+
+    Attributes
+    ----------
+    rapid_collisions : list
+        (move index, x, y, z) of the rapid moves (including those of the canned cycles) that removed material
+
+    Examples
+    --------
+    >>> import pycnc.core
+    >>> heightmap = Heightmap(-10.0, -10.0, 10.0, 10.0, resolution=0.25)
+    >>> simulator = Simulator(heightmap, 3.0)
+    >>> simulator.run(pycnc.core.make_toolpath('full_hole', 0.0, 0.0, 12.0, 3.0, 640.0, 200.0, 0.0, -1.0, -1.0, 5.0))
+    >>> heightmap.height(0.0, 0.0), heightmap.height(5.8, 0.0), heightmap.height(6.2, 0.0)
+    (-1.0, -1.0, 0.0)
+    >>> simulator.rapid_collisions
+    []
+
+    """
+    def __init__(self, heightmap, tool_diameter, z_tolerance=0.01, chord_tolerance=None):
+        self.heightmap = heightmap
+        self.radius = tool_diameter / 2.0
+        self.z_tolerance = z_tolerance
+        self.chord_tolerance = chord_tolerance if chord_tolerance is not None else heightmap.resolution / 4.0
+        self.position = [None, None, None]
+        self.rapid_collisions = list()
+        self.moves = 0
+        self._cycle = {'z': None, 'r': None, 'initial_z': None}
+        self._in_cycle = False
+
+    def run(self, moves):
+        r"""Simulate moves (a toolpath.Toolpath or an iterable of toolpath.Move), continuing from the last position"""
+        if isinstance(moves, toolpath.Toolpath):
+            moves = zip(moves.kind, moves.x, moves.y, moves.z, moves.i, moves.j, moves.r, moves.q, moves.feedrate)
+        step = self.step
+        for kind, x, y, z, i, j, r, _, _ in moves:
+            step(kind, x, y, z, i, j, r)
+
+    def step(self, kind, x=None, y=None, z=None, i=None, j=None, r=None):
+        r"""Simulate one move from the current position, returns True if it removed material"""
+        self.moves += 1
+        if kind in toolpath.CANNED_CYCLES:
+            return self._canned_cycle(x, y, z, r)
+        self._in_cycle = False
+        position = self.position
+        start = list(position)
+        # None (parsed moves) and NaN (toolpath arrays) are undefined words
+        if x is not None and x == x:
+            position[0] = x
+        if y is not None and y == y:
+            position[1] = y
+        if z is not None and z == z:
+            position[2] = z
+        if None in start or None in position:
+            return False
+        if kind == toolpath.RAPID:
+            return self._rapid(start, position)
+        if kind == toolpath.LINEAR:
+            return self._sweep(start, position)
+        i = 0.0 if i is None or i != i else i
+        j = 0.0 if j is None or j != j else j
+        return self._arc(start, position, i, j, kind == toolpath.ARC_CW)
+
+    def _sweep(self, start, end):
+        r"""Straight move, split in pieces of at most z_tolerance, returns True if cut"""
+        x0, y0, z0 = start
+        x1, y1, z1 = end
+        pieces = 1
+        if (x0, y0) != (x1, y1) and z0 != z1:
+            pieces = max(1, int(math.ceil(abs(z1 - z0) / self.z_tolerance)))
+        lower_capsule, radius = self.heightmap.lower_capsule, self.radius
+        cut = False
+        for piece in range(pieces):
+            xa, ya, za = [a + (b - a) * piece / pieces for a, b in zip(start, end)]
+            xb, yb, zb = [a + (b - a) * (piece + 1) / pieces for a, b in zip(start, end)]
+            # the tool is at least at the highest end of the piece all along it
+            cut = lower_capsule(xa, ya, xb, yb, radius, max(za, zb)) or cut
+        return self.heightmap.lower_disc(x1, y1, radius, z1) or cut
+
+    def _rapid(self, start, end):
+        if self._sweep(start, end):
+            self.rapid_collisions.append((self.moves - 1, end[0], end[1], end[2]))
+            return True
+        return False
+
+    def _arc(self, start, end, i, j, clockwise):
+        x0, y0, z0 = start
+        x_center, y_center = x0 + i, y0 + j
+        radius = math.hypot(i, j)
+        sweep = geometry.arc_sweep(x0, y0, end[0], end[1], i, j, clockwise)
+        pieces = 1
+        if radius > self.chord_tolerance:
+            pieces = int(math.ceil(sweep / (2.0 * math.acos(1.0 - self.chord_tolerance / radius))))
+        pieces = max(pieces, int(math.ceil(abs(end[2] - z0) / self.z_tolerance)), 1)
+        start_angle = math.atan2(y0 - y_center, x0 - x_center)
+        direction = -1.0 if clockwise else 1.0
+        previous = start
+        cut = False
+        for piece in range(1, pieces + 1):
+            if piece == pieces:
+                point = end
+            else:
+                angle = start_angle + direction * sweep * piece / pieces
+                point = [x_center + radius * math.cos(angle), y_center + radius * math.sin(angle),
+                         z0 + (end[2] - z0) * piece / pieces]
+            cut = self.heightmap.lower_capsule(previous[0], previous[1], point[0], point[1], self.radius,
+                                               max(previous[2], point[2])) or cut
+            previous = point
+        return self.heightmap.lower_disc(end[0], end[1], self.radius, end[2]) or cut
+
+    def _canned_cycle(self, x, y, z, r):
+        r"""Drilling cycle (G98 retract): rapid over the hole, rapid to R, feed to Z, rapid back up"""
+        cycle, position = self._cycle, self.position
+        if not self._in_cycle:
+            cycle['initial_z'] = position[2]
+            self._in_cycle = True
+        if z is not None and z == z:
+            cycle['z'] = z
+        if r is not None and r == r:
+            cycle['r'] = r
+        if cycle['z'] is None or cycle['r'] is None:
+            raise exceptions.WrongParameterError('Canned cycle without Z or R')
+        start = list(position)
+        if x is not None and x == x:
+            position[0] = x
+        if y is not None and y == y:
+            position[1] = y
+        if None in position[:2]:
+            return False
+        if start[2] is None:
+            start[2] = cycle['r']
+        cut = False
+        if None not in start:
+            cut = self._rapid(start, [position[0], position[1], start[2]])
+        cut = self._rapid([position[0], position[1], start[2]], [position[0], position[1], cycle['r']]) or cut
+        cut = self.heightmap.lower_disc(position[0], position[1], self.radius, cycle['z']) or cut
+        position[2] = cycle['r'] if cycle['initial_z'] is None else max(cycle['initial_z'], cycle['r'])
+        return cut
+
+    def report(self, target, tolerance=0.01):
+        r"""Compare the simulated surface to a target heightmap on the same grid
+
+        Cells higher than the target by more than tolerance are remaining stock.
+        Cells lower than the target by more than tolerance are gouges where the target is cut
+        (below the top of the stock), over-cuts where it is not.
+
+        Returns
+        -------
+        Report
+
+        """
+        heightmap = self.heightmap
+        if not heightmap.same_grid(target):
+            raise exceptions.WrongParameterError('The target is not on the grid of the simulation')
+        resolution, top = heightmap.resolution, heightmap.top
+        counts = {'remaining': [0, 0.0, 0.0, None], 'gouge': [0, 0.0, 0.0, None], 'overcut': [0, 0.0, 0.0, None]}
+        for row_index, (row, target_row) in enumerate(zip(heightmap.rows, target.rows)):
+            if row == target_row:
+                continue
+            y = heightmap.y_min + (row_index + 0.5) * resolution
+            for column, (height, expected) in enumerate(zip(row, target_row)):
+                difference = height - expected
+                if difference > tolerance:
+                    name = 'remaining'
+                elif difference < -tolerance:
+                    name = 'gouge' if expected < top else 'overcut'
+                    difference = -difference
+                else:
+                    continue
+                count = counts[name]
+                count[0] += 1
+                count[1] += difference
+                count[2] = max(count[2], difference)
+                x = heightmap.x_min + (column + 0.5) * resolution
+                bounds = count[3]
+                count[3] = (x, y, x, y) if bounds is None else (min(bounds[0], x), bounds[1], max(bounds[2], x), y)
+        values = list()
+        for name in ('remaining', 'gouge', 'overcut'):
+            cells, volume, maximum, bounds = counts[name]
+            values += [cells, volume * resolution ** 2, maximum, bounds]
+        return Report(*(values + [len(self.rapid_collisions)]))
+
+
+def simulate(moves, tool_diameter, resolution=0.1, top=0.0, heightmap=None):
+    r"""Returns the Simulator of moves (a toolpath.Toolpath or a list of moves) on a heightmap
+
+    The heightmap defaults to one covering the toolpath (see Heightmap.around)
+    """
+    if not isinstance(moves, toolpath.Toolpath):
+        moves = toolpath.Toolpath(moves)
+    if heightmap is None:
+        heightmap = Heightmap.around(moves, tool_diameter, resolution=resolution, top=top)
+    simulator = Simulator(heightmap, tool_diameter)
+    simulator.run(moves)
+    return simulator
@@ -0,0 +1,354 @@
+# coding: utf-8
+
+r"""LinuxCNC O-word subroutines and loops
+
+Summary
+-------
+Compact output of the moves of a program, for controllers that run LinuxCNC O-codes:
+the layers of a shape (the same moves cut at every depth) become one subroutine whose Z is
+its parameter #1, called in a while loop, and the features repeated at several positions
+become one subroutine whose X and Y words are offset by its parameters #1 and #2.
+
+http://linuxcnc.org/docs/html/gcode/o-code.html
+
+Examples
+--------
+>>> import pycnc.core as core
+>>> gcode = to_gcode(core.make_toolpath('rectangle', 20.0, 10.0, 0.0, 0.0, 3.0, 640.0, 200.0, 0.0, -3.0, -0.5, 10.0))
+>>> for line in gcode.splitlines():
+...     print(line.strip())
+o100 sub
+G1 Z#1 F200.0
+G1 X21.5 F640.0
+G1 Y11.5 F640.0
+G1 X-1.5 F640.0
+G1 Y-1.5 F640.0
+o100 endsub
+G0 X0.0 Y0.0 Z10.0
+G0 X-1.5 Y-1.5
+#<layer> = 0
+o101 while [#<layer> LT 7]
+o100 call [0.0 - #<layer> * 0.5]
+#<layer> = [#<layer> + 1]
+o101 endwhile
+G1 Z10.0 F640.0
+
+"""
+
+from __future__ import division
+
+from collections import namedtuple
+
+import pycnc.gcodes as gcodes
+import pycnc.toolpath as toolpath
+
+
+Layers = namedtuple('Layers', ['start', 'length', 'heights'])
+Layers.__doc__ = r"""Blocks of moves[start:start + length * len(heights)], the same moves at each of the heights"""
+
+# lines of the subroutine and of the loop that replace the layers
+_OVERHEAD = 7
+
+# number of candidate block lengths checked by find_layers
+_CANDIDATES = 3
+
+
+def _key(move):
+    r"""The words of a move but its Z value"""
+    kind, x, y, z, i, j, r, q, feedrate = move
+    return kind, x, y, z is None, i, j, r, q, feedrate
+
+
+def _layers(moves, first, last, length):
+    r"""Layers of moves[first:last], which repeat with the given period except for their Z values, or None
+
+    The altitude only changes at the same place in every block, and every block has at least one Z word.
+    """
+    change = None
+    current = None
+    for index in range(first, last):
+        z = moves[index].z
+        if z is None:
+            continue
+        if current is not None and z != current:
+            if change is None:
+                change = index
+            elif (index - change) % length:
+                return None
+        current = z
+    if change is None:
+        return None
+    # the blocks may start before the change of altitude, with the moves that have no Z word
+    start, count = None, 0
+    for back in range(length):
+        if back and (change - back < first or moves[change - back].z is not None):
+            break
+        block = first + (change - back - first) % length
+        if (last - block) // length > count:
+            start, count = block, (last - block) // length
+    if count < 2:
+        return None
+    heights = list()
+    for block in range(start, start + count * length, length):
+        for index in range(block, block + length):
+            z = moves[index].z
+            if z is not None:
+                heights.append(z)
+                break
+        else:
+            return None
+    return Layers(start, length, heights)
+
+
+def find_layers(moves, start=0, end=None):
+    r"""Find the layers of a sequence of moves that save the most lines when written as a subroutine
+
+    Parameters
+    ----------
+    moves : list
+        toolpath.Move
+    start, end : int, optional
+        Range of the moves to search, defaults to all the moves
+
+    Returns
+    -------
+    Layers
+        Or None if no moves are repeated at several heights
+
+    Examples
+    --------
+    >>> square = [toolpath.g1_move(x=x, y=y) for x, y in ((1.0, 0.0), (1.0, 1.0), (0.0, 1.0), (0.0, 0.0))]
+    >>> moves = [toolpath.g0_move(z=5.0)]
+    >>> for h in (-1.0, -2.0, -3.0):
+    ...     moves += [toolpath.g1_move(z=h)] + square
+    >>> find_layers(moves)
+    Layers(start=1, length=5, heights=[-1.0, -2.0, -3.0])
+
+    """
+    end = len(moves) if end is None else end
+    keys = [_key(move) for move in moves[start:end]]
+    # distances between the repeats of the moves: the block lengths to try
+    last_seen = dict()
+    periods = dict()
+    for index, key in enumerate(keys):
+        previous = last_seen.get(key)
+        if previous is not None:
+            periods[index - previous] = periods.get(index - previous, 0) + 1
+        last_seen[key] = index
+    candidates = sorted(periods, key=lambda period: -periods[period])[:_CANDIDATES]
+    best, best_saving = None, 0
+    for length in candidates:
+        if periods[length] < length:
+            continue  # not even one whole block repeated
+        index = 0
+        while index < len(keys) - length:
+            if keys[index] != keys[index + length]:
+                index += 1
+                continue
+            first = index
+            while index < len(keys) - length and keys[index] == keys[index + length]:
+                index += 1
+            layers = _layers(moves, start + first, start + index + length, length)
+            if layers is not None:
+                saving = (len(layers.heights) - 1) * length - _OVERHEAD
+                if saving > best_saving:
+                    best, best_saving = layers, saving
+    return best
+
+
+def _split(moves, start, end):
+    r"""moves[start:end] as a list of (start, end) ranges of moves written as they are, and of Layers"""
+    layers = find_layers(moves, start, end)
+    if layers is None:
+        return [(start, end)] if end > start else []
+    layers_end = layers.start + layers.length * len(layers.heights)
+    return _split(moves, start, layers.start) + [layers] + _split(moves, layers_end, end)
+
+
+def _number(letter, value):
+    r"""A value formatted as the word letter, without the letter"""
+    return gcodes.get_formatter().word(letter, value)[1:-1]
+
+
+def _offset_word(letter, parameter, value):
+    r"""Word of a value offset by a parameter, e.g. 'X[#1+12.5] '"""
+    number = _number(letter, value)
+    if number.startswith('-'):
+        return '%s[#%i-%s] ' % (letter, parameter, number[1:])
+    return '%s[#%i+%s] ' % (letter, parameter, number)
+
+
+def _line(move, z_parameter=None, origin=None, x_parameter=1):
+    r"""Gcode line of a move whose Z word is a parameter and/or whose X and Y words are offset by parameters
+
+    The X words are offset by the parameter x_parameter, the Y words by the next one.
+    """
+    kind, x, y, z, i, j, r, q, feedrate = move
+    if z_parameter is None and origin is None:
+        return ''.join(toolpath.iter_gcode([move]))
+    formatter = gcodes.get_formatter()
+    if z is None and r is None and kind in toolpath.CANNED_CYCLES:
+        line = ''  # repeat of the cycle in effect
+    else:
+        line = toolpath.PREFIXES[kind] + ' '
+    if x is not None:
+        line += formatter.word('X', x) if origin is None else _offset_word('X', x_parameter, x - origin[0])
+    if y is not None:
+        line += formatter.word('Y', y) if origin is None else _offset_word('Y', x_parameter + 1, y - origin[1])
+    if z is not None:
+        line += formatter.word('Z', z) if z_parameter is None else 'Z#%i ' % z_parameter
+    for letter, value in zip('IJRQF', (i, j, r, q, feedrate)):
+        if value is not None:
+            line += formatter.word(letter, value)
+    return line + '\n'
+
+
+def _arithmetic_run(heights, first):
+    r"""Number of heights from heights[first] that the loop of its formatted start and step computes, and the texts"""
+    if first + 2 >= len(heights):
+        return 1, None, None
+    start, step = _number('Z', heights[first]), _number('Z', abs(heights[first + 1] - heights[first]))
+    sign = -1.0 if heights[first + 1] < heights[first] else 1.0
+    count = 1
+    while first + count < len(heights):
+        expected = float(start) + sign * count * float(step)
+        if abs(expected - float(_number('Z', heights[first + count]))) > 1e-9:
+            break
+        count += 1
+    return count, start, ('-' if sign < 0.0 else '+') + ' #<layer> * ' + step
+
+
+class Program(object):
+    r"""A Gcode program whose repeated parts are written as LinuxCNC O-word subroutines
+
+    The subroutines are defined at the start of the program, before the lines that call them.
+
+    Parameters
+    ----------
+    number : int, optional
+        Number of the first O-word, defaults to 100
+
+    Examples
+    --------
+    >>> program = Program()
+    >>> for x in (10.0, 30.0):
+    ...     program.add_instance('drill', [toolpath.g81_move(x=x, y=5.0, z=-4.0, r=10.0, feedrate=200.0)], x, 5.0)
+    >>> for line in program.iter_gcode():
+    ...     print(line.strip())
+    o100 sub
+    G81 G98 X[#1+0.0] Y[#2+0.0] Z-4.0 R10.0 F200.0
+    o100 endsub
+    o100 call [10.0] [5.0]
+    o100 call [30.0] [5.0]
+
+    """
+    def __init__(self, number=100):
+        self.number = number
+        self.definitions = list()
+        self.lines = list()
+        self._instances = dict()
+
+    def _next_number(self):
+        number = self.number
+        self.number += 1
+        return number
+
+    def add(self, moves):
+        r"""Add moves to the program, their layers written as a subroutine called in a loop"""
+        self.lines.extend(self._body(list(moves)))
+
+    def add_instance(self, key, moves, x, y):
+        r"""Add a feature that is repeated at several positions
+
+        The first instance of a key defines a subroutine whose X and Y words are relative to its position,
+        every instance calls it with its own position.
+
+        Parameters
+        ----------
+        key : hashable
+            Identifies the features that are translations of one another (e.g. cache.feature_key)
+        moves : iterable
+            toolpath.Move of the feature
+        x, y : float
+            Position of the feature, that the X and Y words of the moves are relative to
+        """
+        if key not in self._instances:
+            number = self._next_number()
+            self._instances[key] = number
+            body = self._body(list(moves), origin=(x, y))
+            self.definitions.extend(['o%i sub\n' % number] + body + ['o%i endsub\n' % number])
+        self.lines.append('o%i call [%s] [%s]\n' % (self._instances[key], _number('X', x), _number('Y', y)))
+
+    def _body(self, moves, origin=None):
+        r"""Lines of moves, the layers defining a subroutine, the X and Y words offset by #1 and #2 if origin"""
+        lines = list()
+        for item in _split(moves, 0, len(moves)):
+            if isinstance(item, Layers):
+                lines.extend(self._layers(moves, item, origin))
+            elif origin is None:
+                lines.extend(toolpath.iter_gcode(moves[item[0]:item[1]]))
+            else:
+                lines.extend(_line(move, origin=origin) for move in moves[item[0]:item[1]])
+        return lines
+
+    def _layers(self, moves, layers, origin):
+        r"""Define the subroutine of layers, returns the lines that call it"""
+        number = self._next_number()
+        block = moves[layers.start:layers.start + layers.length]
+        if origin is None:
+            body = [_line(move, z_parameter=1) for move in block]
+            arguments = ''
+        else:
+            # #1 is Z, the offsets of the feature are passed on as #2 and #3
+            body = [_line(move, z_parameter=1, origin=origin, x_parameter=2) for move in block]
+            arguments = ' [#1] [#2]'
+        self.definitions.extend(['o%i sub\n' % number] + body + ['o%i endsub\n' % number])
+        lines = list()
+        index = 0
+        heights = layers.heights
+        while index < len(heights):
+            count, start, step = _arithmetic_run(heights, index)
+            if count < 3:
+                lines.append('o%i call [%s]%s\n' % (number, _number('Z', heights[index]), arguments))
+                index += 1
+                continue
+            loop = self._next_number()
+            lines.extend(['#<layer> = 0\n',
+                          'o%i while [#<layer> LT %i]\n' % (loop, count),
+                          'o%i call [%s %s]%s\n' % (number, start, step, arguments),
+                          '#<layer> = [#<layer> + 1]\n',
+                          'o%i endwhile\n' % loop])
+            index += count
+        return lines
+
+    def iter_gcode(self):
+        r"""Generator of the Gcode lines of the program: the subroutine definitions, then the main program"""
+        for line in self.definitions:
+            yield line
+        for line in self.lines:
+            yield line
+
+    def to_gcode(self):
+        r"""Returns the Gcode of the program as a string"""
+        return ''.join(self.iter_gcode())
+
+
+def iter_gcode(moves, number=100):
+    r"""Generator of the Gcode lines of a sequence of moves, their layers written as a subroutine called in a loop
+
+    Parameters
+    ----------
+    moves : iterable
+        toolpath.Move, e.g. a toolpath.Toolpath or core.make_toolpath(shape, ...)
+    number : int, optional
+        Number of the first O-word, defaults to 100
+
+    """
+    program = Program(number)
+    program.add(moves)
+    return program.iter_gcode()
+
+
+def to_gcode(moves, number=100):
+    r"""Returns the Gcode of a sequence of moves as a string, see iter_gcode"""
+    return ''.join(iter_gcode(moves, number))
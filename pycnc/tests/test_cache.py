@@ -0,0 +1,131 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import math
+import shutil
+import tempfile
+import unittest
+
+import pycnc.cache
+import pycnc.core
+import pycnc.exceptions
+import pycnc.job
+
+
+FEATURES = [('oval', (1.0, 2.0, 30.0, 10.0, 3.0, 640.0, 200.0, 0.0, -2.0, -0.5, 10.0), {'angle': 30.0}),
+            ('square_pocket', (0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -1.5, -1.0, 10.0), {}),
+            ('rectangle_rounded_corners', (0.0, 0.0, 50.0, 50.0, 3.0, 6.0, 640.0, 200.0, 0.0, -3.0, -1.0, 10.0), {}),
+            ('rectangle', (20.0, 10.0, 1.0, 2.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.3, 10.0), {}),
+            ('thin', (30.0, 20.0, 5.0, 5.0, 6.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0), {}),
+            ('thin_from_center', (30.0, 20.0, 5.0, 5.0, 6.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0), {}),
+            ('full_hole', (1.0, 1.0, 20.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.3, 10.0), {}),
+            ('two_concentric_holes', (0.0, 0.0, 20.0, 10.0, 3.0, 640.0, 200.0, 0.0, -1.0, -2.0, -0.5, 10.0), {}),
+            ('drill_g83', (1.0, 2.0, -4.0, 1.0, 10.0, 200.0), {})]
+
+
+def _moved(shape, args, dx, dy):
+    r"""Parameters of the same feature translated by dx, dy"""
+    x_parameter, y_parameter, _ = pycnc.cache.TRANSLATIONS[shape]
+    arguments = pycnc.cache.call_arguments(shape, args, {})
+    arguments[x_parameter] += dx
+    arguments[y_parameter] += dy
+    return arguments
+
+
+class TestFeatureCache(unittest.TestCase):
+    def assertSameToolpath(self, tp1, tp2):
+        self.assertEqual(list(tp1.kind), list(tp2.kind))
+        for name in tp1.columns:
+            for a, b in zip(tp1.column(name), tp2.column(name)):
+                if math.isnan(a):
+                    self.assertTrue(math.isnan(b))
+                else:
+                    self.assertAlmostEqual(a, b, places=9)
+
+    def test_translated_hits(self):
+        cache = pycnc.cache.FeatureCache()
+        for shape, args, kwargs in FEATURES:
+            cache.toolpath(shape, *args, **kwargs)
+            arguments = _moved(shape, args, 12.5, -7.25)
+            arguments.update(kwargs)
+            self.assertSameToolpath(cache.toolpath(shape, **arguments), pycnc.core.make_toolpath(shape, **arguments))
+        self.assertEqual((cache.hits, cache.misses, cache.translated_hits), (len(FEATURES), len(FEATURES),
+                                                                             len(FEATURES)))
+
+    def test_exact_hit_is_a_copy(self):
+        cache = pycnc.cache.FeatureCache()
+        tp = cache.toolpath('drill', 1.0, 2.0, -4.0, 10.0, 200.0)
+        tp.translate(5.0, 5.0)
+        self.assertEqual(cache.toolpath('drill', 1, 2, -4, 10, 200).to_gcode(), pycnc.core.drill(1.0, 2.0, -4.0, 10.0,
+                                                                                                  200.0))
+        self.assertEqual(cache.statistics()['hit_rate'], 0.5)
+
+    def test_eviction(self):
+        cache = pycnc.cache.FeatureCache(max_entries=2)
+        for depth in (-1.0, -2.0, -3.0):
+            cache.toolpath('drill', 0.0, 0.0, depth, 10.0, 200.0)
+        self.assertEqual((len(cache), cache.evictions), (2, 1))
+        cache = pycnc.cache.FeatureCache(max_bytes=1000)
+        cache.toolpath('full_hole', 1.0, 1.0, 20.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.3, 10.0)
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+    def test_disk_tier(self):
+        directory = tempfile.mkdtemp()
+        try:
+            args = (1.0, 1.0, 20.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.3, 10.0)
+            pycnc.cache.FeatureCache(directory=directory).toolpath('full_hole', *args)
+            cache = pycnc.cache.FeatureCache(directory=directory)
+            self.assertEqual(cache.toolpath('full_hole', *args).to_gcode(),
+                             pycnc.core.make_toolpath('full_hole', *args).to_gcode())
+            self.assertEqual((cache.hits, cache.disk_hits, cache.misses), (1, 1, 0))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_disk_tier_of_another_version(self):
+        directory = tempfile.mkdtemp()
+        args = (1.0, 1.0, 20.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.3, 10.0)
+        version = pycnc.cache._version
+        try:
+            pycnc.cache._version = '0.9'
+            pycnc.cache.FeatureCache(directory=directory).toolpath('full_hole', *args)
+            pycnc.cache._version = version
+            cache = pycnc.cache.FeatureCache(directory=directory)
+            cache.toolpath('full_hole', *args)
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+        finally:
+            pycnc.cache._version = version
+            shutil.rmtree(directory)
+
+    def test_unreadable_disk_entry(self):
+        directory = tempfile.mkdtemp()
+        try:
+            cache = pycnc.cache.FeatureCache(directory=directory)
+            key, _ = pycnc.cache.feature_key('drill', (1.0, 2.0, -4.0, 10.0, 200.0), {})
+            # pickled by a version whose classes moved
+            with open(cache._path(key), 'wb') as f:
+                f.write(b'cpycnc.toolpath\nRemovedToolpath\n.')
+            self.assertEqual(cache.toolpath('drill', 1.0, 2.0, -4.0, 10.0, 200.0).to_gcode(),
+                             pycnc.core.drill(1.0, 2.0, -4.0, 10.0, 200.0))
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_wrong_parameters(self):
+        self.assertRaises(pycnc.exceptions.WrongParameterError, pycnc.cache.FeatureCache().toolpath, 'drill', 1.0)
+
+    def test_job(self):
+        cache = pycnc.cache.FeatureCache()
+        for workers in (1, 2):
+            job = pycnc.job.Job(cache=cache, workers=workers)
+            reference = pycnc.job.Job()
+            for x in (0.0, 10.0, 20.0):
+                for y in (0.0, 10.0):
+                    job.add('full_hole', x, y, 8.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0)
+                    reference.add('full_hole', x, y, 8.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0)
+            self.assertEqual(job.ordered_features(), reference.ordered_features())
+            self.assertEqual(len(job.to_gcode().splitlines()), len(reference.to_gcode().splitlines()))
+        self.assertEqual((cache.misses, cache.hits), (1, 11))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,250 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import unittest
+
+import pycnc.core
+import pycnc.estimate
+import pycnc.gcodes
+import pycnc.parser
+import pycnc.simulate
+import pycnc.toolpath
+import pycnc.exceptions
+
+
+class TestLayerHeights(unittest.TestCase):
+    def test_no_phantom_layer(self):
+        heights = list(pycnc.core._generate_heights(0.0, -1.0, -0.1))
+        self.assertEqual(len(heights), 11)
+        self.assertEqual(heights[-1], -1.0)
+        self.assertGreater(heights[-2] - heights[-1], 0.05)
+        gcode = pycnc.core.square_pocket(3.0, 1.0, 40.0, 12.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.1, 10.0)
+        self.assertEqual(gcode.count('G1 Z'), 12)  # 11 layers and the retract
+
+    def test_even(self):
+        heights = pycnc.core.layer_heights(1.0, -9.0, -3.0, even=True)
+        self.assertEqual(len(heights), 5)
+        for upper, lower in zip(heights, heights[1:]):
+            self.assertAlmostEqual(upper - lower, 2.5)
+
+    def test_finishing(self):
+        heights = pycnc.core.layer_heights(0.0, -5.0, -1.0, even=True, finishing=0.2)
+        self.assertEqual(heights[-1], -5.0)
+        self.assertAlmostEqual(heights[-2], -4.8)
+        self.assertEqual(len(heights), 7)
+        self.assertRaises(pycnc.exceptions.WrongParameterError, pycnc.core.layer_heights, 0.0, -5.0, -1.0,
+                          finishing=5.0)
+
+    def test_excentric(self):
+        values = list(pycnc.core._generate_excentric(0.0, 10.0, 2.0, step=0.1))
+        self.assertEqual(len(values), 81)
+        self.assertEqual(values[-1], 9.0)
+        self.assertGreater(values[-1] - values[-2], 0.05)
+
+
+class TestDrillMany(unittest.TestCase):
+    def test_bolt_circle(self):
+        xs, ys = pycnc.core.bolt_circle_points(5.0, 5.0, 40.0, 12)
+        gcode = pycnc.core.drill_many(xs, ys, -4.0, 10.0, 200.0, depth_increment=1.0, cycle='g83')
+        self.assertEqual(gcode.count('G83'), 1)
+        self.assertEqual(len(gcode.splitlines()), 2 + 12)
+        moves = list(pycnc.parser.parse(gcode, resolve=True))
+        self.assertEqual([move.kind for move in moves[2:]], [pycnc.toolpath.DRILL_PECK] * 12)
+        self.assertEqual(set((move.z, move.r, move.q, move.feedrate) for move in moves[2:]),
+                         set([(-4.0, 10.0, 1.0, 200.0)]))
+        self.assertEqual([(move.x, move.y) for move in moves[2:]], list(zip(xs, ys)))
+
+    def test_grid_shorter_than_single_drills(self):
+        xs, ys = pycnc.core.grid_points(0.0, 0.0, 10, 10, 5.0, 5.0)
+        many = pycnc.core.drill_many(xs, ys, -4.0, 10.0, 200.0)
+        single = ''.join(pycnc.core.drill(x, y, -4.0, 10.0, 200.0) for x, y in zip(xs, ys))
+        self.assertLess(len(many) * 2, len(single))
+
+    def test_modal_emitter_keeps_repeats(self):
+        gcode = pycnc.core.drill_many([1.0, 2.0], [1.0, 1.0], -4.0, 10.0, 200.0).splitlines(True)
+        self.assertEqual(list(pycnc.gcodes.ModalEmitter().filter(gcode))[-1], 'X2.0 Y1.0 \n')
+
+    def test_wrong_parameters(self):
+        self.assertRaises(pycnc.exceptions.WrongParameterError, pycnc.core.drill_many, [1.0], [], -4.0, 10.0, 200.0)
+        self.assertRaises(pycnc.exceptions.WrongParameterError, pycnc.core.drill_many, [], [], -4.0, 10.0, 200.0)
+        self.assertRaises(pycnc.exceptions.WrongParameterError, pycnc.core.drill_many, [1.0], [1.0], -4.0, 10.0,
+                          200.0, cycle='g84')
+
+
+class TestStepOver(unittest.TestCase):
+    def _cleared(self, gcode, tool_diameter, x_min, y_min, x_max, y_max, depth):
+        r"""True if the simulated gcode leaves no material in the rectangle"""
+        heightmap = pycnc.simulate.Heightmap(-40.0, -40.0, 40.0, 40.0, resolution=0.2)
+        simulator = pycnc.simulate.Simulator(heightmap, tool_diameter)
+        simulator.run(pycnc.parser.parse(gcode))
+        target = pycnc.simulate.Heightmap(-40.0, -40.0, 40.0, 40.0, resolution=0.2)
+        target.lower_rectangle(x_min, y_min, x_max, y_max, depth)
+        return simulator.report(target).remaining_cells == 0
+
+    def test_rings(self):
+        default = pycnc.core.square_pocket(0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -1.0, -1.0, 10.0)
+        wide = pycnc.core.square_pocket(0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -1.0, -1.0, 10.0, step_over=4.5)
+        # 4 rings of 6 moves at each of the 2 heights, then 3 rings
+        self.assertEqual(len(default.splitlines()) - len(wide.splitlines()), 2 * 6)
+        for gcode in (default, wide):
+            self.assertTrue(self._cleared(gcode, 6.0, -12.55, -12.55, 12.55, 12.55, -1.0))
+
+    def test_thin(self):
+        gcode = pycnc.core.thin(30.0, 20.0, -15.0, -10.0, 6.0, 640.0, 200.0, 0.0, -1.0, -1.0, 10.0, step_over=5.0)
+        # a round tool leaves the corners of the region
+        self.assertTrue(self._cleared(gcode, 6.0, -14.0, -9.0, 14.0, 9.0, -1.0))
+
+    def test_full_hole(self):
+        default = pycnc.core.full_hole(0.0, 0.0, 40.0, 6.0, 640.0, 200.0, 0.0, -1.0, -1.0, 10.0)
+        wide = pycnc.core.full_hole(0.0, 0.0, 40.0, 6.0, 640.0, 200.0, 0.0, -1.0, -1.0, 10.0, step_over=5.0)
+        self.assertLess(len(wide), len(default))
+        self.assertTrue(self._cleared(wide, 6.0, -14.0, -14.0, 14.0, 14.0, -1.0))
+
+    def test_wrong_step_over(self):
+        for step_over in (0.0, -1.0, 7.0):
+            self.assertRaises(pycnc.exceptions.WrongParameterError, pycnc.core.square_pocket, 0.0, 0.0, 25.1, 25.1,
+                              6.0, 640.0, 200.0, 0.0, -1.0, -1.0, 10.0, step_over=step_over)
+
+
+class TestStrategies(unittest.TestCase):
+    def _simulate(self, gcode, tool_diameter):
+        r"""Returns the simulator and the (engaged width, length) of the cutting moves in the XY plane"""
+        heightmap = pycnc.simulate.Heightmap(-25.0, -25.0, 25.0, 25.0, resolution=0.2)
+        simulator = pycnc.simulate.Simulator(heightmap, tool_diameter)
+        estimator = pycnc.estimate.Estimator(start=(None, None, None))
+        engagements = list()
+        for move in pycnc.parser.parse(gcode):
+            before = heightmap.removed_volume()
+            simulator.run([move])
+            length = estimator.add([move]).cutting_length
+            if move.z is None and length > 0.0:
+                # one layer of 1 mm
+                engagements.append(((heightmap.removed_volume() - before) / length, length))
+        return simulator, engagements
+
+    def _report(self, simulator, x_min, y_min, x_max, y_max, depth):
+        target = pycnc.simulate.Heightmap(-25.0, -25.0, 25.0, 25.0, resolution=0.2)
+        target.lower_rectangle(x_min, y_min, x_max, y_max, depth)
+        return simulator.report(target)
+
+    def _heavy_share(self, engagements, width):
+        r"""Part of the cutting length engaged over width"""
+        return sum(length for engaged, length in engagements if engaged > width) / sum(
+            length for _, length in engagements)
+
+    def test_trochoidal_pocket(self):
+        arguments = (0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -1.0, -1.0, 10.0)
+        offset = self._simulate(pycnc.core.square_pocket(*arguments), 6.0)[1]
+        simulator, trochoidal = self._simulate(pycnc.core.square_pocket(*arguments, strategy='trochoidal'), 6.0)
+        # a round tool leaves the corners of the pocket
+        report = self._report(simulator, -11.55, -11.55, 11.55, 11.55, -1.0)
+        self.assertEqual(report.remaining_cells, 0)
+        self.assertEqual(simulator.heightmap.height(12.65, 0.0), 0.0)
+        # only the first loop of each slot is a full width cut
+        self.assertGreater(self._heavy_share(offset, 3.0), 0.15)
+        self.assertLess(self._heavy_share(trochoidal, 3.0), 0.05)
+
+    def test_spiral_hole(self):
+        gcode = pycnc.core.full_hole(0.0, 0.0, 40.0, 6.0, 640.0, 200.0, 0.0, -1.0, -1.0, 10.0, step_over=2.0,
+                                     strategy='spiral')
+        simulator, engagements = self._simulate(gcode, 6.0)
+        report = self._report(simulator, -14.0, -14.0, 14.0, 14.0, -1.0)
+        self.assertEqual(report.remaining_cells, 0)
+        self.assertEqual(simulator.heightmap.height(20.2, 0.0), 0.0)
+        # after the first circle, the engagement stays close to step_over
+        engaged = [width for width, _ in engagements if width > 0.0]
+        self.assertLess(max(engaged[1:]), 3.0)
+
+    def test_wrong_strategy(self):
+        self.assertRaises(pycnc.exceptions.WrongParameterError, pycnc.core.square_pocket, 0.0, 0.0, 25.1, 25.1, 6.0,
+                          640.0, 200.0, 0.0, -1.0, -1.0, 10.0, strategy='zigzag')
+        self.assertRaises(pycnc.exceptions.WrongParameterError, pycnc.core.full_hole, 0.0, 0.0, 40.0, 6.0, 640.0,
+                          200.0, 0.0, -1.0, -1.0, 10.0, strategy='offset')
+
+
+class TestEntry(unittest.TestCase):
+    def _simulator(self, moves):
+        heightmap = pycnc.simulate.Heightmap(-25.0, -25.0, 25.0, 25.0, resolution=0.25)
+        simulator = pycnc.simulate.Simulator(heightmap, 6.0)
+        simulator.run(moves)
+        return simulator
+
+    def _check(self, shape, *args, **kwargs):
+        r"""The ramp and helix entries cut like the plunges, without going straight down after the first layer"""
+        plunge = getattr(pycnc.core, shape)(*args, **kwargs)
+        self.assertEqual(plunge, getattr(pycnc.core, shape)(*args, entry='plunge', **kwargs))
+        target = self._simulator(pycnc.parser.parse(plunge)).heightmap
+        for entry in ('ramp', 'helix'):
+            moves = list(pycnc.parser.parse(getattr(pycnc.core, shape)(*args, entry=entry, **kwargs)))
+            plunges = [move for move in moves if move.kind == pycnc.toolpath.LINEAR and move.x is None and
+                       move.y is None and move.z < 0.0]
+            self.assertEqual(plunges, [], (shape, entry))
+            report = self._simulator(moves).report(target)
+            self.assertEqual((report.remaining_cells, report.gouge_cells), (0, 0), (shape, entry))
+            yield entry, report
+
+    def test_pockets(self):
+        for shape, args in (('square_pocket', (0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -2.0, -1.0, 10.0)),
+                            ('thin', (20.0, 12.0, -10.0, -6.0, 6.0, 640.0, 200.0, 0.0, -2.0, -1.0, 10.0)),
+                            ('oval', (0.0, 0.0, 30.0, 14.0, 6.0, 640.0, 200.0, 0.0, -2.0, -1.0, 10.0))):
+            for _, report in self._check(shape, *args):
+                self.assertEqual(report.overcut_cells, 0)
+        for _, report in self._check('square_pocket', 0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -2.0, -1.0, 10.0,
+                                     strategy='trochoidal'):
+            self.assertEqual(report.overcut_cells, 0)
+
+    def test_contours(self):
+        for entry, report in self._check('path', [(-10.0, -10.0), (10.0, -10.0), (10.0, 10.0), (-10.0, -10.0)],
+                                         640.0, 200.0, 0.0, -2.0, -1.0, 10.0, entry_radius=1.0):
+            if entry == 'ramp':
+                self.assertEqual(report.overcut_cells, 0)
+        for entry, report in self._check('rectangle', 20.0, 20.0, -10.0, -10.0, 6.0, 640.0, 200.0, 0.0, -2.0, -1.0,
+                                         10.0):
+            if entry == 'ramp':
+                self.assertEqual(report.overcut_cells, 0)
+            else:
+                # the helix is outside the rectangle, below its lower left corner
+                self.assertLess(report.overcut_bounds[3], -10.0)
+
+    def test_wrong_entry(self):
+        self.assertRaises(pycnc.exceptions.WrongParameterError, pycnc.core.rectangle, 20.0, 20.0, -10.0, -10.0, 6.0,
+                          640.0, 200.0, 0.0, -2.0, -1.0, 10.0, entry='dive')
+        self.assertRaises(pycnc.exceptions.MissingParameterError, pycnc.core.path, [(0.0, 0.0), (10.0, 0.0)], 640.0,
+                          200.0, 0.0, -2.0, -1.0, 10.0, entry='helix')
+
+
+class TestContinuousDescent(unittest.TestCase):
+    def _simulator(self, moves):
+        heightmap = pycnc.simulate.Heightmap(-25.0, -25.0, 25.0, 25.0, resolution=0.25)
+        simulator = pycnc.simulate.Simulator(heightmap, 6.0)
+        simulator.run(moves)
+        return simulator
+
+    def _check(self, shape, *args):
+        layers = list(pycnc.parser.parse(getattr(pycnc.core, shape)(*args)))
+        continuous = list(pycnc.parser.parse(getattr(pycnc.core, shape)(*args, descent='continuous')))
+        # no stop to go down below the top
+        self.assertEqual([move for move in continuous if move.kind == pycnc.toolpath.LINEAR and move.x is None and
+                          move.y is None and move.z < 0.0], [])
+        report = self._simulator(continuous).report(self._simulator(layers).heightmap)
+        self.assertEqual((report.remaining_cells, report.gouge_cells, report.overcut_cells), (0, 0, 0))
+        self.assertLess(pycnc.estimate.estimate(continuous).time, pycnc.estimate.estimate(layers).time)
+
+    def test_contours(self):
+        self._check('path', [(-10.0, -10.0), (10.0, -10.0), (10.0, 10.0), (-10.0, -10.0)], 640.0, 200.0, 0.0, -2.0,
+                    -0.5, 10.0)
+        self._check('rectangle', 20.0, 20.0, -10.0, -10.0, 6.0, 640.0, 200.0, 0.0, -2.0, -0.5, 10.0)
+        self._check('oval', 0.0, 0.0, 30.0, 6.0, 6.0, 640.0, 200.0, 0.0, -2.0, -0.5, 10.0, 30.0)
+        self._check('oval', 0.0, 0.0, 30.0, 14.0, 6.0, 640.0, 200.0, 0.0, -2.0, -0.5, 10.0)
+
+    def test_wrong_parameters(self):
+        self.assertRaises(pycnc.exceptions.WrongParameterError, pycnc.core.path, [(0.0, 0.0), (10.0, 0.0)], 640.0,
+                          200.0, 0.0, -2.0, -1.0, 10.0, descent='continuous')
+        self.assertRaises(pycnc.exceptions.WrongParameterError, pycnc.core.rectangle, 20.0, 20.0, -10.0, -10.0, 6.0,
+                          640.0, 200.0, 0.0, -2.0, -1.0, 10.0, descent='spiral')
+        self.assertRaises(pycnc.exceptions.WrongParameterError, pycnc.core.rectangle, 20.0, 20.0, -10.0, -10.0, 6.0,
+                          640.0, 200.0, 0.0, -2.0, -1.0, 10.0, entry='ramp', descent='continuous')
+
+
+if __name__ == '__main__':
+    unittest.main()
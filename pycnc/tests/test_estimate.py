@@ -0,0 +1,83 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+import pycnc.core
+import pycnc.estimate
+import pycnc.gcodes
+import pycnc.job
+import pycnc.parser
+
+
+class TestEstimate(unittest.TestCase):
+    def test_parsed_gcode(self):
+        shapes = [('oval', 1.0, 2.0, 30.0, 10.0, 3.0, 640.0, 200.0, 0.0, -2.0, -0.5, 10.0),
+                  ('square_pocket', 0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -1.5, -1.0, 10.0),
+                  ('rectangle_rounded_corners', 0.0, 0.0, 50.0, 50.0, 3.0, 6.0, 640.0, 200.0, 0.0, -3.0, -1.0, 10.0),
+                  ('drill_many', [1.0, 5.0, 9.0], [0.0, 3.0, 0.0], -4.0, 10.0, 200.0, 1.5, 'g83')]
+        machine = pycnc.estimate.Machine(rapid_rate=5000.0, acceleration=500.0)
+        for shape in shapes:
+            tp = pycnc.core.make_toolpath(*shape)
+            gcode = tp.to_gcode()
+            expected = pycnc.estimate.estimate(tp, machine)
+            for lines in (gcode, list(pycnc.gcodes.ModalEmitter().filter(gcode.splitlines(True)))):
+                result = pycnc.estimate.estimate(pycnc.parser.parse(lines), machine)
+                for a, b in zip(result, expected):
+                    self.assertAlmostEqual(a, b)
+
+    def test_file_with_exponents(self):
+        args = (0.0, 0.0, 40.0, 12.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0)
+        tp = pycnc.core.make_toolpath('oval', *args, angle=90.0)
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'oval' + pycnc.core.GCODE_EXTENSION)
+            with open(filename, 'w') as f:
+                f.write(pycnc.core.oval(*args, angle=90.0))
+            with open(filename) as f:
+                self.assertIn('e-', f.read())
+            result = pycnc.estimate.estimate_file(filename)
+        finally:
+            shutil.rmtree(directory)
+        expected = pycnc.estimate.Estimator().add(list(tp))
+        for a, b in zip(result, expected):
+            self.assertAlmostEqual(a, b)
+
+    def test_full_circle(self):
+        tp = pycnc.core.make_toolpath('cylinder', 0.0, 0.0, 10.0, 2.0, 600.0, 0.0, -1.0, -1.0, 5.0)
+        result = pycnc.estimate.estimate(tp, start=(-5.0, 0.0, 5.0))
+        turns = math.hypot(10.0 * math.pi, 5.0) + math.hypot(10.0 * math.pi, 1.0)
+        self.assertAlmostEqual(result.cutting_length, turns + 6.0, places=6)
+        self.assertAlmostEqual(result.cutting_time, result.cutting_length / 10.0)
+
+    def test_peck_drilling(self):
+        machine = pycnc.estimate.Machine(rapid_rate=600.0)
+        g81 = pycnc.estimate.estimate(pycnc.core.make_toolpath('drill', 0.0, 0.0, -4.0, 2.0, 60.0), machine)
+        g83 = pycnc.estimate.estimate(pycnc.core.make_toolpath('drill_g83', 0.0, 0.0, -4.0, 2.0, 2.0, 60.0), machine)
+        self.assertEqual(g81.cutting_length, g83.cutting_length)
+        # pecks at 2 and 4 mm below R: back to R and down again after the first two
+        self.assertAlmostEqual(g83.rapid_length - g81.rapid_length, 2.0 * (2.0 + 4.0))
+
+    def test_limits(self):
+        tp = pycnc.core.make_toolpath('full_hole', 0.0, 0.0, 20.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0)
+        free = pycnc.estimate.estimate(tp)
+        limited = pycnc.estimate.estimate(tp, pycnc.estimate.Machine(acceleration=50.0, max_feedrate=500.0))
+        self.assertEqual(free.cutting_length, limited.cutting_length)
+        self.assertGreater(limited.time, free.time)
+
+    def test_job(self):
+        job = pycnc.job.Job()
+        for x in (0.0, 30.0, 60.0):
+            job.add('full_hole', x, 0.0, 20.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0)
+        features, total = job.estimate()
+        self.assertEqual([feature for feature, _ in features], job.ordered_features())
+        self.assertAlmostEqual(sum(result.time for _, result in features), total.time)
+        self.assertAlmostEqual(total.time, pycnc.estimate.estimate(job.toolpath()).time)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import math
+import random
+import unittest
+
+import pycnc.core
+import pycnc.fitting
+import pycnc.geometry
+import pycnc.parser
+import pycnc.toolpath
+
+
+def _distance(x, y, x_start, y_start, move):
+    r"""Distance from (x, y) to a G1, G2 or G3 move starting at (x_start, y_start)"""
+    if move.kind == pycnc.toolpath.LINEAR:
+        dx, dy = move.x - x_start, move.y - y_start
+        square = dx * dx + dy * dy
+        t = max(0.0, min(1.0, ((x - x_start) * dx + (y - y_start) * dy) / square)) if square else 0.0
+        return math.hypot(x - x_start - t * dx, y - y_start - t * dy)
+    clockwise = move.kind == pycnc.toolpath.ARC_CW
+    sweep = pycnc.geometry.arc_sweep(x_start, y_start, move.x, move.y, move.i, move.j, clockwise)
+    if pycnc.geometry.arc_sweep(x_start, y_start, x, y, move.i, move.j, clockwise) <= sweep:
+        return abs(math.hypot(x - x_start - move.i, y - y_start - move.j) - math.hypot(move.i, move.j))
+    return min(math.hypot(x - x_start, y - y_start), math.hypot(x - move.x, y - move.y))
+
+
+def _deviation(points, moves):
+    r"""Largest distance from a point to the moves starting at the first point"""
+    worst = 0.0
+    for x, y in points:
+        x_start, y_start = points[0]
+        nearest = float('inf')
+        for move in moves:
+            nearest = min(nearest, _distance(x, y, x_start, y_start, move))
+            x_start, y_start = move.x, move.y
+        worst = max(worst, nearest)
+    return worst
+
+
+def _flattened():
+    r"""A flattened profile: a line, a counterclockwise arc, a noisy line and a clockwise arc"""
+    random.seed(0)
+    points = [(0.1 * k, 0.0) for k in range(200)]
+    points += [(20.0 + 10.0 * math.sin(k * 0.01), 10.0 - 10.0 * math.cos(k * 0.01)) for k in range(1, 158)]
+    x, y = points[-1]
+    points += [(x - 0.05 * k, y + 0.001 * random.random()) for k in range(1, 200)]
+    x, y = points[-1]
+    points += [(x - 5.0 * math.sin(k * 0.02), y + 5.0 - 5.0 * math.cos(k * 0.02)) for k in range(1, 100)]
+    return points
+
+
+class TestSimplify(unittest.TestCase):
+    def test_tolerance(self):
+        random.seed(1)
+        points = [(0.01 * k, 0.002 * random.random()) for k in range(50000)] + [(500.0, 50.0)]
+        simplified = pycnc.fitting.simplify(points, 0.01)
+        self.assertEqual(simplified, [points[0], points[-2], points[-1]])
+        moves = [pycnc.toolpath.g1_move(x=x, y=y) for x, y in simplified[1:]]
+        self.assertLessEqual(_deviation(points[::97], moves), 0.01)
+
+    def test_short(self):
+        self.assertEqual(pycnc.fitting.simplify([(0.0, 0.0), (1.0, 1.0)], 0.1), [(0.0, 0.0), (1.0, 1.0)])
+
+
+class TestFitArcs(unittest.TestCase):
+    def test_profile(self):
+        points = _flattened()
+        moves = pycnc.fitting.fit_arcs(points, 0.01, feedrate=600.0)
+        kinds = [move.kind for move in moves]
+        self.assertIn(pycnc.toolpath.ARC_CCW, kinds)
+        self.assertIn(pycnc.toolpath.ARC_CW, kinds)
+        self.assertLess(len(moves), len(points) // 20)
+        self.assertLessEqual(_deviation(points, moves), 0.01)
+        self.assertEqual((moves[-1].x, moves[-1].y), points[-1])
+        self.assertTrue(all(move.feedrate == 600.0 for move in moves))
+
+    def test_arcs_end_on_their_circle(self):
+        x_start, y_start = _flattened()[0]
+        for move in pycnc.fitting.fit_arcs(_flattened(), 0.01):
+            if move.kind != pycnc.toolpath.LINEAR:
+                self.assertAlmostEqual(math.hypot(move.i, move.j),
+                                       math.hypot(x_start + move.i - move.x, y_start + move.j - move.y))
+            x_start, y_start = move.x, move.y
+
+    def test_straight(self):
+        moves = pycnc.fitting.fit_arcs([(0.0, 0.0), (1.0, 0.0), (2.0, 0.0), (3.0, 0.0), (4.0, 0.0)], 0.01)
+        self.assertEqual([(move.kind, move.x, move.y) for move in moves], [(pycnc.toolpath.LINEAR, 4.0, 0.0)])
+
+    def test_path(self):
+        points = _flattened()
+        points.append(points[0])
+        full = pycnc.core.path(points, 600.0, 200.0, 0.0, -1.0, -0.5, 5.0)
+        fitted = pycnc.core.path(points, 600.0, 200.0, 0.0, -1.0, -0.5, 5.0, tolerance=0.01)
+        self.assertLess(len(fitted.splitlines()) * 20, len(full.splitlines()))
+        moves = [move for move in pycnc.parser.parse(fitted)]
+        self.assertEqual(moves[-2].kind, pycnc.toolpath.LINEAR)
+        self.assertEqual((moves[-2].x, moves[-2].y), points[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
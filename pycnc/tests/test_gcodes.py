@@ -0,0 +1,81 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import unittest
+
+import pycnc.core
+import pycnc.gcodes
+import pycnc.exceptions
+
+
+class TestFormatter(unittest.TestCase):
+    def test_compact_rotated_oval(self):
+        previous = pycnc.gcodes.set_formatter(precision=3, strip_zeros=True, snap=1e-9)
+        try:
+            compact = pycnc.core.oval(0.0, 0.0, 30.0, 10.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0, angle=90.0)
+        finally:
+            pycnc.gcodes.set_formatter(previous)
+        verbose = pycnc.core.oval(0.0, 0.0, 30.0, 10.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0, angle=90.0)
+        self.assertIn('e-', verbose)
+        self.assertNotIn('e-', compact)
+        self.assertNotIn('-0 ', compact)
+        self.assertEqual(len(compact.splitlines()), len(verbose.splitlines()))
+        self.assertLess(len(compact), len(verbose))
+
+    def test_per_word_precision(self):
+        formatter = pycnc.gcodes.GcodeFormatter(precision={'X': 1, 'F': 0})
+        self.assertEqual(formatter.format('G1', x=1.25, y=0.1, feedrate=640.0), 'G1 X1.2 Y0.1 F640 \n')
+
+    def test_unknown_letter(self):
+        self.assertRaises(pycnc.exceptions.GcodeParameterError, pycnc.gcodes.GcodeFormatter, precision={'A': 3})
+
+
+def _trace(gcode):
+    r"""Controller state (motion, X, Y, Z, F, I, J) after each motion line, skipping lines that do not move"""
+    state = dict(G=None, X=None, Y=None, Z=None, F=None)
+    trace = list()
+    for line in gcode:
+        words = line.split()
+        offsets = dict(I=None, J=None)
+        moved = False
+        for word in words:
+            if word in ('G0', 'G1', 'G2', 'G3'):
+                state['G'] = word
+            elif word[0] in 'XYZF':
+                moved = moved or (word[0] != 'F' and state[word[0]] != float(word[1:]))
+                state[word[0]] = float(word[1:])
+            elif word[0] in 'IJ':
+                offsets[word[0]] = float(word[1:])
+                moved = True
+        if moved:
+            trace.append((state['G'], state['X'], state['Y'], state['Z'], state['F'], offsets['I'], offsets['J']))
+    return trace
+
+
+class TestModalEmitter(unittest.TestCase):
+    def test_equivalent_and_smaller(self):
+        for gcode in [pycnc.core.square_pocket(0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -1.5, -1.0, 10.0),
+                      pycnc.core.thin(30.0, 20.0, 5.0, 5.0, 6.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0),
+                      pycnc.core.oval(1.0, 2.0, 30.0, 10.0, 3.0, 640.0, 200.0, 0.0, -2.0, -0.5, 10.0, angle=30.0),
+                      pycnc.core.hole(1.0, 1.0, 10.0, 3.0, 640.0, 0.0, -1.0, -0.3, 10.0)]:
+            lines = gcode.splitlines(True)
+            reduced = list(pycnc.gcodes.ModalEmitter().filter(lines))
+            self.assertEqual(_trace(reduced), _trace(lines))
+            self.assertLess(len(''.join(reduced)), len(gcode))
+
+    def test_feedrate_emitted_once(self):
+        gcode = pycnc.core.iter_square_pocket(0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 640.0, 0.0, -1.5, -1.0, 10.0)
+        reduced = ''.join(pycnc.gcodes.ModalEmitter().filter(gcode))
+        self.assertEqual(reduced.count('F640.0'), 1)
+
+    def test_canned_cycle_passthrough(self):
+        emitter = pycnc.gcodes.ModalEmitter()
+        drill = pycnc.core.drill(1.0, 2.0, -4.0, 10.0, 200.0) + pycnc.core.drill(3.0, 2.0, -4.0, 10.0, 200.0)
+        reduced = ''.join(emitter.filter(drill.splitlines(True)))
+        self.assertEqual(reduced.count('G81 G98 Z-4.0 R10.0 F200.0'), 2)
+        self.assertEqual(reduced.count('G0 Z10.0\n'), 2)
+        self.assertIn('\nX3.0\n', reduced)
+
+
+if __name__ == '__main__':
+    unittest.main()
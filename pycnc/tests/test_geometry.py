@@ -0,0 +1,61 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import math
+import unittest
+
+import pycnc.core
+import pycnc.geometry
+
+
+class TestRotation(unittest.TestCase):
+    def test_same_as_point_rotate(self):
+        center = pycnc.core.Point(1.5, -2.0)
+        xs = [0.0, 3.2, -7.1, 1.5]
+        ys = [1.0, -4.4, 0.3, -2.0]
+        for degs in (0.0, 30.0, -45.0, 123.4):
+            rotated_xs, rotated_ys = pycnc.geometry.Rotation(center.x, center.y, degs).apply_many(xs, ys)
+            for x, y, rotated_x, rotated_y in zip(xs, ys, rotated_xs, rotated_ys):
+                point = pycnc.core.Point(x, y).rotate(center, degs)
+                self.assertEqual((point.x, point.y), (rotated_x, rotated_y))
+
+    def test_counterclockwise(self):
+        x, y = pycnc.geometry.Rotation(0.0, 0.0, 90.0, clockwise=False).apply(1.0, 0.0)
+        self.assertAlmostEqual(x, 0.0)
+        self.assertAlmostEqual(y, 1.0)
+
+    def test_same_as_point_rotate_around_origin(self):
+        for degs in (0.0, 30.0, -45.0, 123.4):
+            rads = math.radians(degs)
+            for x, y in ((1.0, 0.0), (3.2, -4.4), (-7.1, 0.3)):
+                point = pycnc.core.Point(x, y).rotate_around_origin(degs)
+                self.assertEqual((point.x, point.y), (x * math.cos(rads) - y * math.sin(rads),
+                                                      x * math.sin(rads) + y * math.cos(rads)))
+
+
+class TestAffine(unittest.TestCase):
+    def test_rotation_around_center(self):
+        x, y = pycnc.geometry.Affine.rotation(90.0, 1.0, 1.0).apply(2.0, 1.0)
+        self.assertAlmostEqual(x, 1.0)
+        self.assertAlmostEqual(y, 2.0)
+
+    def test_compose(self):
+        t = pycnc.geometry.Affine.scaling(2.0) * pycnc.geometry.Affine.translation(1.0, -1.0)
+        self.assertEqual(t.apply(1.0, 1.0), (4.0, 0.0))
+        self.assertFalse(t.is_rigid())
+        self.assertTrue((pycnc.geometry.Affine.rotation(33.0) * pycnc.geometry.Affine.translation(5.0, 2.0)).is_rigid())
+
+    def test_reflection_is_not_rigid(self):
+        self.assertFalse(pycnc.geometry.Affine.scaling(-1.0, 1.0).is_rigid())
+        self.assertFalse((pycnc.geometry.Affine.rotation(30.0) * pycnc.geometry.Affine.scaling(1.0, -1.0)).is_rigid())
+        self.assertTrue(pycnc.geometry.Affine.scaling(-1.0, -1.0).is_rigid())  # rotation by 180 degrees
+
+
+class TestPoint(unittest.TestCase):
+    def test_slots(self):
+        point = pycnc.core.Point(1.0, 2.0)
+        self.assertRaises(AttributeError, setattr, point, 'z', 3.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import cProfile
+import io
+import json
+import pstats
+import unittest
+
+import pycnc.core
+import pycnc.estimate
+import pycnc.exceptions
+import pycnc.gcodes
+import pycnc.instrument
+import pycnc.job
+import pycnc.toolpath
+
+POCKET = (0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -1.5, -1.0, 10.0)
+
+
+class TestInstrument(unittest.TestCase):
+    def tearDown(self):
+        pycnc.instrument.disable()
+
+    def test_shape(self):
+        with pycnc.instrument.instrumented() as recorder:
+            gcode = pycnc.core.square_pocket(*POCKET)
+        statistics = recorder.functions['square_pocket']
+        self.assertEqual((statistics.calls, statistics.lines, statistics.bytes), (1, gcode.count('\n'), len(gcode)))
+        # the iter_square_pocket call made by square_pocket is not recorded on its own
+        self.assertNotIn('iter_square_pocket', recorder.functions)
+        self.assertEqual([name for name, _ in recorder.calls], ['square_pocket'])
+        expected = pycnc.estimate.estimate(pycnc.core.make_toolpath('square_pocket', *POCKET))
+        self.assertAlmostEqual(statistics.cutting_length, expected.cutting_length)
+        self.assertAlmostEqual(statistics.machining_time, expected.time)
+        self.assertEqual(statistics.plunges, 3)  # to 0.0, -1.0 and -1.5
+        self.assertEqual(sum(statistics.moves.values()), len(pycnc.core.make_toolpath('square_pocket', *POCKET)))
+        self.assertGreater(statistics.time, 0.0)
+
+    def test_shape_with_exponents(self):
+        args = (0.0, 0.0, 40.0, 12.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0)
+        with pycnc.instrument.instrumented() as recorder:
+            gcode = pycnc.core.oval(*args, angle=90.0)
+        self.assertIn('e-', gcode)
+        statistics = recorder.functions['oval']
+        expected = pycnc.estimate.estimate(pycnc.core.make_toolpath('oval', *args, angle=90.0))
+        self.assertAlmostEqual(statistics.rapid_length, expected.rapid_length)
+        self.assertAlmostEqual(statistics.cutting_length, expected.cutting_length)
+        self.assertAlmostEqual(statistics.machining_time, expected.time)
+
+    def test_iter(self):
+        with pycnc.instrument.instrumented() as recorder:
+            lines = pycnc.core.iter_square_pocket(*POCKET)
+            first = [next(lines) for _ in range(5)]
+            lines.close()
+            total = len(list(pycnc.core.iter_square_pocket(*POCKET)))
+        statistics = recorder.functions['iter_square_pocket']
+        self.assertEqual((statistics.calls, statistics.lines), (2, 5 + total))
+        self.assertEqual([call.lines for _, call in recorder.calls], [5, total])
+        self.assertEqual(first, pycnc.core.square_pocket(*POCKET).splitlines(True)[:5])
+
+    def test_restore(self):
+        original = pycnc.core.square_pocket
+        recorder = pycnc.instrument.enable()
+        self.assertIsNot(pycnc.core.square_pocket, original)
+        self.assertRaises(pycnc.exceptions.WrongParameterError, pycnc.instrument.enable)
+        self.assertIs(pycnc.instrument.disable(), recorder)
+        self.assertIs(pycnc.core.square_pocket, original)
+        self.assertIsNone(pycnc.instrument.disable())
+
+    def test_emitters_and_job(self):
+        job = pycnc.job.Job(optimize=False)
+        job.add('drill', 1.0, 2.0, -4.0, 10.0, 200.0)
+        job.add('square_pocket', *POCKET)
+        with pycnc.instrument.instrumented(motion=False) as recorder:
+            pycnc.gcodes.g1_gcode(x=1.0, feedrate=640.0)
+            pycnc.gcodes.g1_gcode(y=1.0)
+            job.to_gcode()
+        self.assertEqual(recorder.functions['g1_gcode'].calls, 2)
+        self.assertEqual(recorder.functions['g1_gcode'].lines, 2)
+        self.assertEqual([name for name, _ in recorder.calls], ['drill', 'square_pocket'])
+        self.assertEqual(recorder.total().moves, dict())
+
+    def test_shape_emitters(self):
+        rectangle = (0.0, 0.0, 50.0, 30.0, 5.0, 3.0, 640.0, 200.0, 0.0, -2.0, -0.1, 10.0)
+        with pycnc.instrument.instrumented(motion=False) as recorder:
+            gcode = pycnc.core.rectangle_rounded_corners(*rectangle)
+        tp = pycnc.core.make_toolpath('rectangle_rounded_corners', *rectangle)
+        statistics = recorder.functions['iter_gcode']
+        self.assertEqual((statistics.calls, statistics.lines, statistics.bytes), (1, gcode.count('\n'), len(gcode)))
+        expected = dict()
+        for move in tp:
+            kind = pycnc.toolpath.PREFIXES[move.kind]
+            expected[kind] = expected.get(kind, 0) + 1
+        self.assertEqual(statistics.moves, expected)
+        # the lines of the contours repeated at each depth are formatted once, their Z word spliced in
+        formatted = recorder.functions['GcodeFormatter.format']
+        self.assertEqual(formatted.lines, formatted.calls)
+        self.assertLess(formatted.calls, len(tp) // 2)
+        self.assertGreater(recorder.functions['GcodeFormatter.word'].calls, 0)
+        self.assertNotIn('format', vars(pycnc.gcodes.get_formatter()))
+        self.assertEqual(pycnc.core.rectangle_rounded_corners(*rectangle), gcode)
+
+    def test_json_report(self):
+        with pycnc.instrument.instrumented() as recorder:
+            pycnc.core.drill(1.0, 2.0, -4.0, 10.0, 200.0)
+            pycnc.core.drill(3.0, 2.0, -4.0, 10.0, 200.0)
+        f = io.StringIO()
+        recorder.write_json(f)
+        report = json.loads(f.getvalue())
+        self.assertEqual(report['functions']['drill']['calls'], 2)
+        self.assertEqual(report['functions']['drill']['moves'], {'G0': 4, 'G81': 2})
+        self.assertEqual([call['function'] for call in report['calls']], ['drill', 'drill'])
+        self.assertLessEqual(report['functions']['drill']['min_time'], report['functions']['drill']['max_time'])
+
+    def test_profiler(self):
+        profiler = cProfile.Profile()
+        with pycnc.instrument.instrumented(profiler=profiler):
+            pycnc.core.square_pocket(*POCKET)
+        functions = [function for _, _, function in pstats.Stats(profiler).stats]
+        self.assertIn('_square_pocket_moves', functions)
+        self.assertNotIn('add_lines', functions)
+
+
+if __name__ == '__main__':
+    unittest.main()
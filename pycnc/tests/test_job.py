@@ -0,0 +1,98 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import multiprocessing
+import random
+import unittest
+
+import pycnc.core
+import pycnc.exceptions
+import pycnc.gcodes
+import pycnc.job
+
+
+def _plate(optimize=True):
+    job = pycnc.job.Job(optimize=optimize)
+    for x, y in [(-8.5, -8.5), (19.0, 19.0), (8.5, -8.5), (-19.0, 0.0), (8.5, 8.5), (19.0, -19.0), (-8.5, 8.5)]:
+        job.add(pycnc.core.drill, x, y, -4.0, 10.0, 200.0)
+    job.add('square_pocket', 0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -1.5, -1.0, 10.0)
+    return job
+
+
+class TestJob(unittest.TestCase):
+    def test_not_optimized(self):
+        job = _plate(optimize=False)
+        expected = [pycnc.core.start_gcode()]
+        expected += [getattr(pycnc.core, f.shape)(*f.args, **f.kwargs) for f in job.features]
+        expected.append(pycnc.core.end_gcode())
+        self.assertEqual(job.to_gcode(), ''.join(expected))
+
+    def test_optimized(self):
+        optimized, original = _plate(), _plate(optimize=False)
+        gcode = optimized.to_gcode()
+        self.assertNotIn('X0.0 Y0.0 Z10.0', gcode)
+        self.assertEqual(gcode.count('G81'), 7)
+        self.assertEqual(sorted(optimized.ordered_features()), sorted(original.features))
+        self.assertLess(optimized.rapid_travel(), original.rapid_travel())
+        self.assertTrue(gcode.startswith(pycnc.core.start_gcode()))
+        self.assertTrue(gcode.endswith(pycnc.core.end_gcode()))
+
+    def test_feature_on_origin(self):
+        # the rapid move to the center of an oval on the origin is its only approach, it is kept
+        job = pycnc.job.Job(start=(100.0, 100.0))
+        job.add('full_hole', 90.0, 90.0, 10.0, 3.0, 640.0, 200.0, 0.0, -1.0, -1.0, 5.0)
+        job.add('oval', 0.0, 0.0, 30.0, 10.0, 3.0, 640.0, 200.0, 0.0, -1.0, -1.0, 5.0)
+        self.assertEqual([feature.shape for feature in job.ordered_features()], ['full_hole', 'oval'])
+        lines = [line.strip() for line in job.to_gcode().splitlines()]
+        oval = lines.index('G0 X0.0 Y0.0 Z5.0')
+        self.assertTrue(lines[oval + 1].startswith('G1 Z0.0'))
+
+    def test_two_opt_improves_nearest_neighbour(self):
+        random.seed(0)
+        points = [(random.uniform(0.0, 100.0), random.uniform(0.0, 100.0)) for _ in range(60)]
+        greedy = pycnc.job.optimize_order(points, points, two_opt=False)
+        improved = pycnc.job.optimize_order(points, points)
+        self.assertEqual(sorted(improved), list(range(60)))
+
+        def length(order):
+            return sum(pycnc.job._distance(a, b) for a, b in zip([(0.0, 0.0)] + [points[k] for k in order],
+                                                                  [points[k] for k in order]))
+        self.assertLess(length(improved), length(greedy))
+
+    def test_entry_exit(self):
+        tp = pycnc.core.make_toolpath('rectangle', 20.0, 10.0, 1.0, 2.0, 2.0, 640.0, 200.0, 0.0, -1.0, -1.0, 10.0)
+        self.assertEqual(pycnc.job.entry_exit(tp), ((0.0, 1.0), (0.0, 1.0)))
+
+    def test_parallel(self):
+        for optimize in (True, False):
+            serial = _plate(optimize=optimize)
+            parallel = pycnc.job.Job(optimize=optimize, features=serial.features, workers=2)
+            self.assertEqual(parallel.to_gcode(), serial.to_gcode())
+            self.assertEqual(len(parallel._toolpaths if optimize else parallel._gcodes), len(serial))
+
+    def test_parallel_formatter(self):
+        if not hasattr(multiprocessing, 'get_context'):
+            raise unittest.SkipTest('multiprocessing.get_context is not available')
+        features = [pycnc.job.Feature('oval', (x, 0.0, 30.0, 10.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0, 90.0), {})
+                    for x in (0.0, 40.0)]
+        previous = pycnc.gcodes.set_formatter(precision=3, strip_zeros=True)
+        try:
+            expected = [pycnc.job.feature_gcode(feature) for feature in features]
+            # spawned processes do not inherit the formatter of this one
+            result = pycnc.job.parallel_map(pycnc.job.feature_gcode, features, workers=2,
+                                            context=multiprocessing.get_context('spawn'))
+        finally:
+            pycnc.gcodes.set_formatter(previous)
+        self.assertIn('F640 ', expected[0])
+        self.assertEqual(result, expected)
+
+    def test_feature_tuples(self):
+        job = pycnc.job.Job(features=[('drill', (1.0, 2.0, -4.0, 10.0, 200.0), {})])
+        self.assertEqual(job.features, [pycnc.job.Feature('drill', (1.0, 2.0, -4.0, 10.0, 200.0), {})])
+
+    def test_unknown_shape(self):
+        self.assertRaises(pycnc.exceptions.WrongParameterError, pycnc.job.Job().add, 'end_gcode')
+
+
+if __name__ == '__main__':
+    unittest.main()
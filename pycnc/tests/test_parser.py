@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import pycnc.core
+import pycnc.exceptions
+import pycnc.gcodes
+import pycnc.parser
+import pycnc.toolpath
+
+
+SHAPES = [pycnc.core.oval(1.0, 2.0, 30.0, 10.0, 3.0, 640.0, 200.0, 0.0, -2.0, -0.5, 10.0, angle=30.0),
+          pycnc.core.square_pocket(0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -1.5, -1.0, 10.0),
+          pycnc.core.rectangle_rounded_corners(0.0, 0.0, 50.0, 50.0, 3.0, 6.0, 640.0, 200.0, 0.0, -3.0, -1.0, 10.0),
+          pycnc.core.cylinder(1.0, 1.0, 10.0, 3.0, 640.0, 0.0, -1.0, -0.3, 10.0),
+          pycnc.core.drill(1.0, 2.0, -4.0, 10.0, 200.0),
+          pycnc.core.drill_g73(1.0, 2.0, -4.0, 1.0, 10.0, 200.0),
+          pycnc.core.drill_g83(1.0, 2.0, -4.0, 1.0, 10.0, 200.0)]
+
+
+def _moving(moves):
+    r"""Resolved moves without the G0/G1 that do not move"""
+    kept = list()
+    for move in moves:
+        if move.kind in (0, 1) and kept and kept[-1][1:4] == move[1:4]:
+            continue
+        kept.append(move)
+    return kept
+
+
+class TestParser(unittest.TestCase):
+    def test_round_trip(self):
+        body = ''.join(SHAPES)
+        parser = pycnc.parser.GcodeParser()
+        moves = list(parser.parse((pycnc.core.start_gcode() + body + pycnc.core.end_gcode()).splitlines(True)))
+        self.assertEqual(pycnc.toolpath.to_gcode(moves), body)
+        self.assertTrue(parser.program_end)
+        self.assertEqual(parser.unsupported, {})
+
+    def test_round_trip_exponents(self):
+        # the rotated points on the axes have coordinates like 9.184850993605148e-17
+        body = pycnc.core.oval(0.0, 0.0, 40.0, 12.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0, angle=90.0)
+        self.assertIn('e-', body)
+        moves = list(pycnc.parser.parse(body.splitlines(True)))
+        self.assertEqual(pycnc.toolpath.to_gcode(moves), body)
+        self.assertEqual(moves, list(pycnc.core.make_toolpath('oval', 0.0, 0.0, 40.0, 12.0, 3.0, 640.0, 200.0, 0.0,
+                                                              -1.0, -0.5, 10.0, angle=90.0)))
+
+    def test_modes(self):
+        parser = pycnc.parser.GcodeParser()
+        list(parser.parse(pycnc.core.start_gcode().splitlines(True)))
+        self.assertEqual(parser.modes['units'], 'G21')
+        self.assertEqual(parser.modes['plane'], 'G17')
+        self.assertEqual(parser.modes['feed_mode'], 'G94')
+
+    def test_modal_lines(self):
+        body = ''.join(SHAPES).splitlines(True)
+        reduced = list(pycnc.gcodes.ModalEmitter().filter(body))
+        self.assertEqual(_moving(pycnc.parser.parse(reduced, resolve=True)),
+                         _moving(pycnc.parser.parse(body, resolve=True)))
+
+    def test_canned_cycle_repeat(self):
+        moves = list(pycnc.parser.parse('G0 Z10\nG81 G98 X1 Y2 Z-4.0 R5.0 F200\nX3\nG80\n', resolve=True))
+        self.assertEqual([move.kind for move in moves], [0, 81, 81])
+        self.assertEqual(moves[2][1:], (3, 2, -4.0, None, None, 5.0, None, 200))
+
+    def test_comments_and_leading_zeros(self):
+        moves = list(pycnc.parser.parse('(header)\ng01 x1.5 (go) y.5 f100 ; trailing\n'))
+        self.assertEqual(moves, [pycnc.toolpath.Move(1, 1.5, 0.5, None, None, None, None, None, 100)])
+
+    def test_no_motion_mode(self):
+        self.assertRaises(pycnc.exceptions.GcodeParseError, list, pycnc.parser.parse('X1.0\n'))
+
+    def test_parse_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'test' + pycnc.core.GCODE_EXTENSION)
+            with open(filename, 'w') as f:
+                pycnc.core.write_to(f, pycnc.core.iter_full_hole(1.0, 1.0, 20.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.3,
+                                                                 10.0))
+            tp = pycnc.parser.read_toolpath(filename)
+            self.assertEqual(tp.to_gcode(), pycnc.core.make_toolpath('full_hole', 1.0, 1.0, 20.0, 3.0, 640.0, 200.0,
+                                                                     0.0, -1.0, -0.3, 10.0).to_gcode())
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
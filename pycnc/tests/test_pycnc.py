@@ -1,6 +1,7 @@
 #!/usr/bin/python
 # coding: utf-8
 
+import io
 import unittest
 
 import pycnc.core
@@ -18,6 +19,25 @@ class TestGenerateHeights(unittest.TestCase):
         pycnc.core._generate_heights(0.0, -8.0, 1.0)
         self.assertRaises(pycnc.exceptions.WrongParameterError)
 
-    
+
+class TestStreaming(unittest.TestCase):
+    def test_iter_matches_string(self):
+        lines = list(pycnc.core.iter_square_pocket(0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -1.5, -1.0, 10.0))
+        self.assertTrue(all(line.endswith('\n') for line in lines))
+        self.assertEqual(''.join(lines),
+                         pycnc.core.square_pocket(0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -1.5, -1.0, 10.0))
+
+    def test_iter_is_lazy(self):
+        gcode = pycnc.core.iter_path([[0.0, 0.0], [1.0, 1.0]], 640.0, 200.0, 0.0, -1000.0, -0.1, 10.0)
+        self.assertEqual(next(gcode), 'G0 X0 Y0 Z10.0 \n')
+
+    def test_write_to(self):
+        f = io.StringIO()
+        written = pycnc.core.write_to(f, pycnc.core.iter_full_hole(1.0, 1.0, 20.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.3,
+                                                                   10.0), chunk_size=3)
+        self.assertEqual(f.getvalue(), pycnc.core.full_hole(1.0, 1.0, 20.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.3, 10.0))
+        self.assertEqual(written, len(f.getvalue()))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import unittest
+
+import pycnc.core
+import pycnc.estimate
+import pycnc.exceptions
+import pycnc.job
+import pycnc.rest
+import pycnc.simulate
+import pycnc.toolpath
+
+HOLE = (20.0, 20.0, 30.0, 6.0, 600.0, 200.0, 0.0, -2.0, -1.0, 5.0)
+POCKET = (20.0, 20.0, 30.0, 30.0, 2.0, 600.0, 200.0, 0.0, -2.0, -1.0, 5.0)
+
+
+def _stock():
+    return pycnc.simulate.Heightmap(-1.0, -1.0, 41.0, 41.0, resolution=0.25)
+
+
+class TestRest(unittest.TestCase):
+    def test_same_material_removed(self):
+        stock = _stock()
+        pycnc.rest.machine_feature(stock, 'full_hole', HOLE, {})
+        corners = pycnc.rest.machine_feature(stock, 'square_pocket', POCKET, {})
+        full = pycnc.core.make_toolpath('square_pocket', *POCKET)
+        self.assertLess(len(corners) * 2, len(full))
+        self.assertLess(pycnc.estimate.estimate(corners).time * 2, pycnc.estimate.estimate(full).time)
+        # replaying the full toolpath or the rest one after the hole gives the same stock, without rapid collision
+        for moves in (corners, full):
+            replay = _stock()
+            pycnc.simulate.simulate(pycnc.core.make_toolpath('full_hole', *HOLE), 6.0, heightmap=replay)
+            simulator = pycnc.simulate.simulate(moves, 2.0, heightmap=replay)
+            self.assertEqual(replay.rows, stock.rows)
+            self.assertEqual(simulator.rapid_collisions, [])
+        self.assertTrue(all(move.feedrate is not None for move in corners if move.kind == pycnc.toolpath.LINEAR))
+
+    def test_nothing_left(self):
+        stock = _stock()
+        pycnc.rest.machine_feature(stock, 'full_hole', HOLE, {})
+        again = pycnc.rest.machine_feature(stock, 'full_hole', HOLE, {})
+        self.assertEqual([move.kind for move in again], [pycnc.toolpath.RAPID] * len(again))
+
+    def test_not_rest_shape(self):
+        stock = _stock()
+        args = (20.0, 10.0, 5.0, 5.0, 3.0, 600.0, 200.0, 0.0, -1.0, -1.0, 5.0)
+        tp = pycnc.rest.machine_feature(stock, 'rectangle', args, {})
+        self.assertEqual(tp.to_gcode(), pycnc.core.make_toolpath('rectangle', *args).to_gcode())
+        self.assertEqual(stock.height(3.5, 10.0), -1.0)
+        # the tool of a drilling is not known, it is not simulated
+        pycnc.rest.machine_feature(stock, 'drill', (20.0, 20.0, -4.0, 5.0, 200.0), {})
+        self.assertEqual(stock.height(20.0, 20.0), 0.0)
+
+
+class TestJobStock(unittest.TestCase):
+    def test_tools(self):
+        stock = _stock()
+        roughing = pycnc.job.Job(stock=stock)
+        roughing.add('full_hole', *HOLE)
+        roughing.to_gcode()
+        finishing = pycnc.job.Job(stock=stock)
+        finishing.add('square_pocket', *POCKET)
+        alone = pycnc.job.Job(features=finishing.features)
+        self.assertLess(finishing.estimate()[1].time * 2, alone.estimate()[1].time)
+        self.assertEqual(finishing.to_gcode(), finishing.to_gcode())  # machined on the stock once
+        self.assertRaises(pycnc.exceptions.WrongParameterError, finishing.add, 'drill', 1.0, 2.0, -4.0, 10.0, 200.0)
+
+    def test_not_optimized(self):
+        job = pycnc.job.Job(optimize=False, stock=_stock(), features=[('full_hole', HOLE, {})] * 2)
+        self.assertEqual(job.to_gcode(), pycnc.job.Job(optimize=False, features=job.features).to_gcode())
+
+
+if __name__ == '__main__':
+    unittest.main()
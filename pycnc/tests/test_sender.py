@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import os
+import unittest
+
+import pycnc.core
+import pycnc.exceptions
+import pycnc.job
+import pycnc.sender
+
+try:
+    import asyncio
+except ImportError:  # Python 2
+    asyncio = None
+
+
+@unittest.skipIf(asyncio is None or not hasattr(os, 'openpty'), 'needs asyncio and a pty')
+class TestSender(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.controller = pycnc.sender.FakeController(self.loop, line_time=0.0005)
+
+    def tearDown(self):
+        self.controller.close()
+        self.loop.close()
+
+    def _job(self):
+        job = pycnc.job.Job(optimize=False)
+        job.add('square_pocket', 0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -1.5, -1.0, 10.0)
+        job.add('rectangle_rounded_corners', 0.0, 0.0, 50.0, 50.0, 3.0, 6.0, 640.0, 200.0, 0.0, -3.0, -1.0, 10.0)
+        return job
+
+    def test_stream_job(self):
+        job = self._job()
+        acknowledged = pycnc.sender.stream(job.iter_gcode(), self.controller.device, timeout=30.0, loop=self.loop)
+        expected = [line.strip() for line in job.to_gcode().splitlines()]
+        self.assertEqual(self.controller.lines, expected)
+        self.assertEqual(acknowledged, len(expected))
+        self.assertEqual(self.controller.overflows, 0)
+        # several lines were waiting in the buffer, never more than its size
+        self.assertGreater(self.controller.max_buffered, 64)
+        self.assertLessEqual(self.controller.max_buffered, pycnc.sender.GRBL_BUFFER_SIZE)
+
+    def test_incremental(self):
+        generated = list()
+
+        def lines():
+            for line in pycnc.core.iter_path([(0.0, 0.0), (10.0, 0.0), (10.0, 10.0), (0.0, 0.0)], 640.0, 200.0, 0.0,
+                                             -5.0, -0.1, 10.0):
+                generated.append(len(self.controller.lines))
+                yield line
+
+        pycnc.sender.stream(lines(), self.controller.device, timeout=30.0, loop=self.loop)
+        # the last lines were generated after the controller had executed most of the others
+        self.assertGreater(generated[-1], len(generated) - 20)
+        self.assertEqual(generated[0], 0)
+
+    def test_stop_on_error(self):
+        with self.assertRaises(pycnc.exceptions.ControllerError):
+            pycnc.sender.stream('G0 Z10\no100 call\nG0 Z5\n', self.controller.device, timeout=30.0, loop=self.loop)
+
+    def test_collect_errors(self):
+        fd = os.open(self.controller.device, os.O_RDWR | os.O_NOCTTY)
+        try:
+            sender = pycnc.sender.Sender(fd, self.loop, stop_on_error=False)
+            future = sender.stream('G0 Z10\no100 call\nG0 Z5\n')
+            self.assertEqual(self.loop.run_until_complete(asyncio.wait_for(future, 30.0)), 3)
+        finally:
+            os.close(fd)
+        self.assertEqual(sender.errors, [(2, 'o100 call', 'error:20')])
+
+    def test_timeout(self):
+        controller = pycnc.sender.FakeController(self.loop, line_time=1.0)
+        fd = os.open(controller.device, os.O_RDWR | os.O_NOCTTY)
+        try:
+            sender = pycnc.sender.Sender(fd, self.loop)
+            future = sender.stream(self._job().iter_gcode())
+            with self.assertRaises(asyncio.TimeoutError):
+                self.loop.run_until_complete(asyncio.wait_for(future, 0.05))
+            self.loop.run_until_complete(asyncio.sleep(0))
+            # the file descriptor is no longer watched, and back in blocking mode
+            self.assertFalse(self.loop.remove_reader(fd))
+            self.assertFalse(self.loop.remove_writer(fd))
+            self.assertTrue(os.get_blocking(fd))
+        finally:
+            os.close(fd)
+            controller.close()
+
+    def test_line_too_long(self):
+        with self.assertRaises(pycnc.exceptions.WrongParameterError):
+            pycnc.sender.stream('G1 X1.0 ' + 'Y1.0 ' * 30 + '\n', self.controller.device, buffer_size=64,
+                                timeout=30.0, loop=self.loop)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import unittest
+
+import pycnc.core
+import pycnc.parser
+import pycnc.simulate
+import pycnc.toolpath
+
+
+def _grid():
+    return pycnc.simulate.Heightmap(-15.0, -15.0, 15.0, 15.0, resolution=0.1)
+
+
+class TestSimulate(unittest.TestCase):
+    def test_full_hole_clears_the_hole(self):
+        tp = pycnc.core.make_toolpath('full_hole', 0.0, 0.0, 20.0, 3.0, 640.0, 200.0, 0.0, -2.0, -1.0, 10.0)
+        simulator = pycnc.simulate.Simulator(_grid(), 3.0)
+        simulator.run(tp)
+        # the cells on the wall are within the chord tolerance of the arcs
+        inside, outside = _grid(), _grid()
+        inside.lower_disc(0.0, 0.0, 9.95, -2.0)
+        outside.lower_disc(0.0, 0.0, 10.05, -2.0)
+        report = simulator.report(inside)
+        self.assertEqual((report.remaining_cells, report.gouge_cells), (0, 0))
+        self.assertEqual(simulator.report(outside).overcut_cells, 0)
+        self.assertEqual(report.rapid_collisions, 0)
+
+    def test_gouge_and_remaining(self):
+        simulator = pycnc.simulate.simulate(pycnc.core.make_toolpath('hole', 0.0, 0.0, 10.0, 2.0, 640.0, 0.0, -1.0,
+                                                                     -0.5, 10.0), 2.0, heightmap=_grid())
+        target = _grid()
+        target.lower_rectangle(-3.0, -3.0, 3.0, 3.0, -0.5)
+        report = simulator.report(target)
+        # the hole only cuts a 2 mm wide ring: the middle remains, the ring is deeper than the target
+        self.assertGreater(report.remaining_cells, 0)
+        self.assertAlmostEqual(report.max_remaining, 0.5)
+        # helical floor: the last turn goes down from -0.5 to -1.0
+        self.assertAlmostEqual(report.max_gouge, 0.5, delta=0.03)
+        self.assertGreater(report.overcut_cells, 0)
+        self.assertEqual([round(value, 9) for value in report.remaining_bounds], [-2.95, -2.95, 2.95, 2.95])
+
+    def test_rapid_collision(self):
+        moves = [pycnc.toolpath.g0_move(x=0.0, y=0.0, z=5.0), pycnc.toolpath.g0_move(z=-1.0),
+                 pycnc.toolpath.g0_move(x=5.0)]
+        simulator = pycnc.simulate.simulate(moves, 3.0, heightmap=_grid())
+        self.assertEqual([collision[0] for collision in simulator.rapid_collisions], [1, 2])
+
+    def test_drill_many(self):
+        tp = pycnc.core.make_toolpath('drill_many', [0.0, 5.0, 10.0], [0.0, 0.0, 0.0], -4.0, 2.0, 200.0)
+        simulator = pycnc.simulate.simulate(tp, 3.0, heightmap=_grid())
+        heights = [simulator.heightmap.height(x, 0.0) for x in (0.0, 2.5, 5.0, 10.0)]
+        self.assertEqual(heights, [-4.0, 0.0, -4.0, -4.0])
+        self.assertEqual(simulator.rapid_collisions, [])
+
+    def test_parsed_gcode(self):
+        tp = pycnc.core.make_toolpath('oval', 0.0, 0.0, 20.0, 10.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.5, 10.0,
+                                      angle=30.0)
+        simulated = pycnc.simulate.simulate(tp, 3.0, heightmap=_grid())
+        parsed = pycnc.simulate.simulate(list(pycnc.parser.parse(tp.to_gcode())), 3.0, heightmap=_grid())
+        self.assertEqual(simulated.heightmap.rows, parsed.heightmap.rows)
+        self.assertGreater(simulated.heightmap.removed_volume(), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import re
+import unittest
+
+import pycnc.core
+import pycnc.gcodes
+import pycnc.job
+import pycnc.parser
+import pycnc.subroutines
+import pycnc.toolpath
+
+
+def _evaluate(expression, parameters):
+    r"""Value of an O-code expression of the subset written by pycnc.subroutines"""
+    expression = expression.replace('#<layer>', repr(parameters.get('layer')))
+    expression = re.sub(r'#(\d+)', lambda match: repr(parameters[match.group(1)]), expression)
+    return eval(expression.replace('[', '(').replace(']', ')').replace(' LT ', ' < '))
+
+
+def _run(lines, subroutines, parameters):
+    r"""Plain Gcode lines of a main program or of a subroutine body"""
+    plain = list()
+    index = 0
+    while index < len(lines):
+        line = lines[index]
+        assignment = re.match(r'#<layer> = (.*)$', line)
+        loop = re.match(r'(o\d+) while (.*)$', line)
+        call = re.match(r'(o\d+) call(.*)$', line)
+        if assignment:
+            parameters['layer'] = _evaluate(assignment.group(1), parameters)
+        elif loop:
+            end = lines.index('%s endwhile' % loop.group(1), index)
+            while _evaluate(loop.group(2), parameters):
+                plain += _run(lines[index + 1:end], subroutines, parameters)
+            index = end
+        elif call:
+            arguments = [_evaluate(argument, parameters) for argument in re.findall(r'\[[^]]*\]', call.group(2))]
+            local = dict((str(number + 1), value) for number, value in enumerate(arguments))
+            plain += _run(subroutines[call.group(1)], subroutines, local)
+        else:
+            line = re.sub(r'\[[^]]*\]', lambda match: repr(_evaluate(match.group(0), parameters)), line)
+            plain.append(re.sub(r'#(\d+)', lambda match: repr(parameters[match.group(1)]), line))
+        index += 1
+    return plain
+
+
+def _expand(gcode):
+    r"""Plain Gcode of a program with subroutines and loops"""
+    subroutines, main = dict(), list()
+    lines = [line.strip() for line in gcode.splitlines()]
+    index = 0
+    while index < len(lines):
+        definition = re.match(r'(o\d+) sub$', lines[index])
+        if definition:
+            end = lines.index('%s endsub' % definition.group(1), index)
+            subroutines[definition.group(1)] = lines[index + 1:end]
+            index = end
+        else:
+            main.append(lines[index])
+        index += 1
+    return '\n'.join(_run(main, subroutines, dict())) + '\n'
+
+
+class SameMoves(object):
+    def assertSameMoves(self, gcode, expected):
+        moves, expected_moves = list(pycnc.parser.parse(gcode)), list(pycnc.parser.parse(expected))
+        self.assertEqual(len(moves), len(expected_moves))
+        for move, expected_move in zip(moves, expected_moves):
+            self.assertEqual(move.kind, expected_move.kind)
+            for value, expected_value in zip(move[1:], expected_move[1:]):
+                if expected_value is None:
+                    self.assertIsNone(value)
+                else:
+                    self.assertAlmostEqual(value, expected_value, places=9)
+
+
+class TestLayers(SameMoves, unittest.TestCase):
+    def test_shapes(self):
+        shapes = [('path', ([(0.0, 0.0), (10.0, 0.0), (10.0, 5.0), (0.0, 0.0)], 640.0, 200.0, 0.0, -5.0, -0.3, 10.0)),
+                  ('rectangle_rounded_corners', (0.0, 0.0, 50.0, 30.0, 5.0, 3.0, 640.0, 200.0, 0.0, -5.0, -0.3, 10.0)),
+                  ('oval', (1.0, 2.0, 30.0, 10.0, 3.0, 640.0, 200.0, 0.0, -5.0, -0.5, 10.0, 30.0)),
+                  ('square_pocket', (0.0, 0.0, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -5.0, -1.0, 10.0))]
+        for shape, args in shapes:
+            plain = getattr(pycnc.core, shape)(*args)
+            compact = pycnc.subroutines.to_gcode(pycnc.core.make_toolpath(shape, *args))
+            self.assertIn('while', compact)
+            self.assertLess(len(compact.splitlines()) * 3, len(plain.splitlines()))
+            self.assertSameMoves(_expand(compact), plain)
+
+    def test_precision(self):
+        # the steps of 1/3 mm are rounded, the loops must still reach the formatted heights
+        previous = pycnc.gcodes.set_formatter(precision=3, strip_zeros=True)
+        try:
+            tp = pycnc.core.make_toolpath('rectangle', 20.0, 10.0, 0.0, 0.0, 3.0, 640.0, 200.0, 0.0, -10.0, -1.0 / 3.0,
+                                          10.0)
+            plain, compact = tp.to_gcode(), pycnc.subroutines.to_gcode(tp)
+        finally:
+            pycnc.gcodes.set_formatter(previous)
+        self.assertIn('while', compact)
+        self.assertSameMoves(_expand(compact), plain)
+
+    def test_nothing_repeated(self):
+        tp = pycnc.core.make_toolpath('drill', 1.0, 2.0, -4.0, 10.0, 200.0)
+        self.assertEqual(pycnc.subroutines.to_gcode(tp), tp.to_gcode())
+
+    def test_find_layers_entry(self):
+        # the helix entries change the altitude inside the layers, they are not repeated moves
+        moves = list(pycnc.core._path_moves([(0.0, 0.0), (10.0, 0.0), (10.0, 5.0), (0.0, 0.0)], 640.0, 200.0, 0.0,
+                                            -3.0, -0.5, 10.0, entry='helix', entry_radius=1.0))
+        layers = pycnc.subroutines.find_layers(moves)
+        self.assertTrue(layers is None or all(move.kind == pycnc.toolpath.LINEAR
+                                              for move in moves[layers.start:layers.start + layers.length]))
+
+
+class TestJobSubroutines(SameMoves, unittest.TestCase):
+    def test_repeated_features(self):
+        features = [('square_pocket', (x, y, 25.1, 25.1, 6.0, 640.0, 200.0, 0.0, -5.0, -1.0, 10.0), {})
+                    for x, y in ((0.0, 0.0), (40.0, 0.0), (0.0, 40.0), (40.0, 40.0))]
+        features.append(('drill', (100.0, 100.0, -4.0, 10.0, 200.0), {}))
+        plain = pycnc.job.Job(features=features).to_gcode()
+        compact = pycnc.job.Job(features=features, subroutines=True).to_gcode()
+        # one subroutine for the pockets, called at their 4 positions, one for their layers
+        self.assertEqual(compact.count('o100 call'), 4)
+        self.assertEqual(compact.count(' sub\n'), 2)
+        self.assertLess(len(compact.splitlines()) * 10, len(plain.splitlines()))
+        self.assertTrue(compact.startswith(pycnc.core.start_gcode()))
+        self.assertTrue(compact.endswith(pycnc.core.end_gcode()))
+        self.assertSameMoves(_expand(compact), plain)
+
+    def test_not_optimized(self):
+        features = [('drill', (x, 0.0, -4.0, 10.0, 200.0), {}) for x in (0.0, 10.0)]
+        self.assertEqual(pycnc.job.Job(optimize=False, features=features, subroutines=True).to_gcode(),
+                         pycnc.job.Job(optimize=False, features=features).to_gcode())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/python
+# coding: utf-8
+
+import unittest
+
+import pycnc.core
+import pycnc.gcodes
+import pycnc.toolpath
+import pycnc.exceptions
+import pycnc.tests.test_gcodes
+
+
+class TestToolpath(unittest.TestCase):
+    def test_every_shape(self):
+        shapes = [(pycnc.core.oval, (1.0, 2.0, 30.0, 10.0, 3.0, 640.0, 200.0, 0.0, -2.0, -0.5, 10.0, 30.0)),
+                  (pycnc.core.rectangle, (20.0, 10.0, 1.0, 2.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.3, 10.0)),
+                  (pycnc.core.full_hole, (1.0, 1.0, 20.0, 3.0, 640.0, 200.0, 0.0, -1.0, -0.3, 10.0)),
+                  (pycnc.core.two_concentric_holes, (0.0, 0.0, 20.0, 10.0, 3.0, 640.0, 200.0, 0.0, -1.0, -2.0, -0.5,
+                                                     10.0)),
+                  (pycnc.core.drill_g83, (1.0, 2.0, -4.0, 1.0, 10.0, 200.0))]
+        for shape, args in shapes:
+            tp = pycnc.core.make_toolpath(shape, *args)
+            gcode = shape(*args).splitlines(True)
+            self.assertEqual(len(tp), len(gcode))
+            self.assertEqual(pycnc.tests.test_gcodes._trace(tp.iter_gcode()), pycnc.tests.test_gcodes._trace(gcode))
+
+    def test_columns(self):
+        tp = pycnc.core.make_toolpath('hole', 1.0, 1.0, 10.0, 3.0, 640.0, 0.0, -1.0, -0.5, 10.0)
+        self.assertEqual(list(tp.column('kind')), [pycnc.toolpath.RAPID, pycnc.toolpath.RAPID, pycnc.toolpath.ARC_CW,
+                                                   pycnc.toolpath.ARC_CW, pycnc.toolpath.ARC_CW,
+                                                   pycnc.toolpath.LINEAR])
+        self.assertEqual(list(tp.column('z'))[2:5], [0.0, -0.5, -1.0])
+        self.assertEqual(tp[2].i, 3.5)
+        self.assertIsNone(tp[2].x)
+
+    def test_extend(self):
+        tp = pycnc.core.make_toolpath('drill', 1.0, 2.0, -4.0, 10.0, 200.0)
+        tp.extend(pycnc.core.make_toolpath('drill', 3.0, 2.0, -4.0, 10.0, 200.0))
+        self.assertEqual(tp.to_gcode(), pycnc.core.drill(1.0, 2.0, -4.0, 10.0, 200.0) +
+                         pycnc.core.drill(3.0, 2.0, -4.0, 10.0, 200.0))
+
+    def test_unknown_shape(self):
+        self.assertRaises(pycnc.exceptions.WrongParameterError, pycnc.core.make_toolpath, 'start_gcode')
+
+    def test_iter_gcode_templates(self):
+        moves = list(pycnc.core._rectangle_rounded_corners_moves(0.0, 0.0, 50.0, 30.0, 5.0, 3.0, 640.0, 200.0, 0.0,
+                                                                 -1.0, -0.3, 10.0))
+        # equal values formatted differently, with the same move repeated and moves rebuilt at each layer
+        moves += [pycnc.toolpath.g1_move(x=0.0), pycnc.toolpath.g1_move(x=-0.0), pycnc.toolpath.g1_move(x=0)] * 2
+        moves += [pycnc.toolpath.with_z(moves[4], z) for z in (-1.0, -1.5, -1.0)]
+        cycle = pycnc.toolpath.g81_move(x=1.0, y=2.0, z=-1.0, r=0.5, feedrate=100.0)
+        moves += [cycle, cycle._replace(z=None, r=None), cycle._replace(z=-1.0)]
+        for kwargs in ({}, {'precision': 3, 'strip_zeros': True}):
+            previous = pycnc.gcodes.set_formatter(**kwargs)
+            try:
+                # one move at a time, nothing to reuse
+                expected = [line for move in moves for line in pycnc.toolpath.iter_gcode([move])]
+                self.assertEqual(list(pycnc.toolpath.iter_gcode(moves)), expected)
+            finally:
+                pycnc.gcodes.set_formatter(previous)
+
+    def test_iter_gcode_memory(self):
+        try:
+            import tracemalloc
+        except ImportError:  # Python 2
+            raise unittest.SkipTest('tracemalloc is not available')
+        # a continuous descent: every move has its own Z
+        moves = (pycnc.toolpath.g1_move(x=1.0, z=k * -1e-6, feedrate=600.0) for k in range(200000))
+        tracemalloc.start()
+        try:
+            for _ in pycnc.toolpath.iter_gcode(moves):
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 4e6)
+
+
+if __name__ == '__main__':
+    unittest.main()
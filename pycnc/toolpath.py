@@ -0,0 +1,318 @@
+# coding: utf-8
+
+r"""Toolpath intermediate representation
+
+Summary
+-------
+A toolpath is a sequence of typed moves (rapid, linear, arcs, canned drilling cycles).
+The shape generators of pycnc.core produce moves, which are either serialized to Gcode
+or stored in a Toolpath, whose columns are compact arrays instead of per-move objects.
+
+"""
+
+from __future__ import division
+
+from array import array
+from collections import namedtuple
+
+import pycnc.gcodes as gcodes
+import pycnc.exceptions as exceptions
+
+
+# Move kinds are the numbers of the Gcodes they stand for
+RAPID = 0
+LINEAR = 1
+ARC_CW = 2
+ARC_CCW = 3
+DRILL_CHIP_BREAKING = 73
+DRILL = 81
+DRILL_PECK = 83
+
+PREFIXES = {RAPID: 'G0',
+            LINEAR: 'G1',
+            ARC_CW: 'G2',
+            ARC_CCW: 'G3',
+            DRILL_CHIP_BREAKING: 'G73 G98',
+            DRILL: 'G81 G98',
+            DRILL_PECK: 'G83 G98'}
+
+CANNED_CYCLES = (DRILL_CHIP_BREAKING, DRILL, DRILL_PECK)
+
+NAN = float('nan')
+
+Move = namedtuple('Move', ['kind', 'x', 'y', 'z', 'i', 'j', 'r', 'q', 'feedrate'])
+Move.__doc__ = r"""A single move, undefined words are None (see gcodes._gcode_format for their meaning)"""
+
+_new_move = tuple.__new__  # skips the argument parsing of Move.__new__ in the move generators
+
+
+# MOVES (same parameters and checks as the pycnc.gcodes functions)
+
+
+def g0_move(x=None, y=None, z=None):
+    r"""Max speed move"""
+    if x is None and y is None and z is None:
+        raise exceptions.GcodeParameterError('G0 parameter error')
+    return _new_move(Move, (RAPID, x, y, z, None, None, None, None, None))
+
+
+def g1_move(x=None, y=None, z=None, feedrate=None):
+    r"""Feed speed move"""
+    if x is None and y is None and z is None:
+        raise exceptions.GcodeParameterError('G1 parameter error')
+    return _new_move(Move, (LINEAR, x, y, z, None, None, None, None, feedrate))
+
+
+def g2_move(x_end_point=None, y_end_point=None, spiral_end_altitude=None, x_center_offset=None, y_center_offset=None,
+            feedrate=None):
+    r"""Clockwise arc in XY plane (G17)"""
+    if x_center_offset is None and y_center_offset is None:
+        raise exceptions.GcodeParameterError('G2 parameter error')
+    return _new_move(Move, (ARC_CW, x_end_point, y_end_point, spiral_end_altitude, x_center_offset, y_center_offset,
+                            None, None, feedrate))
+
+
+def g3_move(x_end_point=None, y_end_point=None, x_center_offset=None, y_center_offset=None, spiral_end_altitude=None,
+            feedrate=None):
+    r"""Counterclockwise arc in XY plane (G17)"""
+    if x_center_offset is None and y_center_offset is None:
+        raise exceptions.GcodeParameterError('G3 parameter error')
+    return _new_move(Move, (ARC_CCW, x_end_point, y_end_point, spiral_end_altitude, x_center_offset, y_center_offset,
+                            None, None, feedrate))
+
+
+def g73_move(x=None, y=None, z=None, r=None, q=None, feedrate=None):
+    r"""Chip break drill"""
+    if z is None or r is None:
+        raise exceptions.GcodeParameterError('G73 parameter error')
+    if r < z:
+        raise exceptions.GcodeParameterError('G73 parameter error - r smaller than z')
+    if q <= 0:
+        raise exceptions.GcodeParameterError('G73 parameter error - q must be strictly positive')
+    return _new_move(Move, (DRILL_CHIP_BREAKING, x, y, z, None, None, r, q, feedrate))
+
+
+def g81_move(x=None, y=None, z=None, r=None, feedrate=None):
+    r"""Normal drill"""
+    if z is None or r is None:
+        raise exceptions.GcodeParameterError('G81 parameter error')
+    if r < z:
+        raise exceptions.GcodeParameterError('G81 parameter error - r smaller than z')
+    return _new_move(Move, (DRILL, x, y, z, None, None, r, None, feedrate))
+
+
+def g83_move(x=None, y=None, z=None, r=None, q=None, feedrate=None):
+    r"""Peck drill"""
+    if z is None or r is None:
+        raise exceptions.GcodeParameterError('G83 parameter error')
+    if r < z:
+        raise exceptions.GcodeParameterError('G83 parameter error - r smaller than z')
+    if q <= 0:
+        raise exceptions.GcodeParameterError('G83 parameter error - q must be strictly positive')
+    return _new_move(Move, (DRILL_PECK, x, y, z, None, None, r, q, feedrate))
+
+
+def repeat_cycle_move(kind, x=None, y=None):
+    r"""Repeat of the canned cycle in effect at a new XY position
+
+    The move has no Z and R words, which are sticky, and is serialized as X Y words only.
+
+    """
+    if kind not in CANNED_CYCLES:
+        raise exceptions.GcodeParameterError('Only canned cycles can be repeated')
+    if x is None and y is None:
+        raise exceptions.GcodeParameterError('Cycle repeat parameter error')
+    return _new_move(Move, (kind, x, y, None, None, None, None, None, None))
+
+
+# SERIALIZATION
+
+
+def with_z(move, z):
+    r"""Copy of a move with another Z word, e.g. an arc of a contour at the altitude of a layer
+
+    Examples
+    --------
+    >>> with_z(g2_move(x_center_offset=1.0, y_center_offset=0.0, spiral_end_altitude=-1.0), -2.0).z
+    -2.0
+
+    """
+    kind, x, y, _, i, j, r, q, feedrate = move
+    return _new_move(Move, (kind, x, y, z, i, j, r, q, feedrate))
+
+
+# maximum number of line templates and of Z words kept by iter_gcode
+_TEMPLATES = 1 << 16
+_Z_WORDS = 1 << 10
+
+
+def iter_gcode(moves):
+    r"""Generator of the Gcode lines of a sequence of moves, formatted with gcodes.get_formatter()
+
+    The lines of the moves that come back (the contours cut at every depth) are formatted once:
+    the words other than Z are cached, keyed on the identity of their values, and the Z word is spliced in.
+    So the shapes reuse the moves of their contours, or build their moves at each depth with with_z.
+    Both caches are cleared when they are full, so that the memory does not grow with the length of the toolpath.
+
+    Examples
+    --------
+    >>> list(iter_gcode([g0_move(z=10.0), g1_move(x=1.0, y=2.0, feedrate=640.0)]))
+    ['G0 Z10.0 \n', 'G1 X1.0 Y2.0 F640.0 \n']
+
+    """
+    formatter = gcodes.get_formatter()
+    format_ = formatter.format
+    prefixes = PREFIXES
+    # ids of the words other than Z, and whether there is one for the repeats of the canned cycles:
+    # (start of the line up to Z, end of the line, *words), the words are kept alive so their ids are not reused
+    templates = dict()
+    # Z value: (Z word, value), -0.0 == 0.0 but they are not formatted alike
+    z_words = dict()
+    for move in moves:
+        kind, x, y, z, i, j, r, q, feedrate = move
+        key = (kind, z is None, id(x), id(y), id(i), id(j), id(r), id(q), id(feedrate))
+        template = templates.get(key)
+        if template is None:
+            if z is None and r is None and kind in CANNED_CYCLES:
+                prefix = ''  # repeat of the cycle in effect
+            else:
+                prefix = prefixes[kind]
+            start = format_(prefix, x, y)[:-1]
+            template = (start, format_(prefix, x, y, None, i, j, r, q, feedrate)[len(start):],
+                        x, y, i, j, r, q, feedrate)
+            if len(templates) >= _TEMPLATES:
+                templates.clear()
+            templates[key] = template
+        if z is None:
+            yield template[0] + template[1]
+        else:
+            z_word = z_words.get(z)
+            if z_word is None or z_word[1] is not z:
+                if len(z_words) >= _Z_WORDS:
+                    z_words.clear()
+                z_word = z_words[z] = (formatter.word('Z', z), z)
+            yield template[0] + z_word[0] + template[1]
+
+
+def to_gcode(moves):
+    r"""Returns the Gcode of a sequence of moves as a string"""
+    return ''.join(iter_gcode(moves))
+
+
+class Toolpath(object):
+    r"""Array backed sequence of moves
+
+    Each word is stored in its own array.array column of doubles (NaN for undefined words)
+    and the move kinds in an array of unsigned bytes, i.e. 65 bytes per move.
+    Values are stored as floats: an integer word (e.g. the X0 of a G0 to the origin)
+    is serialized back as a float (X0.0).
+
+    Examples
+    --------
+    >>> tp = Toolpath()
+    >>> tp.append(RAPID, x=1.0, y=2.0)
+    >>> tp.append(LINEAR, z=-1.0, feedrate=200.0)
+    >>> len(tp)
+    2
+    >>> tp[1]
+    Move(kind=1, x=None, y=None, z=-1.0, i=None, j=None, r=None, q=None, feedrate=200.0)
+    >>> list(tp.column('z'))
+    [nan, -1.0]
+    >>> tp.to_gcode()
+    'G0 X1.0 Y2.0 \nG1 Z-1.0 F200.0 \n'
+
+    """
+    columns = ('x', 'y', 'z', 'i', 'j', 'r', 'q', 'feedrate')
+
+    def __init__(self, moves=None):
+        self.kind = array('B')
+        self.x = array('d')
+        self.y = array('d')
+        self.z = array('d')
+        self.i = array('d')
+        self.j = array('d')
+        self.r = array('d')
+        self.q = array('d')
+        self.feedrate = array('d')
+        if moves is not None:
+            self.extend(moves)
+
+    @classmethod
+    def from_moves(cls, moves):
+        r"""Build a toolpath from an iterable of moves (e.g. one of the core move generators)"""
+        return cls(moves)
+
+    def append(self, kind, x=None, y=None, z=None, i=None, j=None, r=None, q=None, feedrate=None):
+        r"""Append a move, undefined words being None"""
+        if kind not in PREFIXES:
+            raise exceptions.GcodeParameterError('Unknown move kind %s' % kind)
+        self.kind.append(kind)
+        self.x.append(NAN if x is None else x)
+        self.y.append(NAN if y is None else y)
+        self.z.append(NAN if z is None else z)
+        self.i.append(NAN if i is None else i)
+        self.j.append(NAN if j is None else j)
+        self.r.append(NAN if r is None else r)
+        self.q.append(NAN if q is None else q)
+        self.feedrate.append(NAN if feedrate is None else feedrate)
+
+    def extend(self, moves):
+        r"""Append moves (Move tuples or another Toolpath)"""
+        if isinstance(moves, Toolpath):
+            self.kind.extend(moves.kind)
+            for name in self.columns:
+                getattr(self, name).extend(getattr(moves, name))
+            return
+        append = self.append
+        for move in moves:
+            append(*move)
+
+    def copy(self):
+        r"""Returns an independent copy of the toolpath"""
+        tp = Toolpath()
+        tp.extend(self)
+        return tp
+
+    def translate(self, dx, dy, start=0):
+        r"""Offset the X and Y words of the moves from index start (in place)
+
+        The I and J words are relative to the start of the arcs and are left unchanged.
+
+        Examples
+        --------
+        >>> tp = Toolpath([Move(RAPID, 0.0, 0.0, 10.0, None, None, None, None, None),
+        ...                Move(ARC_CW, 5.0, None, -1.0, 2.0, 0.0, None, None, 200.0)])
+        >>> tp.translate(10.0, 1.0, start=1)
+        >>> tp[0][1:3], tp[1][1:5]
+        ((0.0, 0.0), (15.0, None, -1.0, 2.0))
+
+        """
+        for column, offset in ((self.x, dx), (self.y, dy)):
+            if offset:
+                # NaN (undefined word) + offset stays NaN
+                column[start:] = array('d', [value + offset for value in column[start:]])
+
+    def column(self, name):
+        r"""Returns the array of a column ('kind' or one of columns)"""
+        if name != 'kind' and name not in self.columns:
+            raise exceptions.WrongParameterError('Unknown column %s' % name)
+        return getattr(self, name)
+
+    def __len__(self):
+        return len(self.kind)
+
+    def __getitem__(self, index):
+        values = [getattr(self, name)[index] for name in self.columns]
+        return Move(self.kind[index], *[None if value != value else value for value in values])
+
+    def __iter__(self):
+        for row in zip(self.kind, self.x, self.y, self.z, self.i, self.j, self.r, self.q, self.feedrate):
+            yield Move(row[0], *[None if value != value else value for value in row[1:]])
+
+    def iter_gcode(self):
+        r"""Generator of the Gcode lines of the toolpath"""
+        return iter_gcode(self)
+
+    def to_gcode(self):
+        r"""Returns the Gcode of the toolpath as a string"""
+        return to_gcode(self)